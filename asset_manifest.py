@@ -0,0 +1,246 @@
+"""
+فهرست لوگو/آیکون فعلی
+
+به جای listdir و مرتب‌سازی پوشه آپلودها در هر درخواست /get-logo، فایل فعلی هر نوع
+در یک فایل manifest کوچک ({پوشه نوع}/.current.json) ثبت می‌شود:
+
+- /upload-logo پس از ذخیره فایل، manifest را به صورت اتمیک (فایل موقت + os.replace) می‌نویسد
+- /get-logo مقدار را از حافظه می‌خواند؛ تغییر manifest توسط workerهای دیگر با بررسی
+  stat فایل (حداکثر یک بار در هر CHECK_INTERVAL ثانیه) تشخیص داده می‌شود
+- فایل‌های جایگزین شده در یک thread پس‌زمینه حذف می‌شوند
+
+هر نوع manifest جداگانه دارد تا آپلود هم‌زمان لوگو و آیکون در دو worker تغییرات
+یکدیگر را بازنویسی نکنند.
+
+تنظیمات (متغیرهای محیطی):
+- ASSET_GC_ENABLED: حذف فایل‌های جایگزین شده (پیش‌فرض: 1)
+- ASSET_GC_GRACE: فایل‌های جدیدتر از این مدت حذف نمی‌شوند (ثانیه، پیش‌فرض: 300)
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+MANIFEST_NAME = '.current.json'
+CHECK_INTERVAL = 1.0
+
+
+class AssetManifest:
+    """فایل فعلی هر نوع آپلود (logo، icon) با کش در حافظه"""
+
+    def __init__(self, upload_folder: str, kinds: Iterable[str] = ('logo', 'icon'),
+                 url_prefix: str = '/uploads', gc_enabled: bool = True, gc_grace: float = 300.0,
+                 check_interval: float = CHECK_INTERVAL):
+        """
+        Args:
+            upload_folder: پوشه آپلودها (هر نوع در زیرپوشه {نوع}s)
+            kinds: انواع فایل
+            url_prefix: پیشوند آدرس فایل‌ها
+            gc_enabled: حذف فایل‌های جایگزین شده در پس‌زمینه
+            gc_grace: فایل‌های جدیدتر از این مدت (ثانیه) حذف نمی‌شوند
+            check_interval: فاصله بررسی تغییر manifest توسط workerهای دیگر (ثانیه)
+        """
+        self.upload_folder = upload_folder
+        self.kinds = tuple(kinds)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.gc_enabled = gc_enabled
+        self.gc_grace = gc_grace
+        self.check_interval = check_interval
+        self.removed = 0
+
+        self._lock = threading.Lock()
+        # نوع -> (زمان بررسی، امضای stat فایل manifest، مقدار)
+        self._cache: Dict[str, Tuple[float, Optional[tuple], Optional[Dict]]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    def directory(self, kind: str) -> str:
+        return os.path.join(self.upload_folder, f'{kind}s')
+
+    def manifest_path(self, kind: str) -> str:
+        return os.path.join(self.directory(kind), MANIFEST_NAME)
+
+    @staticmethod
+    def _signature(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read(self, kind: str) -> Optional[Dict]:
+        try:
+            with open(self.manifest_path(kind), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) and entry.get('file') else None
+
+    def _write(self, kind: str, entry: Dict):
+        """نوشتن اتمیک manifest (خواننده‌ها هرگز فایل نیمه‌کاره نمی‌بینند)"""
+        path = self.manifest_path(kind)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _scan(self, kind: str) -> Optional[Dict]:
+        """پیدا کردن جدیدترین فایل با پیمایش پوشه (فقط وقتی manifest هنوز ساخته نشده)"""
+        directory = self.directory(kind)
+        try:
+            names = [
+                name for name in os.listdir(directory)
+                if not name.startswith('.') and os.path.isfile(os.path.join(directory, name))
+            ]
+        except OSError:
+            return None
+        if not names:
+            return None
+        # نام فایل‌ها با timestamp شروع می‌شود؛ بزرگ‌ترین نام جدیدترین فایل است
+        return self._entry(kind, max(names))
+
+    def file_url(self, kind: str, filename: str) -> str:
+        return f"{self.url_prefix}/{kind}s/{filename}"
+
+    def _entry(self, kind: str, filename: str, files: Iterable[str] = (),
+               srcset: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+               favicon: Optional[Dict[int, str]] = None) -> Dict:
+        return {
+            'file': filename,
+            'url': self.file_url(kind, filename),
+            # همه فایل‌های این آپلود (نسخه‌های مختلف اندازه و فرمت)
+            'files': sorted(set(files) | {filename}),
+            'srcset': {
+                mimetype: ', '.join(f"{self.file_url(kind, name)} {descriptor}" for name, descriptor in entries)
+                for mimetype, entries in (srcset or {}).items()
+            },
+            'favicon': {str(size): self.file_url(kind, name) for size, name in (favicon or {}).items()},
+            'updated_at': time.time(),
+        }
+
+    @staticmethod
+    def entry_files(entry: Optional[Dict]) -> List[str]:
+        """همه فایل‌های یک مقدار manifest (manifestهای قدیمی فقط file دارند)"""
+        if not entry:
+            return []
+        return entry.get('files') or [entry['file']]
+
+    def get(self, kind: str) -> Optional[Dict]:
+        """
+        دریافت فایل فعلی یک نوع
+
+        Returns:
+            {'file', 'url', 'files', 'srcset', 'favicon', 'updated_at'} یا None اگر فایلی آپلود نشده باشد
+        """
+        now = time.monotonic()
+        cached = self._cache.get(kind)
+        if cached is not None and now - cached[0] < self.check_interval:
+            return cached[2]
+
+        signature = self._signature(self.manifest_path(kind))
+        if cached is not None and signature == cached[1]:
+            self._cache[kind] = (now, signature, cached[2])
+            return cached[2]
+
+        with self._lock:
+            entry = self._read(kind) if signature is not None else None
+            if entry is None:
+                # اولین اجرا پس از ارتقا: manifest از روی فایل‌های موجود ساخته می‌شود
+                entry = self._scan(kind)
+                if entry is not None:
+                    self._write(kind, entry)
+                    signature = self._signature(self.manifest_path(kind))
+            self._cache[kind] = (now, signature, entry)
+        return entry
+
+    def url(self, kind: str) -> Optional[str]:
+        """آدرس فایل فعلی یک نوع (None اگر وجود نداشته باشد)"""
+        entry = self.get(kind)
+        return entry['url'] if entry else None
+
+    def set_current(self, kind: str, filename: str, files: Iterable[str] = (),
+                    srcset: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+                    favicon: Optional[Dict[int, str]] = None) -> Dict:
+        """
+        ثبت فایل تازه آپلود شده به عنوان فایل فعلی و زمان‌بندی حذف فایل‌های قبلی
+
+        Args:
+            kind: نوع فایل (logo / icon)
+            filename: نام فایل اصلی در پوشه نوع
+            files: همه فایل‌های این آپلود
+            srcset: {نوع MIME: [(نام فایل، توصیف‌گر)]}
+            favicon: {اندازه: نام فایل}
+
+        Returns:
+            مقدار جدید manifest
+        """
+        entry = self._entry(kind, filename, files, srcset, favicon)
+        with self._lock:
+            previous = self._read(kind)
+            self._write(kind, entry)
+            self._cache[kind] = (time.monotonic(), self._signature(self.manifest_path(kind)), entry)
+        if self.gc_enabled:
+            # صفحه‌هایی که همین الان بارگذاری شده‌اند ممکن است هنوز آدرس‌های قبلی را درخواست کنند
+            keep = set(entry['files']) | set(self.entry_files(previous))
+            self._submit(self.collect, kind, keep)
+        return entry
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            pid = os.getpid()
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asset-gc')
+                self._executor_pid = pid
+            return self._executor.submit(fn, *args)
+
+    def collect(self, kind: str, keep: Iterable[str] = ()) -> int:
+        """
+        حذف فایل‌های جایگزین شده یک نوع
+
+        فایل فعلی، فایل‌های keep و فایل‌های جدیدتر از gc_grace (آپلودهای هم‌زمان
+        workerهای دیگر) حذف نمی‌شوند.
+
+        Returns:
+            تعداد فایل‌های حذف شده
+        """
+        keep = set(keep) | set(self.entry_files(self._read(kind)))
+        directory = self.directory(kind)
+        cutoff = time.time() - self.gc_grace
+        removed = 0
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return 0
+        for item in entries:
+            if item.name.startswith('.') or item.name in keep:
+                continue
+            try:
+                if not item.is_file() or item.stat().st_mtime > cutoff:
+                    continue
+                os.remove(item.path)
+                removed += 1
+            except OSError as e:
+                log.warning('assets.gc_remove_failed', kind=kind, file=item.name, error=str(e))
+        self.removed += removed
+        return removed
+
+
+def create_asset_manifest(upload_folder: str) -> AssetManifest:
+    """
+    ساخت manifest آپلودها بر اساس متغیرهای محیطی
+
+    - ASSET_GC_ENABLED: حذف فایل‌های جایگزین شده (پیش‌فرض: 1)
+    - ASSET_GC_GRACE: حداقل عمر فایل برای حذف (ثانیه)
+    """
+    return AssetManifest(
+        upload_folder,
+        gc_enabled=os.getenv('ASSET_GC_ENABLED', '1') == '1',
+        gc_grace=float(os.getenv('ASSET_GC_GRACE', '300')),
+    )
@@ -0,0 +1,334 @@
+"""
+بنچمارک تأخیر و توان عملیاتی endpointهای چت بات
+
+سرور چت بات (پیش‌فرض: chatbot_web:app با gunicorn) در برابر سرور جعلی OpenAI با تأخیر
+قابل تنظیم اجرا می‌شود و یک بار کاری ترکیبی (چت عادی و جریانی، ذخیره و استخراج اطلاعات
+مشتری، صفحه اصلی و لوگو) با چند سطح هم‌زمانی روی آن اجرا می‌شود. برای هر سطح و هر
+endpoint صدک‌های 50/95/99 تأخیر، توان عملیاتی و نرخ خطا گزارش می‌شود.
+
+نتیجه به صورت JSON ذخیره می‌شود تا اجراهای مختلف با هم مقایسه شوند:
+    python benchmarks/bench_suite.py --concurrency 8,32 --requests 400 --output before.json
+    python benchmarks/bench_suite.py --concurrency 8,32 --requests 400 --output after.json \\
+        --compare before.json --max-regression 20 --fail-on-regression
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import asyncio
+import platform
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_openai import start_mock_server
+from load_test import BENCH_ENV, ROOT, SERVER_COMMANDS, start_server
+
+# بارهای کاری: نام عملیات -> وزن
+WORKLOADS = {
+    'chat': {'chat': 1},
+    'stream': {'chat_stream': 1},
+    'mixed': {
+        'chat': 45, 'chat_stream': 20, 'extract_info': 10,
+        'save_customer': 10, 'get_logo': 10, 'index': 5,
+    },
+    'storage': {'save_customer': 60, 'extract_info': 40},
+}
+
+# endpointهایی با نمونه کمتر در مقایسه نادیده گرفته می‌شوند (صدک 95 آنها قابل اتکا نیست)
+MIN_COMPARE_SAMPLES = 20
+
+MESSAGES = [
+    'سلام، قیمت محصولات چقدر است؟',
+    'ارسال به شهرستان هم دارید؟',
+    'من علی احمدی هستم، شماره‌ام 09123456789 است',
+    'دو عدد از محصول شماره 1 می‌خواهم',
+    'آدرس من تهران، خیابان آزادی است',
+]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """صدک با روش nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    """خلاصه آماری تأخیرها (میلی‌ثانیه)"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 1) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1) if count else 0.0,
+    }
+
+
+class VirtualUser:
+    """یک کاربر مجازی: چند نوبت گفتگو در یک جلسه، سپس جلسه جدید"""
+
+    def __init__(self, user_id: int, turns: int, rng: random.Random):
+        self.user_id = user_id
+        self.turns = turns
+        self.rng = rng
+        self.session_number = 0
+        self.turn = 0
+        self.history = []
+
+    @property
+    def session_id(self) -> str:
+        return f'bench-{self.user_id}-{self.session_number}'
+
+    def next_message(self) -> str:
+        if self.turn >= self.turns:
+            self.session_number += 1
+            self.turn = 0
+            self.history = []
+        self.turn += 1
+        return self.rng.choice(MESSAGES)
+
+
+async def run_operation(client: httpx.AsyncClient, url: str, operation: str, user: VirtualUser) -> tuple:
+    """
+    اجرای یک عملیات
+
+    Returns:
+        (موفق بودن، کد وضعیت، زمان اولین توکن برای چت جریانی یا None)
+    """
+    if operation in ('chat', 'chat_stream'):
+        message = user.next_message()
+        payload = {'message': message, 'session_id': user.session_id}
+        if operation == 'chat':
+            response = await client.post(f'{url}/chat', json=payload)
+            if response.status_code == 200:
+                user.history += [{'role': 'user', 'content': message},
+                                 {'role': 'assistant', 'content': response.json().get('response', '')}]
+            return response.status_code == 200, response.status_code, None
+
+        start = time.perf_counter()
+        first_token = None
+        ok = False
+        async with client.stream('POST', f'{url}/chat/stream', json=payload) as response:
+            async for line in response.aiter_lines():
+                if line.startswith('event: token') and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif line.startswith('event: done'):
+                    ok = True
+                elif line.startswith('event: error'):
+                    ok = False
+            ok = ok and response.status_code == 200
+        return ok, response.status_code, first_token
+
+    if operation == 'extract_info':
+        # با session_id اطلاعات استخراج شده تدریجی خوانده می‌شود؛ مکالمه برای جلسه‌های بدون پروفایل
+        response = await client.post(f'{url}/extract-info', json={
+            'session_id': user.session_id,
+            'conversation': user.history or [{'role': 'user', 'content': MESSAGES[2]}],
+        })
+    elif operation == 'save_customer':
+        response = await client.post(f'{url}/save-customer', json={
+            'session_id': user.session_id, 'name': 'علی احمدی', 'phone': '09123456789',
+            'product': 'محصول شماره 1', 'quantity': '2',
+        })
+    elif operation == 'get_logo':
+        response = await client.get(f'{url}/get-logo')
+    elif operation == 'index':
+        response = await client.get(f'{url}/', headers={'Accept-Encoding': 'gzip, br'})
+    else:
+        raise ValueError(f'عملیات ناشناخته: {operation}')
+    return response.status_code == 200, response.status_code, None
+
+
+async def run_level(url: str, workload: dict, concurrency: int, total: int, turns: int, seed: int) -> dict:
+    """اجرای total درخواست با concurrency کاربر مجازی هم‌زمان (بار بسته: هر کاربر پس از پاسخ درخواست بعدی را می‌فرستد)"""
+    rng = random.Random(seed)
+    operations, weights = zip(*workload.items())
+    plan = rng.choices(operations, weights=weights, k=total)
+    queue = asyncio.Queue()
+    for operation in plan:
+        queue.put_nowait(operation)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    status_codes = defaultdict(int)
+    first_tokens = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        async def worker(user: VirtualUser):
+            while True:
+                try:
+                    operation = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    ok, status, first_token = await run_operation(client, url, operation, user)
+                except httpx.HTTPError:
+                    ok, status, first_token = False, 'connection_error', None
+                latencies[operation].append(time.perf_counter() - start)
+                status_codes[str(status)] += 1
+                if not ok:
+                    errors[operation] += 1
+                if first_token is not None:
+                    first_tokens.append(first_token)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            worker(VirtualUser(i, turns, random.Random(seed * 1000 + i))) for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    result = summarize(all_latencies, sum(errors.values()), elapsed)
+    result['elapsed_s'] = round(elapsed, 3)
+    result['status_codes'] = dict(sorted(status_codes.items()))
+    result['endpoints'] = {
+        operation: summarize(values, errors[operation], elapsed)
+        for operation, values in sorted(latencies.items())
+    }
+    if first_tokens:
+        first_tokens.sort()
+        result['stream_first_token'] = {
+            'p50_ms': round(percentile(first_tokens, 50) * 1000, 1),
+            'p95_ms': round(percentile(first_tokens, 95) * 1000, 1),
+            'p99_ms': round(percentile(first_tokens, 99) * 1000, 1),
+        }
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list:
+    """
+    مقایسه با یک اجرای قبلی
+
+    Returns:
+        لیست پسرفت‌ها (افزایش p95 یا کاهش توان عملیاتی بیش از max_regression درصد)
+    """
+    regressions = []
+    for level, result in current['levels'].items():
+        previous = baseline.get('levels', {}).get(level)
+        if not previous:
+            continue
+        rows = [('all', result, previous)] + [
+            (operation, stats, previous.get('endpoints', {}).get(operation))
+            for operation, stats in result['endpoints'].items()
+        ]
+        for name, stats, old in rows:
+            if not old or not old.get('p95_ms') or min(stats['requests'], old['requests']) < MIN_COMPARE_SAMPLES:
+                continue
+            p95_change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            rps_change = ((stats['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100
+                          if old.get('throughput_rps') else 0.0)
+            print(f"  c={level:<4} {name:<14} p95 {old['p95_ms']:>8.1f} -> {stats['p95_ms']:>8.1f} ms "
+                  f"({p95_change:+.1f}%)  rps {old['throughput_rps']:>7.2f} -> {stats['throughput_rps']:>7.2f} "
+                  f"({rps_change:+.1f}%)")
+            if p95_change > max_regression or -rps_change > max_regression:
+                regressions.append({'concurrency': level, 'endpoint': name,
+                                    'p95_change_pct': round(p95_change, 1), 'rps_change_pct': round(rps_change, 1)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='بنچمارک تأخیر و توان عملیاتی چت بات')
+    parser.add_argument('--mode', default='wsgi', choices=sorted(SERVER_COMMANDS))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--workload', default='mixed', choices=sorted(WORKLOADS))
+    parser.add_argument('--concurrency', default='1,8,32', help='سطوح هم‌زمانی (جدا شده با کاما)')
+    parser.add_argument('--requests', type=int, default=200, help='تعداد درخواست در هر سطح')
+    parser.add_argument('--turns', type=int, default=5, help='تعداد نوبت هر جلسه گفتگو')
+    parser.add_argument('--latency', type=float, default=0.3, help='تأخیر سرور جعلی OpenAI تا اولین توکن (ثانیه)')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='فاصله توکن‌ها در حالت stream (ثانیه)')
+    parser.add_argument('--rate-limit', action='store_true', help='محدودیت نرخ فعال بماند')
+    parser.add_argument('--response-cache', action='store_true',
+                        help='کش پاسخ فعال بماند (پیام‌های تکراری بنچمارک از کش پاسخ داده می‌شوند)')
+    parser.add_argument('--extraction', action='store_true', help='استخراج تدریجی اطلاعات مشتری فعال بماند')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='مسیر فایل JSON نتیجه')
+    parser.add_argument('--compare', help='فایل JSON اجرای قبلی برای مقایسه')
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help='آستانه پسرفت (درصد افزایش p95 یا کاهش توان عملیاتی)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='خروج با کد 1 در صورت پسرفت')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    mock = start_mock_server(latency=args.latency, token_delay=args.token_delay)
+    extra_env = dict(BENCH_ENV)
+    for flag, name in ((args.rate_limit, 'RATE_LIMIT_ENABLED'), (args.response_cache, 'RESPONSE_CACHE_ENABLED'),
+                       (args.extraction, 'CUSTOMER_EXTRACTION_ENABLED')):
+        if flag:
+            del extra_env[name]
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'levels': {},
+    }
+
+    # پایگاه‌های داده و فایل‌های هر اجرا در یک پوشه موقت ساخته می‌شوند
+    with tempfile.TemporaryDirectory() as workdir:
+        process, url = start_server(args.mode, args.workers, mock.base_url, workdir, extra_env=extra_env)
+        try:
+            for level in levels:
+                mock.reset_stats()
+                result = asyncio.run(run_level(
+                    url, WORKLOADS[args.workload], level, args.requests, args.turns, args.seed + level
+                ))
+                result['peak_upstream_concurrency'] = mock.stats()['peak_in_flight']
+                report['levels'][str(level)] = result
+                print(f"c={level}: {result['throughput_rps']} rps, p50 {result['p50_ms']} ms, "
+                      f"p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, errors {result['error_rate']:.2%}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nمقایسه با {args.compare} ({baseline.get('git_revision')}):")
+        regressions = compare(report, baseline, args.max_regression)
+        report['comparison'] = {'baseline': args.compare, 'regressions': regressions}
+        if regressions:
+            print(f"⚠️  {len(regressions)} پسرفت بیش از {args.max_regression}%")
+            if args.fail_on_regression:
+                exit_code = 1
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"\nنتیجه در {args.output} ذخیره شد")
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+بنچمارک جستجوی مشتریان در دفتر ثبت
+
+یک دفتر ثبت موقت با تعداد زیادی ردیف ساخته می‌شود و زمان جستجو با هر فیلتر
+(شماره تماس، شماره مشتری، ایمیل، session، وضعیت، بازه تاریخ) و صفحه‌بندی با cursor
+اندازه‌گیری می‌شود. planهای SQLite هم بررسی می‌شوند تا هیچ جستجویی کل جدول را پیمایش نکند.
+
+اجرا:
+    python benchmarks/customer_query_bench.py --rows 300000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from data_storage import FIELDS, CustomerDataStorage
+
+STATUSES = ['در انتظار', 'تماس گرفته شد', 'خرید انجام شد', 'لغو شده']
+
+
+def fill(storage: CustomerDataStorage, rows: int, seed: int):
+    rng = random.Random(seed)
+    batch = []
+    for i in range(1, rows + 1):
+        day = 1 + (i * 365 // rows)
+        created = time.strftime('%Y/%m/%d %H:%M:%S', time.gmtime(1735689600 + day * 86400 + i % 86400))
+        values = {
+            'customer_number': f"CUST-{str(i).zfill(4)}",
+            'created_at': created,
+            'name': f'مشتری {i}',
+            'phone': f"0912{i:07d}",
+            'email': f"user{i}@example.com",
+            'address': '',
+            'product': 'محصول',
+            'quantity': '1',
+            'price': '',
+            'status': rng.choice(STATUSES),
+            'notes': '',
+            'session_id': f"session-{i}",
+        }
+        batch.append(tuple(values[field] for field in FIELDS))
+        if len(batch) == 10000:
+            storage._insert_rows(batch)
+            batch = []
+    if batch:
+        storage._insert_rows(batch)
+
+
+def measure(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='بنچمارک جستجوی مشتریان')
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='customer-query-')
+    storage = CustomerDataStorage(
+        excel_file=os.path.join(workdir, 'customers.xlsx'),
+        db_file=os.path.join(workdir, 'customers.db'),
+    )
+    start = time.perf_counter()
+    fill(storage, args.rows, args.seed)
+    print(f"{args.rows} ردیف در {time.perf_counter() - start:.1f} ثانیه درج شد")
+
+    rng = random.Random(args.seed)
+    pick = lambda: rng.randint(1, args.rows)  # noqa: E731
+    queries = {
+        'phone': lambda: storage.query_customers(phone=f"+98 912 {pick():07d}"),
+        'number': lambda: storage.query_customers(number=str(pick())),
+        'email': lambda: storage.query_customers(email=f"USER{pick()}@example.com"),
+        'session_id': lambda: storage.query_customers(session_id=f"session-{pick()}"),
+        'status_page': lambda: storage.query_customers(status=STATUSES[0], limit=50),
+        'date_range_page': lambda: storage.query_customers(date_from='2025-06-01', date_to='2025-06-07', limit=50),
+        'latest_page': lambda: storage.query_customers(limit=50),
+    }
+    results = {name: measure(fn, args.repeat) for name, fn in queries.items()}
+
+    # پیمایش 20 صفحه پشت سر هم با cursor
+    def paginate():
+        cursor = None
+        for _ in range(20):
+            cursor = storage.query_customers(status=STATUSES[1], cursor=cursor, limit=100)['next_cursor']
+    results['status_20_pages'] = measure(paginate, max(1, args.repeat // 10))
+
+    # هیچ جستجوی فیلتردار نباید کل جدول را پیمایش کند
+    from db import connect
+    conn = connect(storage.db_file)
+    scans = []
+    for column in ('phone_key', 'customer_number', 'session_id', 'status', 'created_at'):
+        plan = ' '.join(row[3] for row in conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT id FROM customers WHERE {column} = ? ORDER BY id DESC LIMIT 51", ('x',)
+        ))
+        if 'USING INDEX' not in plan and 'USING COVERING INDEX' not in plan:
+            scans.append((column, plan))
+
+    print(json.dumps(results, indent=2))
+    for column, plan in scans:
+        print(f"❌ جستجو با {column} از index استفاده نمی‌کند: {plan}")
+    sys.exit(1 if scans else 0)
+
+
+if __name__ == '__main__':
+    main()
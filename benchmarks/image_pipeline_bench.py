@@ -0,0 +1,117 @@
+"""
+بررسی پردازش تصاویر آپلود شده
+
+1. یک لوگوی نمونه (PNG بزرگ با EXIF) و یک آیکون پردازش می‌شوند و حجم فایل اصلی با
+   حجم نسخه‌ای که مرورگر در اولین نمایش دانلود می‌کند (1x و 2x) مقایسه می‌شود.
+2. حذف متادیتا در همه نسخه‌ها و پاک‌سازی نمونه‌های SVG خطرناک بررسی می‌شود.
+
+اجرا (نیازمند Pillow):
+    python benchmarks/image_pipeline_bench.py --size 1600
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from image_pipeline import PILLOW_AVAILABLE, ImageRejected, process_upload, sanitize_svg
+
+UNSAFE_SVGS = {
+    'script': b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script><circle r="5"/></svg>',
+    'onload': b'<svg xmlns="http://www.w3.org/2000/svg" onload="alert(1)"><circle r="5"/></svg>',
+    'external href': (b'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">'
+                      b'<image xlink:href="https://evil.example/x.png"/></svg>'),
+    'javascript href': b'<svg xmlns="http://www.w3.org/2000/svg"><a href="javascript:alert(1)"><circle r="5"/></a></svg>',
+    'foreignObject': (b'<svg xmlns="http://www.w3.org/2000/svg"><foreignObject>'
+                      b'<iframe xmlns="http://www.w3.org/1999/xhtml" src="https://evil.example"/></foreignObject></svg>'),
+    'css import': b'<svg xmlns="http://www.w3.org/2000/svg"><style>@import url(https://evil.example/a.css);</style></svg>',
+}
+FORBIDDEN = [b'script', b'onload', b'evil.example', b'javascript:', b'foreignObject']
+
+
+def sample_image(size: int) -> bytes:
+    """یک PNG نمونه با گرادیان، نویز و متادیتا (شبیه عکس یا لوگوی export شده)"""
+    from PIL import Image
+    gradient = Image.linear_gradient('L').resize((size, size))
+    noise = Image.effect_noise((size, size), 40)
+    image = Image.merge('RGB', (gradient, noise, gradient.rotate(90)))
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    exif[0x0131] = 'Editor 1.0'
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', exif=exif)
+    return buffer.getvalue()
+
+
+def check_svgs() -> int:
+    failures = 0
+    for name, data in UNSAFE_SVGS.items():
+        result = sanitize_svg(data)
+        leaked = [token.decode() for token in FORBIDDEN if token in result]
+        if leaked:
+            failures += 1
+            print(f"❌ SVG {name}: {leaked} در خروجی باقی مانده است")
+    try:
+        sanitize_svg(b'<?xml version="1.0"?><!DOCTYPE svg [<!ENTITY a "aaaa">]><svg>&a;</svg>')
+        failures += 1
+        print("❌ SVG دارای ENTITY پذیرفته شد")
+    except ImageRejected:
+        pass
+    print(f"{len(UNSAFE_SVGS) + 1} نمونه SVG بررسی شد، {failures} خطا")
+    return failures
+
+
+def check_upload(kind: str, data: bytes) -> tuple:
+    from PIL import Image
+
+    start = time.perf_counter()
+    result = process_upload(kind, f'sample-{kind}.png', data)
+    elapsed = time.perf_counter() - start
+
+    failures = 0
+    for name, content in result['files'].items():
+        image = Image.open(io.BytesIO(content))
+        if image.getexif() or image.info.get('icc_profile') or image.info.get('exif'):
+            failures += 1
+            print(f"❌ متادیتا در {name} حذف نشده است")
+
+    first_paint = {
+        mimetype: sum(len(result['files'][name]) for name, descriptor in entries if descriptor in ('1x', '2x'))
+        for mimetype, entries in result['srcset'].items()
+    }
+    report = {
+        'original_bytes': len(data),
+        'variants': {name: len(content) for name, content in result['files'].items()},
+        # مرورگر فقط یکی از 1x یا 2x را دانلود می‌کند؛ مجموع هر دو کران بالا است
+        'first_paint_bytes_1x_plus_2x': first_paint,
+        'reduction': {mimetype: round(len(data) / size, 1) for mimetype, size in first_paint.items()},
+        'process_ms': round(elapsed * 1000, 1),
+    }
+    return report, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='بررسی پردازش تصاویر آپلود شده')
+    parser.add_argument('--size', type=int, default=1600, help='ابعاد تصویر نمونه (پیکسل)')
+    args = parser.parse_args()
+
+    failures = check_svgs()
+    if not PILLOW_AVAILABLE:
+        print("Pillow نصب نیست؛ تصاویر بدون تغییر ذخیره می‌شوند")
+        sys.exit(1 if failures else 0)
+
+    data = sample_image(args.size)
+    results = {}
+    for kind in ('logo', 'icon'):
+        results[kind], kind_failures = check_upload(kind, data)
+        failures += kind_failures
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+تست بار: مقایسه سقف هم‌زمانی حالت WSGI (gunicorn sync) و ASGI (uvicorn)
+
+هر دو حالت در برابر سرور جعلی OpenAI با تأخیر ثابت اجرا می‌شوند. بیشترین تعداد
+درخواست هم‌زمانی که به سرور جعلی رسیده، سقف واقعی هم‌زمانی سرور چت بات را نشان می‌دهد.
+
+اجرا:
+    python benchmarks/load_test.py --latency 1.0 --concurrency 64 --requests 256
+"""
+
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_openai import start_mock_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# تنظیمات سرور در بنچمارک‌ها:
+# - محدودیت نرخ IP همه درخواست‌ها (از یک IP) را رد می‌کند
+# - کش پاسخ، پیام‌های تکراری بنچمارک را بدون فراخوانی OpenAI پاسخ می‌دهد و به جای سقف
+#   هم‌زمانی سرور، سرعت کش اندازه‌گیری می‌شود
+# - استخراج تدریجی اطلاعات مشتری برای هر نوبت یک فراخوانی اضافه به سرور جعلی می‌فرستد
+BENCH_ENV = {
+    'RATE_LIMIT_ENABLED': '0',
+    'RESPONSE_CACHE_ENABLED': '0',
+    'CUSTOMER_EXTRACTION_ENABLED': '0',
+}
+
+SERVER_COMMANDS = {
+    'wsgi': ['gunicorn', '--bind', '127.0.0.1:{port}', '--pythonpath', '{root}', '--workers', '{workers}',
+             '--timeout', '120', 'chatbot_web:app'],
+    'asgi': ['gunicorn', '--bind', '127.0.0.1:{port}', '--pythonpath', '{root}', '-k', 'uvicorn.workers.UvicornWorker',
+             '--workers', '{workers}', '--timeout', '120', 'chatbot_asgi:app'],
+    # سرور توسعه Flask (یک پردازه چند thread)؛ برای سیستم‌هایی که gunicorn ندارند
+    'flask': [sys.executable, '-m', 'flask', '--app', 'chatbot_web:app', 'run', '--port', '{port}', '--with-threads'],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode: str, workers: int, mock_url: str, workdir: str, extra_env: dict = None):
+    """راه‌اندازی سرور چت بات در یک پردازه جداگانه"""
+    port = free_port()
+    command = [part.format(workers=workers, port=port, root=ROOT) for part in SERVER_COMMANDS[mode]]
+    env = dict(os.environ, OPENAI_API_KEY='sk-mock', OPENAI_BASE_URL=mock_url, **(extra_env or {}))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f'{url}/health', timeout=1)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'سرور {mode} راه‌اندازی نشد')
+
+
+async def run_load(url: str, concurrency: int, total: int) -> dict:
+    """ارسال total درخواست /chat با concurrency درخواست هم‌زمان"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f'{url}/chat', json={
+                        'message': 'قیمت محصولات چقدر است؟',
+                        'session_id': f'load-{i}',
+                    })
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='مقایسه هم‌زمانی WSGI و ASGI')
+    parser.add_argument('--latency', type=float, default=1.0, help='تأخیر سرور جعلی OpenAI (ثانیه)')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    args = parser.parse_args()
+
+    mock = start_mock_server(latency=args.latency)
+    results = {}
+    for mode in args.modes.split(','):
+        with tempfile.TemporaryDirectory() as workdir:
+            process, url = start_server(mode, args.workers, mock.base_url, workdir, extra_env=BENCH_ENV)
+            try:
+                mock.reset_stats()
+                result = asyncio.run(run_load(url, args.concurrency, args.requests))
+                result['peak_upstream_concurrency'] = mock.stats()['peak_in_flight']
+                results[mode] = result
+            finally:
+                process.terminate()
+                process.wait()
+        print(f"{mode}: {json.dumps(results[mode], ensure_ascii=False)}")
+
+    print(json.dumps({'latency_s': args.latency, 'concurrency': args.concurrency,
+                      'workers': args.workers, 'results': results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+سرور جعلی سازگار با OpenAI برای تست بار و بنچمارک
+
+فقط مسیر chat/completions را پیاده‌سازی می‌کند، با تأخیر قابل تنظیم و پشتیبانی از
+حالت جریانی (stream). بیشترین تعداد درخواست هم‌زمان دریافتی را هم ثبت می‌کند تا
+سقف هم‌زمانی سرور چت بات قابل اندازه‌گیری باشد.
+
+اجرا به صورت مستقل:
+    python benchmarks/mock_openai.py --port 8099 --latency 1.0
+سپس چت بات را با OPENAI_BASE_URL=http://127.0.0.1:8099/v1 اجرا کنید.
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "سلام! من پشتیبان برند تشکر هستم. چطور می‌تونم کمکتون کنم؟"
+DEFAULT_EXTRACTION = {
+    "name": "علی احمدی", "phone": "09123456789", "email": None, "address": None,
+    "product": "محصول شماره 1", "quantity": "2", "price": None, "notes": None,
+}
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """سرور HTTP جعلی OpenAI با آمار هم‌زمانی"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency: float = 0.5, token_delay: float = 0.02):
+        """
+        Args:
+            address: (host, port)
+            latency: تأخیر پیش از اولین توکن (ثانیه)
+            token_delay: فاصله بین توکن‌ها در حالت stream (ثانیه)
+        """
+        super().__init__(address, MockOpenAIHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.total_requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.peak_in_flight = self.in_flight
+            self.total_requests = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'peak_in_flight': self.peak_in_flight, 'total_requests': self.total_requests}
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """پاسخ‌گوی مسیر chat/completions"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        server: MockOpenAIServer = self.server
+        server.enter()
+        try:
+            time.sleep(server.latency)
+            messages = request.get('messages') or [{}]
+            if request.get('response_format') or 'JSON' in messages[0].get('content', ''):
+                content = json.dumps(DEFAULT_EXTRACTION, ensure_ascii=False)
+            else:
+                content = DEFAULT_REPLY
+            usage = {
+                'prompt_tokens': sum(len(m.get('content', '')) for m in request.get('messages', [])) // 4,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': 0,
+                'prompt_tokens_details': {'cached_tokens': 0},
+            }
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+            if request.get('stream'):
+                self._stream(request, content, usage)
+            else:
+                self._send_json(200, {
+                    'id': 'chatcmpl-mock',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': request.get('model', 'gpt-4o-mini'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': usage,
+                })
+        finally:
+            server.leave()
+
+    def _stream(self, request: dict, content: str, usage: dict):
+        """ارسال پاسخ به صورت Server-Sent Events مانند OpenAI"""
+        server: MockOpenAIServer = self.server
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta: dict, finish_reason=None, chunk_usage=None):
+            payload = {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': request.get('model', 'gpt-4o-mini'),
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}] if delta is not None else [],
+            }
+            if chunk_usage:
+                payload['usage'] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        try:
+            chunk({'role': 'assistant', 'content': ''})
+            for word in content.split(' '):
+                time.sleep(server.token_delay)
+                chunk({'content': word + ' '})
+            chunk({}, finish_reason='stop')
+            if (request.get('stream_options') or {}).get('include_usage'):
+                chunk(None, chunk_usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_mock_server(host: str = '127.0.0.1', port: int = 0, latency: float = 0.5,
+                      token_delay: float = 0.02) -> MockOpenAIServer:
+    """راه‌اندازی سرور جعلی در یک thread پس‌زمینه"""
+    server = MockOpenAIServer((host, port), latency=latency, token_delay=token_delay)
+    threading.Thread(target=server.serve_forever, name='mock-openai', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='سرور جعلی OpenAI')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer((args.host, args.port), latency=args.latency, token_delay=args.token_delay)
+    print(f"🚀 سرور جعلی OpenAI: {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,112 @@
+"""
+بررسی خروجی و سرعت نرمال‌ساز متن فارسی
+
+1. همه نمونه‌های persian_golden.json با normalize_persian و با PersianStreamNormalizer
+   (با اندازه‌های مختلف بخش و تقسیم تصادفی) بررسی می‌شوند. نرمال‌سازی دوباره خروجی
+   هم نباید آن را تغییر دهد.
+2. زمان نرمال‌سازی یک پاسخ معمولی (حدود 500 توکن) در هر دو حالت اندازه‌گیری می‌شود.
+
+اجرا:
+    python benchmarks/persian_normalizer_bench.py --iterations 2000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from persian_normalizer import PersianStreamNormalizer, normalize_persian
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'persian_golden.json')
+
+SAMPLE_RESPONSE = (
+    "سلام! از اینکه با برند تشکر تماس گرفتید ممنونیم .\n\n"
+    "محصولات پرفروش ما:\n"
+    "- کيف چرمی دست‌دوز ، قیمت ٢٥٠ هزار تومان\n"
+    "  - رنگ‌بندی:مشکی ، قهوه‌ای\n"
+    "- کفش روزمره با ارسال رايگان\n\n"
+    "برای ثبت سفارش لطفا نام ، شماره تماس و آدرس خود را بفرمایید .آیا سوال دیگری دارید؟"
+) * 4
+
+
+def stream_normalize(text: str, sizes) -> str:
+    """نرمال‌سازی متن با تقسیم آن به بخش‌هایی با اندازه‌های داده شده"""
+    normalizer = PersianStreamNormalizer()
+    parts, position = [], 0
+    for size in sizes:
+        if position >= len(text):
+            break
+        parts.append(normalizer.feed(text[position:position + size]))
+        position += size
+    if position < len(text):
+        parts.append(normalizer.feed(text[position:]))
+    parts.append(normalizer.flush())
+    return ''.join(parts)
+
+
+def check_golden(seed: int = 0) -> int:
+    """بررسی نمونه‌های طلایی؛ تعداد خطاها را برمی‌گرداند"""
+    with open(GOLDEN_FILE, encoding='utf-8') as f:
+        cases = json.load(f)
+
+    rng = random.Random(seed)
+    failures = 0
+    for case in cases:
+        text, expected = case['input'], case['expected']
+        results = {'normalize': normalize_persian(text), 'idempotent': normalize_persian(expected)}
+        for size in (1, 2, 3, 7):
+            results[f'stream/{size}'] = stream_normalize(text, [size] * len(text))
+        for attempt in range(20):
+            results[f'stream/random{attempt}'] = stream_normalize(text, [rng.randint(1, 6) for _ in text])
+
+        for mode, result in results.items():
+            if result != expected:
+                failures += 1
+                print(f"❌ {case['name']} ({mode}): {result!r} != {expected!r}")
+    print(f"{len(cases)} نمونه طلایی بررسی شد، {failures} خطا")
+    return failures
+
+
+def benchmark(iterations: int) -> dict:
+    """زمان نرمال‌سازی یک پاسخ نمونه (میکروثانیه)"""
+    # بخش‌های حدود 4 کاراکتری مشابه توکن‌های جریانی OpenAI
+    chunks = [SAMPLE_RESPONSE[i:i + 4] for i in range(0, len(SAMPLE_RESPONSE), 4)]
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        normalize_persian(SAMPLE_RESPONSE)
+    full = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        normalizer = PersianStreamNormalizer()
+        for chunk in chunks:
+            normalizer.feed(chunk)
+        normalizer.flush()
+    streamed = (time.perf_counter() - start) / iterations
+
+    return {
+        'response_chars': len(SAMPLE_RESPONSE),
+        'stream_chunks': len(chunks),
+        'normalize_us': round(full * 1e6, 1),
+        'stream_us': round(streamed * 1e6, 1),
+        'stream_us_per_chunk': round(streamed * 1e6 / len(chunks), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='بررسی خروجی و سرعت نرمال‌ساز متن فارسی')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = check_golden()
+    print(json.dumps(benchmark(args.iterations), indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
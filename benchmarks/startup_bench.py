@@ -0,0 +1,131 @@
+"""
+زمان شروع برنامه: import و اولین درخواست
+
+در هر اجرا یک پردازه تازه `python -X importtime` ساخته می‌شود که ماژول برنامه را import کرده
+و اولین درخواست /livez و /save-customer را با test client اجرا می‌کند. خروجی importtime
+(زمان تجمعی هر ماژول) خوانده و کندترین ماژول‌ها گزارش می‌شوند. همچنین بررسی می‌شود که
+وابستگی‌های سنگین (pandas، openpyxl، openai، PIL) هنگام import بارگذاری نشده باشند.
+
+اجرا:
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --module chatbot_asgi --max-import-ms 500
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# وابستگی‌هایی که فقط در اولین استفاده import می‌شوند
+LAZY_MODULES = ('pandas', 'openpyxl', 'openai', 'PIL', 'gspread')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+PROBE = r'''
+import sys, time, json
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+loaded = sorted(name for name in {lazy!r} if name in sys.modules)
+import chatbot_web
+client = chatbot_web.app.test_client()
+client.get('/livez')
+first_request = time.perf_counter()
+saved = client.post('/save-customer', json={{'session_id': 'startup-bench', 'name': 'x', 'phone': '09120000000'}})
+first_save = time.perf_counter()
+# لاگ‌های برنامه در stdout نوشته می‌شوند؛ نتیجه در فایل جداگانه
+with open('startup.json', 'w') as f:
+    json.dump({{
+        'import_ms': (imported - started) * 1000,
+        'first_request_ms': (first_request - imported) * 1000,
+        'first_save_ms': (first_save - first_request) * 1000,
+        'save_status': saved.status_code,
+        'eager_heavy_modules': loaded,
+    }}, f)
+'''
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    خواندن خروجی -X importtime
+
+    Returns:
+        {نام ماژول: زمان تجمعی (میلی‌ثانیه)} فقط برای importهای سطح اول هر ماژول
+    """
+    cumulative = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2)) / 1000
+    return cumulative
+
+
+def run_once(module: str, workdir: str) -> tuple:
+    env = dict(os.environ, PYTHONPATH=ROOT, OPENAI_API_KEY='', RATE_LIMIT_ENABLED='0',
+               GOOGLE_SHEET_ID='', PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    )
+    with open(os.path.join(workdir, 'startup.json')) as f:
+        report = json.load(f)
+    return report, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='زمان import و اولین درخواست برنامه')
+    parser.add_argument('--module', default='chatbot_web', choices=['chatbot_web', 'chatbot_asgi'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='تعداد کندترین ماژول‌ها در گزارش')
+    parser.add_argument('--max-import-ms', type=float, default=None,
+                        help='خطا اگر میانه زمان import از این مقدار بیشتر باشد')
+    args = parser.parse_args()
+
+    reports, slowest = [], {}
+    for _ in range(args.runs):
+        # پوشه کاری جداگانه تا پایگاه داده و فایل‌های ساخته شده از اجرای قبلی استفاده نشوند
+        with tempfile.TemporaryDirectory() as workdir:
+            report, cumulative = run_once(args.module, workdir)
+        reports.append(report)
+        for name, elapsed in cumulative.items():
+            slowest.setdefault(name, []).append(elapsed)
+
+    median = lambda key: round(statistics.median(r[key] for r in reports), 1)
+    summary = {
+        'module': args.module,
+        'runs': args.runs,
+        'import_ms': median('import_ms'),
+        'importtime_ms': round(statistics.median(slowest.get(args.module, [0])), 1),
+        'first_request_ms': median('first_request_ms'),
+        'first_save_ms': median('first_save_ms'),
+        'save_status': sorted({r['save_status'] for r in reports}),
+        'eager_heavy_modules': sorted({name for r in reports for name in r['eager_heavy_modules']}),
+        'slowest_imports_ms': dict(sorted(
+            ((name, round(statistics.median(values), 1)) for name, values in slowest.items()
+             if '.' not in name and name != args.module),
+            key=lambda item: item[1], reverse=True,
+        )[:args.top]),
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+    failures = 0
+    if summary['eager_heavy_modules']:
+        failures += 1
+        print(f"❌ وابستگی‌های سنگین هنگام import بارگذاری شدند: {summary['eager_heavy_modules']}")
+    if summary['save_status'] != [200]:
+        failures += 1
+        print(f"❌ ذخیره اطلاعات مشتری ناموفق بود: {summary['save_status']}")
+    if args.max_import_ms is not None and summary['import_ms'] > args.max_import_ms:
+        failures += 1
+        print(f"❌ زمان import ({summary['import_ms']}ms) بیشتر از {args.max_import_ms}ms است")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+حافظه و زمان ذخیره اطلاعات مشتریان: موتور ردیفی در برابر pandas
+
+هر حالت در پردازه جداگانه اجرا می‌شود تا بیشینه حافظه (RSS) آن مستقل اندازه‌گیری شود:
+
+- rows: ذخیره تک‌تک مشتریان در دفتر ثبت، خواندن همه ردیف‌ها و ساخت خروجی Excel
+  (write-only)؛ pandas نباید import شود.
+- dataframe: همان کارها به همراه get_all_customers(as_dataframe=True) برای تحلیل داده
+- legacy: روش قدیمی هر ذخیره (read_excel + concat + to_excel روی کل فایل) برای مقایسه
+  زمان هر ذخیره (نیازمند pandas؛ با --legacy-saves محدود می‌شود چون هزینه آن با تعداد
+  ردیف‌ها رشد می‌کند)
+
+اجرا:
+    python benchmarks/storage_bench.py --saves 2000 --legacy-saves 200
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import os, sys, json, time, resource, statistics
+import data_storage
+from data_storage import CustomerDataStorage, FIELDS, HEADERS
+
+mode, saves = sys.argv[1], int(sys.argv[2])
+
+def customer(i):
+    return {'customer_number': f'CUST-{i:04d}', 'name': f'مشتری {i}', 'phone': f'0912{i:07d}',
+             'email': f'c{i}@example.com', 'address': 'تهران', 'product': 'محصول', 'quantity': '1',
+             'price': '100000', 'notes': '', 'session_id': f'bench-{i}'}
+
+timings = []
+report = {'mode': mode, 'saves': saves}
+if mode == 'legacy':
+    import pandas as pd
+    path = 'legacy.xlsx'
+    pd.DataFrame(columns=HEADERS).to_excel(path, index=False, engine='openpyxl')
+    for i in range(saves):
+        row = dict(zip(HEADERS, CustomerDataStorage.ledger_row(customer(i), time.strftime('%Y/%m/%d %H:%M:%S'))))
+        started = time.perf_counter()
+        df = pd.read_excel(path, engine='openpyxl')
+        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+        df.to_excel(path, index=False, engine='openpyxl')
+        timings.append(time.perf_counter() - started)
+else:
+    storage = CustomerDataStorage(google_sheet_id='')
+    for i in range(saves):
+        started = time.perf_counter()
+        storage.save_customer_data(customer(i))
+        timings.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    data = storage.get_all_customers(as_dataframe=(mode == 'dataframe'))
+    report['read_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    report['read_rows'] = len(data) - (0 if mode == 'dataframe' else 1)
+    del data
+    started = time.perf_counter()
+    storage.export_excel()
+    report['export_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+timings.sort()
+report.update({
+    'save_p50_ms': round(statistics.median(timings) * 1000, 3),
+    'save_p99_ms': round(timings[int(len(timings) * 0.99) - 1] * 1000, 3),
+    'save_max_ms': round(timings[-1] * 1000, 3),
+    'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    'pandas_loaded': 'pandas' in sys.modules,
+})
+with open('report.json', 'w') as f:
+    json.dump(report, f)
+'''
+
+
+def run_mode(mode: str, saves: int) -> dict:
+    env = dict(os.environ, PYTHONPATH=ROOT, GOOGLE_SHEET_ID='', PYTHONDONTWRITEBYTECODE='1')
+    # پوشه کاری جداگانه تا هر حالت با دفتر ثبت خالی شروع شود
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run([sys.executable, '-c', PROBE, mode, str(saves)],
+                                cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            # مثلاً نسخه ناسازگار pandas و openpyxl در حالت legacy
+            return {'mode': mode, 'error': result.stderr.strip().splitlines()[-1]}
+        with open(os.path.join(workdir, 'report.json')) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='حافظه و زمان ذخیره اطلاعات مشتریان')
+    parser.add_argument('--saves', type=int, default=2000, help='تعداد مشتریان ذخیره شده')
+    parser.add_argument('--legacy-saves', type=int, default=200,
+                        help='تعداد ذخیره‌ها در روش قدیمی pandas (0 برای رد کردن)')
+    args = parser.parse_args()
+
+    from importlib.util import find_spec
+    pandas_available = find_spec('pandas') is not None
+
+    results = {'rows': run_mode('rows', args.saves)}
+    if pandas_available:
+        results['dataframe'] = run_mode('dataframe', args.saves)
+        if args.legacy_saves:
+            results['legacy'] = run_mode('legacy', args.legacy_saves)
+    else:
+        print("pandas نصب نیست؛ فقط حالت rows اجرا می‌شود")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    failures = 0
+    if 'error' in results['rows']:
+        print(f"❌ {results['rows']['error']}")
+        sys.exit(1)
+    if results['rows']['pandas_loaded']:
+        failures += 1
+        print("❌ pandas در موتور ردیفی import شد")
+    if results['rows']['read_rows'] != args.saves:
+        failures += 1
+        print(f"❌ تعداد ردیف‌های خوانده شده ({results['rows']['read_rows']}) با ذخیره‌ها برابر نیست")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
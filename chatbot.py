@@ -4,17 +4,38 @@
 
 import os
 import json
+import asyncio
+import threading
+from contextlib import nullcontext
 from datetime import datetime
-from openai import OpenAI
-from typing import List, Dict, Optional
+from openai import AsyncOpenAI
+from typing import Callable, ContextManager, List, Dict, Iterator, Optional, Tuple
+from conversation_store import ConversationStore, create_conversation_store
+from response_cache import ResponseCache, create_response_cache, fingerprint
+from history_manager import HistoryManager, TokenCounter
+from customer_extractor import (
+    CustomerExtractor, EXTRACTION_PARAMS, build_extraction_messages, create_customer_extractor, parse_extraction
+)
+from config import Config
+from metrics import inc, registry, span
+from openai_client import get_async_openai_client, get_openai_client
+from persian_normalizer import PersianStreamNormalizer, normalize_persian
+from rate_limiter import RateLimitExceeded
+from structured_logging import get_logger
+
+log = get_logger(__name__)
 
 class TashakorChatBot:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, conversation_store: Optional[ConversationStore] = None,
+                 llm_slot: Optional[Callable[[], ContextManager]] = None):
         """
         Initialize the Tashakor brand chatbot
         
         Args:
             api_key: OpenAI API key. If None, will read from environment variable OPENAI_API_KEY
+            conversation_store: ذخیره‌ساز سابقه مکالمات. If None, will be built from environment variables
+            llm_slot: جایگاه سقف فراخوانی‌های هم‌زمان OpenAI (اختیاری)؛ فقط هنگام فراخوانی واقعی
+                مدل گرفته می‌شود و پاسخ‌های کش شده جایگاهی اشغال نمی‌کنند
         """
         self.name = "پشتیبان برند تشکر"
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
@@ -26,7 +47,8 @@ class TashakorChatBot:
         if not self.api_key.startswith('sk-'):
             raise ValueError(f"Invalid API key format. API key should start with 'sk-'. Current key starts with: {self.api_key[:10]}...")
         
-        self.client = OpenAI(api_key=self.api_key)
+        # کلاینت مشترک پردازه (pool اتصال، مهلت‌ها، تلاش مجدد و circuit breaker)
+        self.client = get_openai_client(self.api_key)
         
         # کانتکس برند تشکر
         self.brand_context = """
@@ -48,14 +70,190 @@ class TashakorChatBot:
         همیشه مودب، صبور و مفید باشید. اگر اطلاعات دقیقی درباره یک محصول یا سرویس ندارید، صادقانه بگویید و قول دهید که با تیم مربوطه تماس بگیرید.
         """
         
-        # ذخیره سابقه مکالمات برای هر کاربر (session-based)
-        self.conversations: Dict[str, List[Dict]] = {}
+        # تنظیمات فراخوانی API (بهینه برای فارسی)
+        self.completion_params = {
+            "model": "gpt-4o-mini",  # می‌توانید به gpt-4 تغییر دهید
+            "temperature": 0.7,
+            "max_tokens": 500,
+            # تنظیمات اضافی برای بهبود کیفیت فارسی
+            "presence_penalty": 0.1,
+            "frequency_penalty": 0.1
+        }
+        
+        # ذخیره سابقه مکالمات برای هر کاربر (session-based، مشترک بین workerها با حذف TTL)
+        self.conversations: ConversationStore = conversation_store or create_conversation_store()
+        
+        # پنجره سابقه بر اساس بودجه توکن؛ پیام‌های قدیمی در پس‌زمینه خلاصه می‌شوند
+        self.history = HistoryManager(
+            self.conversations,
+            token_budget=Config.CHATBOT_INPUT_TOKEN_BUDGET,
+            max_stored_messages=Config.CHATBOT_MAX_HISTORY,
+            summarize=self._summarize,
+            counter=TokenCounter(self.completion_params["model"])
+        )
+        
+        # آمار مصرف توکن (برای بررسی نرخ استفاده از کش پیشوند prompt در OpenAI)
+        self.usage_stats = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+        self._usage_lock = threading.Lock()
+        
+        # کش پاسخ سوالات تکراری (None اگر غیرفعال باشد)
+        self.response_cache: Optional[ResponseCache] = create_response_cache(embed=self._embed)
+        
+        # نرمال‌سازی متن فارسی پاسخ‌ها (حروف عربی، نیم‌فاصله و فاصله علائم نگارشی)
+        self.normalize_output = os.getenv('PERSIAN_NORMALIZE', '1') == '1'
+        
+        # جایگاه فراخوانی OpenAI (RateLimitExceeded اگر ظرفیت پر باشد)
+        self.llm_slot = llm_slot or nullcontext
+        
+        # استخراج تدریجی اطلاعات مشتری پس از هر نوبت (None اگر غیرفعال باشد)
+        self.extractor: Optional[CustomerExtractor] = create_customer_extractor(
+            self._extract_customer_info, llm_slot=llm_slot
+        )
+        
+        # شمارنده‌های hit/miss کش‌ها هنگام نوشتن snapshot متریک‌ها خوانده می‌شوند
+        # (آخرین چت بات ساخته شده در پردازه؛ چت بات‌های قبلی نگه داشته و دوباره شمرده نمی‌شوند)
+        registry.register_collector('chatbot.cache', self.cache_metrics)
+    
+    def cache_metrics(self) -> List[Tuple[str, Dict, float]]:
+        """مقادیر cache_requests_total از شمارنده‌های کش مکالمه و کش پاسخ"""
+        values = [
+            ('cache_requests_total', {'cache': 'conversation', 'result': 'hit'}, self.conversations.hits),
+            ('cache_requests_total', {'cache': 'conversation', 'result': 'miss'}, self.conversations.misses),
+        ]
+        if self.response_cache is not None:
+            values += [
+                ('cache_requests_total', {'cache': 'response', 'result': 'exact_hit'}, self.response_cache.exact_hits),
+                ('cache_requests_total', {'cache': 'response', 'result': 'semantic_hit'}, self.response_cache.semantic_hits),
+                ('cache_requests_total', {'cache': 'response', 'result': 'miss'}, self.response_cache.misses),
+            ]
+        return values
+    
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """کلاینت AsyncOpenAI برای حالت ASGI (اتصال‌های آن به event loop جاری وابسته‌اند)"""
+        return get_async_openai_client(self.api_key)
+    
+    def _embed(self, text: str) -> List[float]:
+        """محاسبه embedding متن برای لایه معنایی کش پاسخ"""
+        response = self.client.embeddings.create(
+            model=os.getenv('RESPONSE_CACHE_EMBEDDING_MODEL', 'text-embedding-3-small'),
+            input=text
+        )
+        return response.data[0].embedding
+    
+    def _summarize(self, previous_summary: str, messages: List[Dict]) -> str:
+        """ادغام پیام‌های قدیمی مکالمه در خلاصه قبلی (در thread پس‌زمینه اجرا می‌شود)"""
+        conversation_text = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        prompt = f"""خلاصه قبلی:
+{previous_summary or '-'}
+
+ادامه مکالمه:
+{conversation_text}
+
+یک خلاصه کوتاه و به‌روز از کل مکالمه بنویسید که نیاز مشتری، محصولات مورد بحث، اطلاعات تماس و تصمیم‌های گرفته شده را حفظ کند."""
+        response = self.client.chat.completions.create(
+            model=self.completion_params["model"],
+            messages=[
+                {"role": "system", "content": "شما خلاصه‌ساز مکالمات پشتیبانی هستید. فقط خلاصه را به فارسی برگردانید."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=300
+        )
+        self._record_usage(getattr(response, 'usage', None))
+        return response.choices[0].message.content.strip()
+    
+    def _extract_customer_info(self, messages: List[Dict], profile: Dict) -> Dict:
+        """استخراج اطلاعات مشتری از پیام‌های جدید یک نوبت (در thread پس‌زمینه اجرا می‌شود)"""
+        response = self.client.chat.completions.create(
+            messages=build_extraction_messages(messages, profile),
+            **EXTRACTION_PARAMS
+        )
+        self._record_usage(getattr(response, 'usage', None))
+        return parse_extraction(response.choices[0].message.content)
+    
+    def context_fingerprint(self) -> str:
+        """اثر انگشت کانتکس برند و مدل (کلید کش پاسخ)"""
+        return fingerprint(self._system_message, self.completion_params["model"])
+    
+    @staticmethod
+    def _history_length(messages: List[Dict]) -> int:
+        """تعداد پیام‌های قبلی مکالمه (بدون پیام‌های سیستم و پیام فعلی کاربر)"""
+        return sum(1 for message in messages if message["role"] != "system") - 1
+    
+    def _cached_response(self, user_input: str, messages: List[Dict]) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        جستجوی پاسخ در کش (فقط برای نوبت اول یا مکالمه‌های کوتاه)
+        
+        Returns:
+            (پاسخ کش شده یا None، embedding پیام)
+        """
+        if self.response_cache is None or not self.response_cache.eligible(self._history_length(messages)):
+            return None, None
+        try:
+            return self.response_cache.get(user_input, self.context_fingerprint())
+        except Exception as e:
+            log.warning('response_cache.lookup_failed', error=str(e), error_type=type(e).__name__)
+            return None, None
+    
+    def _cache_response(self, user_input: str, messages: List[Dict], bot_response: str,
+                        embedding: Optional[List[float]]):
+        """ثبت پاسخ در کش"""
+        if self.response_cache is not None and self.response_cache.eligible(self._history_length(messages)):
+            self.response_cache.put(user_input, self.context_fingerprint(), bot_response, embedding)
+    
+    @property
+    def brand_context(self) -> str:
+        """کانتکس برند"""
+        return self._brand_context
+    
+    @brand_context.setter
+    def brand_context(self, value: str):
+        # پیام سیستم فقط با تغییر کانتکس برند دوباره ساخته می‌شود تا پیشوند prompt
+        # ثابت بماند و کش پیشوند prompt در OpenAI استفاده شود
+        self._brand_context = value
+        self._system_message = self._build_system_message()
+    
+    def _record_usage(self, usage):
+        """ثبت مصرف توکن از فیلد usage پاسخ API (شامل توکن‌های کش شده پیشوند prompt)"""
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        prompt_tokens = usage.prompt_tokens or 0
+        cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+        completion_tokens = usage.completion_tokens or 0
+        with self._usage_lock:
+            self.usage_stats['requests'] += 1
+            self.usage_stats['prompt_tokens'] += prompt_tokens
+            self.usage_stats['cached_tokens'] += cached_tokens
+            self.usage_stats['completion_tokens'] += completion_tokens
+        inc('openai_tokens_total', prompt_tokens, type='prompt')
+        inc('openai_tokens_total', cached_tokens, type='cached')
+        inc('openai_tokens_total', completion_tokens, type='completion')
+    
+    def get_usage_stats(self) -> Dict:
+        """آمار مصرف توکن و نرخ hit کش پیشوند prompt"""
+        with self._usage_lock:
+            stats = dict(self.usage_stats)
+        prompt_tokens = stats['prompt_tokens']
+        stats['cached_ratio'] = round(stats['cached_tokens'] / prompt_tokens, 4) if prompt_tokens else 0.0
+        return stats
     
     def get_system_message(self) -> str:
-        """پیام سیستم برای ChatGPT"""
+        """پیام سیستم برای ChatGPT (از پیش ساخته شده)"""
+        return self._system_message
+    
+    def get_date_message(self) -> Dict:
+        """
+        پیام تاریخ امروز
+        
+        بخش‌های متغیر در انتهای لیست پیام‌ها و با دقت روز قرار می‌گیرند تا پیشوند ثابت prompt تغییر نکند.
+        """
+        return {"role": "system", "content": f"امروز: {datetime.now().strftime('%Y/%m/%d')}"}
+    
+    def _build_system_message(self) -> str:
+        """ساخت پیام سیستم ثابت از روی کانتکس برند"""
         return f"""{self.brand_context}
-
-        امروز: {datetime.now().strftime('%Y/%m/%d %H:%M')}
         
         دستورالعمل‌های مهم:
         1. همیشه به زبان فارسی پاسخ دهید
@@ -69,6 +267,43 @@ class TashakorChatBot:
         9. متن را به صورت خوانا و با فاصله مناسب بنویسید
         """
     
+    def _prepare_messages(self, user_input: str, session_id: str) -> List[Dict]:
+        """
+        ساخت پیام‌های ارسالی به API از سابقه مکالمه و پیام کاربر
+        
+        پیام کاربر اینجا در سابقه ذخیره نمی‌شود؛ فقط همراه پاسخ کامل (در _commit_text) ذخیره
+        می‌شود تا خطای OpenAI یا قطع جریان، پیام کاربر بی‌پاسخ در سابقه باقی نگذارد.
+        
+        Args:
+            user_input: پیام کاربر
+            session_id: شناسه جلسه
+            
+        Returns:
+            لیست پیام‌ها برای ChatGPT
+        """
+        # دریافت سابقه مکالمه برای این جلسه
+        conversation_history = self.conversations.get(session_id)
+        
+        # اضافه کردن پیام کاربر به پیام‌های این نوبت
+        user_message = {
+            "role": "user",
+            "content": user_input
+        }
+        conversation_history.append(user_message)
+        
+        # ساخت پیام‌ها برای API
+        messages = [
+            {"role": "system", "content": self.get_system_message()}
+        ]
+        
+        # اضافه کردن سابقه مکالمه (جدیدترین پیام‌ها تا سقف بودجه توکن، به همراه خلاصه پیام‌های قدیمی)
+        messages.extend(self.history.window(conversation_history))
+        messages.append(self.get_date_message())
+        
+        # سابقه ذخیره شده طولانی در پس‌زمینه خلاصه و کوتاه می‌شود
+        self.history.maybe_compact(session_id, len(conversation_history) + 1)
+        return messages
+    
     def get_response(self, user_input: str, session_id: str = "default") -> str:
         """
         دریافت پاسخ از ChatGPT با در نظر گیری سابقه مکالمه
@@ -80,74 +315,182 @@ class TashakorChatBot:
         Returns:
             پاسخ چت بات
         """
-        # دریافت سابقه مکالمه برای این جلسه
-        if session_id not in self.conversations:
-            self.conversations[session_id] = []
+        with span('chat.prepare'):
+            messages = self._prepare_messages(user_input, session_id)
         
-        conversation_history = self.conversations[session_id]
-        
-        # اضافه کردن پیام کاربر به سابقه
-        conversation_history.append({
-            "role": "user",
-            "content": user_input
-        })
+        with span('chat.cache_lookup'):
+            cached, embedding = self._cached_response(user_input, messages)
+        if cached is not None:
+            return self._commit_text(session_id, cached, user_input)
         
         try:
-            # ساخت پیام‌ها برای API
-            messages = [
-                {"role": "system", "content": self.get_system_message()}
-            ]
-            
-            # اضافه کردن سابقه مکالمه (آخرین 10 پیام برای جلوگیری از طولانی شدن)
-            recent_history = conversation_history[-10:] if len(conversation_history) > 10 else conversation_history
-            messages.extend(recent_history)
-            
             # فراخوانی API با تنظیمات بهینه برای فارسی
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # می‌توانید به gpt-4 تغییر دهید
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500,
-                # تنظیمات اضافی برای بهبود کیفیت فارسی
-                presence_penalty=0.1,
-                frequency_penalty=0.1
-            )
-            
-            bot_response = response.choices[0].message.content.strip()
+            with self.llm_slot(), span('chat.openai'):
+                response = self.client.chat.completions.create(
+                    messages=messages,
+                    **self.completion_params
+                )
             
-            # اصلاح مشکلات رایج در نوشتار فارسی (مثلاً "س لا م" -> "سلام")
-            # bot_response = self.fix_persian_text(bot_response)
-            
-            # بررسی اینکه آیا مشتری اطلاعات را کامل کرده است
-            # این بخش را می‌توانید با یک prompt خاص برای استخراج اطلاعات اضافه کنید
+            with span('chat.commit'):
+                bot_response = self._commit_response(session_id, response, user_input)
+            self._cache_response(user_input, messages, bot_response, embedding)
+            return bot_response
             
-            # اضافه کردن پاسخ به سابقه
-            conversation_history.append({
-                "role": "assistant",
-                "content": bot_response
-            })
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            error_message = f"متأسفانه خطایی رخ داد. لطفا دوباره تلاش کنید. ({str(e)})"
+            return error_message
+    
+    async def get_response_async(self, user_input: str, session_id: str = "default") -> str:
+        """
+        نسخه async از get_response برای حالت ASGI (با AsyncOpenAI)
+        
+        Args:
+            user_input: پیام کاربر
+            session_id: شناسه جلسه برای ذخیره سابقه مکالمه
             
+        Returns:
+            پاسخ چت بات
+        """
+        # دسترسی به ذخیره‌ساز مکالمات همگام است و در thread جداگانه اجرا می‌شود تا event loop مسدود نشود
+        with span('chat.prepare'):
+            messages = await asyncio.to_thread(self._prepare_messages, user_input, session_id)
+        
+        with span('chat.cache_lookup'):
+            cached, embedding = await asyncio.to_thread(self._cached_response, user_input, messages)
+        if cached is not None:
+            return await asyncio.to_thread(self._commit_text, session_id, cached, user_input)
+        
+        try:
+            # انتظار برای جایگاه خالی در thread جداگانه انجام می‌شود تا event loop مسدود نشود
+            slot = self.llm_slot()
+            await asyncio.to_thread(slot.__enter__)
+            try:
+                with span('chat.openai'):
+                    response = await self.async_client.chat.completions.create(
+                        messages=messages,
+                        **self.completion_params
+                    )
+            finally:
+                await asyncio.to_thread(slot.__exit__, None, None, None)
+            with span('chat.commit'):
+                bot_response = await asyncio.to_thread(self._commit_response, session_id, response, user_input)
+            self._cache_response(user_input, messages, bot_response, embedding)
             return bot_response
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             error_message = f"متأسفانه خطایی رخ داد. لطفا دوباره تلاش کنید. ({str(e)})"
             return error_message
     
+    def _commit_response(self, session_id: str, response, user_input: str) -> str:
+        """استخراج متن پاسخ API و افزودن آن به سابقه مکالمه"""
+        self._record_usage(getattr(response, 'usage', None))
+        bot_response = response.choices[0].message.content.strip()
+        
+        # اصلاح مشکلات رایج در نوشتار فارسی
+        if self.normalize_output:
+            bot_response = self.fix_persian_text(bot_response)
+        
+        return self._commit_text(session_id, bot_response, user_input)
+    
+    def _commit_text(self, session_id: str, bot_response: str, user_input: str) -> str:
+        """افزودن پیام کاربر و پاسخ به سابقه مکالمه و زمان‌بندی استخراج اطلاعات مشتری از این نوبت"""
+        user_message = {
+            "role": "user",
+            "content": user_input
+        }
+        assistant_message = {
+            "role": "assistant",
+            "content": bot_response
+        }
+        # هر دو پیام نوبت با هم اضافه می‌شوند
+        self.conversations.append(session_id, user_message, assistant_message)
+        
+        # فقط پیام‌های همین نوبت برای استخراج ارسال می‌شوند
+        if self.extractor is not None:
+            self.extractor.submit(session_id, user_message, assistant_message)
+        
+        return bot_response
+    
+    def get_response_stream(self, user_input: str, session_id: str = "default") -> Iterator[str]:
+        """
+        دریافت پاسخ از ChatGPT به صورت جریانی (توکن به توکن)
+        
+        پیام کاربر و پاسخ کامل فقط پس از پایان جریان در سابقه ذخیره می‌شوند. اگر
+        مصرف‌کننده جریان را زودتر ببندد (مثلاً قطع اتصال کاربر) یا OpenAI خطا بدهد،
+        درخواست OpenAI بسته شده و هیچ‌کدام از پیام‌های این نوبت ذخیره نمی‌شوند.
+        
+        Args:
+            user_input: پیام کاربر
+            session_id: شناسه جلسه برای ذخیره سابقه مکالمه
+            
+        Yields:
+            بخش‌های متن پاسخ
+        """
+        messages = self._prepare_messages(user_input, session_id)
+        
+        cached, embedding = self._cached_response(user_input, messages)
+        if cached is not None:
+            self._commit_text(session_id, cached, user_input)
+            yield cached
+            return
+        
+        # جایگاه تا پایان جریان (یا بسته شدن آن توسط مصرف‌کننده) نگه داشته می‌شود
+        with self.llm_slot():
+            stream = self.client.chat.completions.create(
+                messages=messages,
+                stream=True,
+                # آخرین chunk شامل usage است
+                stream_options={"include_usage": True},
+                **self.completion_params
+            )
+            
+            parts = []
+            completed = False
+            # نرمال‌سازی تدریجی؛ خروجی نهایی با نرمال‌سازی یکجای کل پاسخ یکسان است
+            normalizer = PersianStreamNormalizer() if self.normalize_output else None
+            try:
+                for chunk in stream:
+                    if getattr(chunk, 'usage', None):
+                        self._record_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta and normalizer is not None:
+                        delta = normalizer.feed(delta)
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+                if normalizer is not None:
+                    tail = normalizer.flush()
+                    if tail:
+                        parts.append(tail)
+                        yield tail
+                completed = True
+            finally:
+                if completed:
+                    bot_response = self._commit_text(session_id, "".join(parts).strip(), user_input)
+                    self._cache_response(user_input, messages, bot_response, embedding)
+                elif hasattr(stream, 'close'):
+                    stream.close()
+    
     def clear_conversation(self, session_id: str = "default"):
         """پاک کردن سابقه مکالمه برای یک جلسه"""
-        if session_id in self.conversations:
-            del self.conversations[session_id]
+        self.conversations.clear(session_id)
     
     def get_conversation_history(self, session_id: str = "default") -> List[Dict]:
         """دریافت سابقه مکالمه"""
-        return self.conversations.get(session_id, [])
+        return self.conversations.get(session_id)
     
     def fix_persian_text(self, text: str) -> str:
         """
         اصلاح مشکلات رایج در نوشتار فارسی ChatGPT
-        - حذف فاصله بین حروف کلمات (مثلاً "س لا م" -> "سلام")
-        - اضافه کردن فاصله بین جملات
-        - حفظ فاصله بین کلمات
+        - یکسان‌سازی حروف عربی و فارسی و نیم‌فاصله‌ها
+        - اصلاح فاصله قبل و بعد از علائم نگارشی
+        - حذف فاصله‌های اضافی با حفظ خط‌های جدید
         
         Args:
             text: متن خام از ChatGPT
@@ -155,71 +498,14 @@ class TashakorChatBot:
         Returns:
             متن اصلاح شده
         """
-        import re
-        
-        if not text:
-            return text
-        
-        # تعریف کاراکترهای فارسی
-        persian_chars = r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]'
-        
-        # مرحله 1: حذف فاصله بین حروف کلمات فارسی
-        # الگو: حرف فارسی + فاصله + حرف فارسی (که بعدش فاصله + حرف فارسی نیست)
-        # این یعنی فاصله بین حروف است نه بین کلمات
-        # اما باید مراقب باشیم که فاصله بین کلمات را حفظ کنیم
-        
-        # راه حل: اگر بعد از حرف دوم، فاصله و سپس حرف فارسی نباشد، فاصله را حذف کن
-        # این یعنی فاصله بین حروف است
-        text = re.sub(rf'({persian_chars})\s+({persian_chars})(?!\s+{persian_chars})', r'\1\2', text)
-        
-        # اگر هنوز فاصله بین حروف باقی مانده (مثل "س لا م")
-        # یک الگوی ساده‌تر: حرف فارسی + فاصله + حرف فارسی (بدون شرط)
-        # اما این ممکن است فاصله بین کلمات را هم حذف کند
-        # پس باید دوباره فاصله بین کلمات را اضافه کنیم
-        
-        # راه حل بهتر: ابتدا تمام فاصله‌های بین حروف را حذف کن
-        # سپس فاصله بین کلمات را اضافه کن
-        
-        # حذف فاصله بین حروف (اما نه بین کلمات)
-        # الگو: حرف فارسی + فاصله + حرف فارسی (که بعدش فاصله + حرف فارسی نیست)
-        # این یعنی فاصله بین حروف است
-        text = re.sub(rf'({persian_chars})\s+({persian_chars})(?![{persian_chars}\s])', r'\1\2', text)
-        
-        # اگر هنوز مشکل داریم، یک الگوی ساده‌تر:
-        # حذف فاصله بین حروف فارسی که بعدش فاصله + حرف فارسی نیست
-        # این یعنی فاصله بین حروف است نه بین کلمات
-        
-        # مرحله 2: اضافه کردن فاصله بین کلمات (اگر نیاز باشد)
-        # اگر دو کلمه فارسی به هم چسبیده باشند، فاصله اضافه می‌کنیم
-        text = re.sub(rf'({persian_chars}+)({persian_chars}+)', r'\1 \2', text)
-        
-        # اما این ممکن است کلمات را جدا کند که نباید
-        # پس بهتر است فقط در موارد خاص این کار را انجام دهیم
-        
-        # مرحله 3: اضافه کردن فاصله بین جملات
-        # بعد از نقطه، علامت سوال، علامت تعجب باید فاصله باشد
-        text = re.sub(r'([.!؟])([^\s])', r'\1 \2', text)
-        
-        # بعد از ویرگول و نقطه‌ویرگول باید فاصله باشد
-        text = re.sub(r'([،؛])([^\s])', r'\1 \2', text)
-        
-        # مرحله 4: حذف فاصله‌های اضافی
-        text = re.sub(r'\s+', ' ', text)
-        
-        # مرحله 5: حذف فاصله قبل از علائم نگارشی
-        text = re.sub(r'\s+([،\.؛:!؟])', r'\1', text)
-        
-        # مرحله 6: اضافه کردن فاصله بعد از علائم نگارشی (اگر نیاز باشد)
-        text = re.sub(r'([،\.؛:!؟])([^\s\s])', r'\1 \2', text)
-        
-        # مرحله 7: حذف فاصله در ابتدا و انتها
-        text = text.strip()
-        
-        return text
+        return normalize_persian(text)
     
     def update_brand_context(self, new_context: str):
         """به‌روزرسانی کانتکس برند"""
         self.brand_context = new_context
+        # پاسخ‌های کش شده با کانتکس قبلی دیگر معتبر نیستند
+        if self.response_cache is not None:
+            self.response_cache.invalidate()
     
     def chat(self):
         """شروع گفتگو در کنسول"""
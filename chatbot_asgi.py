@@ -0,0 +1,255 @@
+"""
+نقطه ورود ASGI چت بات برند تشکر
+
+مسیرهای /chat، /extract-info و /save-customer به صورت async (با AsyncOpenAI) اجرا
+می‌شوند تا فراخوانی‌های کند OpenAI یک worker را مسدود نکنند و یک پردازه بتواند
+صدها مکالمه هم‌زمان را نگه دارد. بقیه مسیرها به همان برنامه Flask
+(chatbot_web:app) سپرده می‌شوند و قرارداد JSON همه مسیرها بدون تغییر است.
+
+اجرا:
+    uvicorn chatbot_asgi:app --host 0.0.0.0 --port 5000
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 2 --bind 0.0.0.0:5000 chatbot_asgi:app
+"""
+
+import time
+import uuid
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+import chatbot_web
+import metrics
+import structured_logging
+from structured_logging import get_logger
+from chatbot_web import (
+    EXTRACTION_PARAMS,
+    acquire_llm_slot,
+    build_customer_data,
+    build_extraction_messages,
+    check_rate_limit,
+    lookup_extracted_info,
+    parse_extraction,
+    rate_limit_payload,
+    release_llm_slot,
+    save_customer_result,
+)
+from rate_limiter import RateLimitExceeded
+
+log = get_logger(__name__)
+
+
+async def read_json(request: Request):
+    """خواندن بدنه JSON درخواست (None در صورت نامعتبر بودن)"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        structured_logging.bind(session_id=data.get('session_id'))
+    return data
+
+
+async def check_request_rate(request: Request, data):
+    """بررسی محدودیت نرخ IP و session_id (پایگاه داده در thread جداگانه)"""
+    await run_in_threadpool(
+        check_rate_limit, data,
+        request.client.host if request.client else None,
+        request.headers.get('x-forwarded-for')
+    )
+
+
+async def rate_limit_exceeded(request: Request, error: RateLimitExceeded):
+    """پاسخ 429 برای درخواست‌های رد شده توسط محدودیت نرخ"""
+    body, headers = rate_limit_payload(error)
+    return JSONResponse(body, status_code=429, headers=headers)
+
+
+def record_metrics(route: str):
+    """ثبت متریک و لاگ درخواست‌های مسیرهای async (مسیرهای Flask در after_request ثبت می‌شوند)"""
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request: Request):
+            started = time.perf_counter()
+            status = 500
+            # هر درخواست در task جداگانه اجرا می‌شود و فیلدهای همبستگی خود را دارد
+            structured_logging.clear()
+            structured_logging.bind(route=route, method=request.method)
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except RateLimitExceeded:
+                status = 429
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.inc('http_requests_total', route=route, method=request.method, status=str(status))
+                metrics.observe('http_request_duration_seconds', elapsed, route=route, method=request.method)
+                log.info('http.request', status=status, duration_ms=round(elapsed * 1000, 1))
+        return wrapper
+    return decorator
+
+
+async def get_bot():
+    """دریافت چت بات (ساخت اولیه در thread جداگانه انجام می‌شود)"""
+    return await run_in_threadpool(chatbot_web.get_bot)
+
+
+@record_metrics('/chat')
+async def chat(request: Request):
+    """API async برای دریافت پیام و ارسال پاسخ"""
+    data = await read_json(request)
+    
+    if not data:
+        return JSONResponse({'error': 'داده‌های نامعتبر'}, status_code=400)
+    
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', None)
+    
+    if not user_message:
+        return JSONResponse({'error': 'پیام خالی است'}, status_code=400)
+    
+    await check_request_rate(request, data)
+    
+    # ایجاد session_id جدید اگر وجود نداشته باشد
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    
+    current_bot = await get_bot()
+    if current_bot is None:
+        return JSONResponse({'error': 'چت بات در دسترس نیست. لطفا API key را تنظیم کنید.'}, status_code=503)
+    
+    # جایگاه فراخوانی OpenAI فقط در صورت نبودن پاسخ در کش گرفته می‌شود (داخل چت بات)
+    try:
+        response = await current_bot.get_response_async(user_message, session_id)
+        
+        return JSONResponse({
+            'response': response,
+            'bot_name': current_bot.name,
+            'session_id': session_id
+        })
+    except RateLimitExceeded:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'error': f'خطا در پردازش پیام: {str(e)}'
+        }, status_code=500)
+
+
+@record_metrics('/save-customer')
+async def save_customer(request: Request):
+    """ذخیره اطلاعات مشتری (عملیات پایگاه داده در thread جداگانه)"""
+    try:
+        data = await read_json(request)
+        
+        if not data:
+            return JSONResponse({'error': 'داده‌های نامعتبر'}, status_code=400)
+        
+        await check_request_rate(request, data)
+        
+        session_id = data.get('session_id', '')
+        
+        # دریافت یا ایجاد شماره مشتری
+        customer_number = await run_in_threadpool(
+            lambda: chatbot_web.get_customer_manager().get_or_create_customer_number(session_id)
+        )
+        structured_logging.bind(customer_number=customer_number)
+        
+        # ذخیره اطلاعات
+        success = await run_in_threadpool(
+            lambda: chatbot_web.get_data_storage().save_customer_data(build_customer_data(data, customer_number))
+        )
+        
+        if success:
+            log.info('customer.saved')
+            return JSONResponse(save_customer_result(customer_number))
+        return JSONResponse({
+            'error': 'خطا در ذخیره اطلاعات',
+            'success': False
+        }, status_code=500)
+        
+    except RateLimitExceeded:
+        raise
+    except Exception as e:
+        log.exception('customer.save_failed')
+        return JSONResponse({
+            'error': f'خطا: {str(e)}',
+            'success': False
+        }, status_code=500)
+
+
+@record_metrics('/extract-info')
+async def extract_customer_info(request: Request):
+    """دریافت اطلاعات استخراج شده مشتری (یا استخراج از مکالمه ارسالی با AsyncOpenAI)"""
+    try:
+        current_bot = await get_bot()
+        if current_bot is None:
+            return JSONResponse({'error': 'چت بات در دسترس نیست'}, status_code=503)
+        
+        data = await read_json(request) or {}
+        await check_request_rate(request, data)
+        
+        # اطلاعات استخراج شده تدریجی فقط از پایگاه داده خوانده می‌شود
+        extracted_data = await run_in_threadpool(lookup_extracted_info, current_bot, data)
+        if extracted_data is not None:
+            return JSONResponse({
+                'success': True,
+                'data': extracted_data
+            })
+        
+        conversation_history = data.get('conversation', [])
+        
+        if not conversation_history:
+            return JSONResponse({'error': 'مکالمه خالی است'}, status_code=400)
+        
+        slot = await run_in_threadpool(acquire_llm_slot)
+        try:
+            response = await current_bot.async_client.chat.completions.create(
+                messages=build_extraction_messages(conversation_history),
+                **EXTRACTION_PARAMS
+            )
+        finally:
+            await run_in_threadpool(release_llm_slot, slot)
+        
+        extracted_data = parse_extraction(response.choices[0].message.content)
+        
+        return JSONResponse({
+            'success': True,
+            'data': extracted_data
+        })
+        
+    except RateLimitExceeded:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'error': f'خطا در استخراج اطلاعات: {str(e)}',
+            'success': False
+        }, status_code=500)
+
+
+async def livez(request: Request):
+    """زنده بودن پردازه (مستقیم در event loop، بدون عبور از Flask)"""
+    return Response(chatbot_web.LIVEZ_BODY, media_type='application/json')
+
+
+async def readyz(request: Request):
+    """آخرین نتیجه بررسی آمادگی از حافظه"""
+    chatbot_web.readiness.start()
+    ready, body = chatbot_web.readiness.state()
+    return Response(body, status_code=200 if ready else 503, media_type='application/json')
+
+
+app = Starlette(routes=[
+    Route('/livez', livez, methods=['GET']),
+    Route('/readyz', readyz, methods=['GET']),
+    Route('/chat', chat, methods=['POST']),
+    Route('/save-customer', save_customer, methods=['POST']),
+    Route('/extract-info', extract_customer_info, methods=['POST']),
+    # بقیه مسیرها (صفحه اصلی، آپلود، دانلود Excel، ...) توسط Flask پاسخ داده می‌شوند
+    Mount('/', app=WSGIMiddleware(chatbot_web.app)),
+], exception_handlers={RateLimitExceeded: rate_limit_exceeded})
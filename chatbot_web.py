@@ -3,15 +3,33 @@
 """
 
 import os
+import math
+import time
+import hmac
 import uuid
+import threading
 import json as json_lib
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session, send_file, send_from_directory
+from flask import Flask, Response, abort, g, render_template, request, jsonify, session, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-from chatbot import TashakorChatBot
-from data_storage import CustomerDataStorage
+from data_storage import QUERY_DEFAULT_LIMIT, CustomerDataStorage
 from customer_manager import CustomerNumberManager
+import db
+import metrics
+from customer_extractor import EXTRACTION_PARAMS, PROFILE_FIELDS, build_extraction_messages, parse_extraction
+from rate_limiter import RateLimitExceeded, create_admission_controller
+from asset_manifest import create_asset_manifest
+from readiness import create_readiness_checker
+import structured_logging
+from structured_logging import configure_logging, get_logger
+from image_pipeline import ImageRejected, process_upload
+from static_assets import (
+    IMMUTABLE_MAX_AGE, CompressedPage, accel_redirect_path, filename_digest,
+    guess_mimetype, offload_mode
+)
+from contextlib import contextmanager
 from functools import wraps
 from dotenv import load_dotenv
 
@@ -24,6 +42,10 @@ else:
     # در محیط محلی، از فایل .env استفاده می‌کنیم
     load_dotenv()
 
+# لاگ JSON با نوشتن در thread جداگانه (LOG_LEVEL، LOG_SAMPLE_RATES)
+configure_logging()
+log = get_logger(__name__)
+
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-production')
 
@@ -39,6 +61,8 @@ os.makedirs(os.path.join(UPLOAD_FOLDER, 'icons'), exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# ارسال فایل‌های آپلود شده توسط سرور جلویی (STATIC_OFFLOAD=x-sendfile)
+app.config['USE_X_SENDFILE'] = offload_mode() == 'x-sendfile'
 
 def allowed_file(filename):
     """بررسی مجاز بودن پسوند فایل"""
@@ -50,11 +74,95 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # Initialize chatbot (lazy initialization)
 bot = None
 
-# Initialize data storage
-data_storage = CustomerDataStorage()
+# ذخیره‌ساز اطلاعات و مدیریت شماره مشتریان در اولین استفاده ساخته می‌شوند (نه هنگام import)
+data_storage = None
+customer_manager = None
+_init_lock = threading.Lock()
+
+def get_data_storage(start_sync: bool = True) -> CustomerDataStorage:
+    """Lazy initialization of data storage"""
+    global data_storage
+    if data_storage is None:
+        with _init_lock:
+            if data_storage is None:
+                data_storage = CustomerDataStorage(start_sync=start_sync)
+    return data_storage
+
+def get_customer_manager() -> CustomerNumberManager:
+    """Lazy initialization of customer number manager"""
+    global customer_manager
+    if customer_manager is None:
+        with _init_lock:
+            if customer_manager is None:
+                customer_manager = CustomerNumberManager()
+    return customer_manager
+
+def warm_up():
+    """
+    آماده‌سازی پیش از fork workerها (gunicorn --preload، از gunicorn.conf.py)
+
+    ماژول‌های سنگین import و ذخیره‌سازها ساخته می‌شوند تا workerها آنها را به صورت
+    copy-on-write به اشتراک بگذارند. اتصال‌ها، threadها و صف‌ها در هر worker دوباره ساخته
+    می‌شوند (همه آنها به pid پردازه وابسته‌اند).
+
+    threadهای پس‌زمینه (همگام‌سازی گوگل شیت، نوشتن متریک‌ها) در پردازه اصلی شروع نمی‌شوند و
+    اتصال‌های SQLite پیش از fork بسته می‌شوند؛ اتصال باز نباید به workerها برسد.
+    """
+    import chatbot  # noqa: F401  (openai و وابستگی‌های چت بات)
+    import openai_client  # noqa: F401
+    metrics.defer_background()
+    get_data_storage(start_sync=False)
+    get_customer_manager()
+    db.close_all()
+    log.info('app.warmed_up', pid=os.getpid())
+
+def after_fork():
+    """راه‌اندازی کارهای پس‌زمینه در worker تازه fork شده"""
+    if data_storage is not None and data_storage.sheets_sync:
+        data_storage.sheets_sync.start()
+    if metrics.enabled():
+        metrics.get_collector()
+
+# محدودیت نرخ و سقف فراخوانی‌های هم‌زمان OpenAI (None اگر غیرفعال باشد)
+admission = create_admission_controller()
+
+# لوگو/آیکون فعلی (manifest اتمیک با کش در حافظه)
+asset_manifest = create_asset_manifest(UPLOAD_FOLDER)
 
-# Initialize customer number manager
-customer_manager = CustomerNumberManager()
+# صفحه چت render شده و فشرده در حافظه (با تغییر قالب دوباره ساخته می‌شود)
+chat_page = CompressedPage(
+    lambda: render_template('chat.html'),
+    os.path.join(app.root_path, app.template_folder, 'chat.html')
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # فیلدهای همبستگی همه لاگ‌های این درخواست
+    structured_logging.clear()
+    data = request.get_json(silent=True) if request.is_json else None
+    structured_logging.bind(
+        route=request.url_rule.rule if request.url_rule is not None else 'unmatched',
+        method=request.method,
+        session_id=data.get('session_id') if isinstance(data, dict) else None,
+    )
+
+@app.after_request
+def record_request_metrics(response):
+    """ثبت تعداد و مدت درخواست به تفکیک الگوی route (نه آدرس کامل، تا تعداد سری‌ها محدود بماند)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.inc('http_requests_total', route=route, method=request.method, status=str(response.status_code))
+        elapsed = time.perf_counter() - started
+        metrics.observe('http_request_duration_seconds', elapsed, route=route, method=request.method)
+        # رویداد پرتکرار؛ با LOG_SAMPLE_RATES="http.request=0.1" نمونه‌برداری می‌شود
+        log.info('http.request', status=response.status_code, duration_ms=round(elapsed * 1000, 1))
+    return response
+
+@app.teardown_request
+def clear_log_context(error=None):
+    structured_logging.clear()
 
 def get_bot():
     """Lazy initialization of chatbot"""
@@ -63,34 +171,36 @@ def get_bot():
         try:
             # بررسی وجود API key - فقط از OPENAI_API_KEY استفاده می‌کنیم
             api_key = os.getenv('OPENAI_API_KEY')
-            
-            # بررسی تمام متغیرهای محیطی برای دیباگ
-            all_env_vars = {k: v[:20] + '...' if len(v) > 20 else v for k, v in os.environ.items() if 'API' in k or 'KEY' in k}
-            print(f"🔍 Environment variables containing 'API' or 'KEY': {all_env_vars}")
-            
             if not api_key:
-                print("❌ OPENAI_API_KEY environment variable not found")
-                print(f"   Available env vars with 'OPENAI': {[k for k in os.environ.keys() if 'OPENAI' in k]}")
+                log_bot_failure('missing_api_key')
                 return None
             
-            # بررسی فرمت API key
+            # بررسی فرمت API key (محتوای کلید هرگز در لاگ نوشته نمی‌شود)
             if not api_key.startswith('sk-'):
-                print(f"❌ Invalid API key format. Key starts with: {api_key[:20]}...")
-                print(f"   Key length: {len(api_key)}")
-                print(f"   First 30 chars: {api_key[:30]}")
-                print("   ⚠️  لطفا در Render، Environment Variable 'OPENAI_API_KEY' را بررسی کنید")
+                log_bot_failure('invalid_api_key_format', key_length=len(api_key))
                 return None
             
-            bot = TashakorChatBot()
-            print("✅ چت بات با موفقیت راه‌اندازی شد")
-        except ValueError as e:
-            print(f"❌ خطا در راه‌اندازی چت بات (ValueError): {e}")
-            return None
+            # openai و وابستگی‌های چت بات فقط در اولین استفاده import می‌شوند
+            from chatbot import TashakorChatBot
+            # استخراج اطلاعات پس‌زمینه هم در سقف فراخوانی‌های هم‌زمان OpenAI شمرده می‌شود
+            bot = TashakorChatBot(llm_slot=llm_slot)
+            log.info('bot.initialized', model=bot.completion_params['model'])
         except Exception as e:
-            print(f"❌ خطا در راه‌اندازی چت بات: {type(e).__name__}: {e}")
+            log_bot_failure(type(e).__name__, error=str(e))
             return None
     return bot
 
+# آخرین خطای راه‌اندازی چت بات: (علت، زمان ثبت)
+_bot_failure = (None, 0.0)
+
+def log_bot_failure(reason: str, **fields):
+    """ثبت خطای راه‌اندازی چت بات (هر علت حداکثر یک بار در دقیقه، نه در هر درخواست)"""
+    global _bot_failure
+    now = time.monotonic()
+    if _bot_failure[0] != reason or now - _bot_failure[1] >= 60:
+        _bot_failure = (reason, now)
+        log.error('bot.init_failed', reason=reason, **fields)
+
 def require_bot(f):
     """دکوراتور برای بررسی وجود bot"""
     @wraps(f)
@@ -101,17 +211,132 @@ def require_bot(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def rate_limit_payload(error: RateLimitExceeded) -> tuple:
+    """بدنه و هدرهای پاسخ 429"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    if error.reason == 'rate':
+        message = 'تعداد درخواست‌ها بیش از حد مجاز است'
+    else:
+        message = 'سرور در حال حاضر مشغول است'
+    return {
+        'error': f'{message}. لطفا {retry_after} ثانیه دیگر دوباره تلاش کنید.',
+        'retry_after': retry_after,
+        'success': False
+    }, {'Retry-After': str(retry_after)}
+
+@app.errorhandler(RateLimitExceeded)
+def rate_limit_exceeded(error):
+    """پاسخ 429 برای درخواست‌های رد شده توسط محدودیت نرخ"""
+    body, headers = rate_limit_payload(error)
+    return jsonify(body), 429, headers
+
+def check_rate_limit(data, remote_addr: str, forwarded_for: str = None):
+    """بررسی محدودیت نرخ IP و session_id (RateLimitExceeded در صورت عبور از سقف)"""
+    if admission is None:
+        return
+    session_id = data.get('session_id') if isinstance(data, dict) else None
+    admission.check(session_id, admission.client_ip(remote_addr, forwarded_for))
+
+def rate_limited(f):
+    """دکوراتور بررسی محدودیت نرخ پیش از اجرای endpoint"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        check_rate_limit(request.get_json(silent=True), request.remote_addr, request.headers.get('X-Forwarded-For'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def require_customers_token(f):
+    """
+    هدر Authorization: Bearer <CUSTOMERS_API_TOKEN> لازم است
+
+    این مسیرها اطلاعات شخصی مشتریان را برمی‌گردانند یا ثبت می‌کنند؛ تا وقتی توکن
+    تنظیم نشده باشد، غیرفعال هستند (503).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = os.getenv('CUSTOMERS_API_TOKEN')
+        if not token:
+            log.warning('customers_api.token_not_configured', path=request.path)
+            return jsonify({'error': 'API مشتریان فعال نیست (CUSTOMERS_API_TOKEN تنظیم نشده است)'}), 503
+        expected = f'Bearer {token}'.encode('utf-8')
+        provided = request.headers.get('Authorization', '').encode('utf-8')
+        if not hmac.compare_digest(provided, expected):
+            return jsonify({'error': 'دسترسی غیرمجاز'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+def acquire_llm_slot():
+    """گرفتن جایگاه فراخوانی OpenAI (None اگر محدودیت غیرفعال باشد)"""
+    return admission.acquire_slot() if admission is not None else None
+
+def release_llm_slot(token):
+    """آزاد کردن جایگاه فراخوانی OpenAI"""
+    if token is not None:
+        admission.release_slot(token)
+
+@contextmanager
+def llm_slot():
+    """نگه داشتن یک جایگاه فراخوانی OpenAI در طول بلوک with"""
+    token = acquire_llm_slot()
+    try:
+        yield
+    finally:
+        release_llm_slot(token)
+
 @app.route('/')
 def index():
     """صفحه اصلی چت بات"""
-    return render_template('chat.html')
+    encoding = request.accept_encodings.best_match(chat_page.encodings)
+    body, encoding, etag = chat_page.get(encoding)
+    
+    response = app.response_class(body, mimetype='text/html')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    # صفحه ممکن است با استقرار جدید تغییر کند؛ مرورگر با ETag اعتبارسنجی می‌کند
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     """سرو کردن فایل‌های آپلود شده"""
     # filename می‌تواند شامل subdirectory باشد (مثلاً logos/file.png)
     directory = app.config['UPLOAD_FOLDER']
-    return send_from_directory(directory, filename)
+    # محتوای آدرس‌های hash دار هرگز تغییر نمی‌کند؛ فایل‌های قدیمی با ETag اعتبارسنجی می‌شوند
+    digest = filename_digest(filename)
+    
+    if offload_mode() == 'x-accel':
+        path = safe_join(os.path.join(app.root_path, directory), filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        stat = os.stat(path)
+        response = app.response_class(mimetype=guess_mimetype(filename))
+        # Nginx خود فایل را از location داخلی ارسال می‌کند
+        response.headers['X-Accel-Redirect'] = accel_redirect_path(filename)
+        response.set_etag(digest or f"{stat.st_mtime}-{stat.st_size}")
+        response.last_modified = stat.st_mtime
+        if digest:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        else:
+            response.cache_control.no_cache = True
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            response.headers.pop('X-Accel-Redirect', None)
+    else:
+        response = send_from_directory(
+            directory, filename,
+            etag=digest or True,
+            max_age=IMMUTABLE_MAX_AGE if digest else None
+        )
+    
+    if digest:
+        response.cache_control.immutable = True
+    if filename.lower().endswith('.svg'):
+        # SVG آپلود شده حتی اگر مستقیم باز شود اسکریپتی اجرا نمی‌کند
+        response.headers['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'; img-src data:"
+    return response
 
 @app.route('/upload-logo', methods=['POST'])
 def upload_logo():
@@ -139,27 +364,34 @@ def upload_logo():
         
         # نام فایل امن
         filename = secure_filename(file.filename)
-        # اضافه کردن timestamp برای جلوگیری از تداخل
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{filename}"
-        
-        # ذخیره فایل
-        if file_type == 'icon':
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'icons', filename)
-        else:
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], 'logos', filename)
-        
-        file.save(save_path)
+        kind = 'icon' if file_type == 'icon' else 'logo'
         
-        # حذف فایل‌های قدیمی (اختیاری)
-        # می‌توانید فقط آخرین لوگو/آیکون را نگه دارید
+        # ساخت نسخه‌های کوچک شده WebP/AVIF (یا پاک‌سازی SVG)؛ نام هر نسخه شامل timestamp و hash محتوا است
+        try:
+            processed = process_upload(kind, filename, file.read())
+        except ImageRejected as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        
+        # ذخیره فایل‌ها
+        directory = os.path.join(app.config['UPLOAD_FOLDER'], f'{kind}s')
+        for name, content in processed['files'].items():
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(content)
+        
+        # ثبت به عنوان فایل فعلی؛ فایل‌های قبلی در پس‌زمینه حذف می‌شوند
+        entry = asset_manifest.set_current(
+            kind, processed['primary'], files=processed['files'],
+            srcset=processed['srcset'], favicon=processed['favicon']
+        )
         
         return jsonify({
             'success': True,
             'message': 'فایل با موفقیت آپلود شد',
-            'filename': filename,
-            'url': f'/uploads/{file_type}s/{filename}',
-            'type': file_type
+            'filename': entry['file'],
+            'url': entry['url'],
+            'srcset': entry['srcset'],
+            'favicon': entry['favicon'],
+            'type': kind
         })
         
     except Exception as e:
@@ -172,29 +404,17 @@ def upload_logo():
 def get_logo():
     """دریافت لوگو/آیکون فعلی"""
     try:
-        logo_file = None
-        icon_file = None
-        
-        # پیدا کردن آخرین لوگو
-        logos_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'logos')
-        if os.path.exists(logos_dir):
-            logos = [f for f in os.listdir(logos_dir) if os.path.isfile(os.path.join(logos_dir, f))]
-            if logos:
-                logos.sort(reverse=True)  # جدیدترین اول
-                logo_file = f'/uploads/logos/{logos[0]}'
-        
-        # پیدا کردن آخرین آیکون
-        icons_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'icons')
-        if os.path.exists(icons_dir):
-            icons = [f for f in os.listdir(icons_dir) if os.path.isfile(os.path.join(icons_dir, f))]
-            if icons:
-                icons.sort(reverse=True)  # جدیدترین اول
-                icon_file = f'/uploads/icons/{icons[0]}'
-        
+        # آخرین لوگو و آیکون از manifest (در حافظه) خوانده می‌شوند
+        logo = asset_manifest.get('logo') or {}
+        icon = asset_manifest.get('icon') or {}
         return jsonify({
             'success': True,
-            'logo': logo_file,
-            'icon': icon_file
+            'logo': logo.get('url'),
+            'icon': icon.get('url'),
+            # {نوع MIME: srcset} برای تصاویر پردازش شده (خالی برای SVG و فایل‌های قدیمی)
+            'logo_srcset': logo.get('srcset', {}),
+            'icon_srcset': icon.get('srcset', {}),
+            'favicon': icon.get('favicon', {})
         })
         
     except Exception as e:
@@ -205,6 +425,7 @@ def get_logo():
 
 @app.route('/chat', methods=['POST'])
 @require_bot
+@rate_limited
 def chat():
     """API برای دریافت پیام و ارسال پاسخ"""
     data = request.json
@@ -226,7 +447,8 @@ def chat():
         current_bot = get_bot()
         if current_bot is None:
             return jsonify({'error': 'چت بات در دسترس نیست'}), 503
-            
+        
+        # جایگاه فراخوانی OpenAI فقط در صورت نبودن پاسخ در کش گرفته می‌شود (داخل چت بات)
         response = current_bot.get_response(user_message, session_id)
         
         return jsonify({
@@ -234,11 +456,66 @@ def chat():
             'bot_name': current_bot.name,
             'session_id': session_id
         })
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         return jsonify({
             'error': f'خطا در پردازش پیام: {str(e)}'
         }), 500
 
+def sse_event(event: str, data: dict) -> str:
+    """ساخت یک رویداد Server-Sent Events"""
+    return f"event: {event}\ndata: {json_lib.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+@require_bot
+@rate_limited
+def chat_stream():
+    """API برای دریافت پیام و ارسال پاسخ به صورت جریانی (Server-Sent Events)"""
+    data = request.json
+    
+    if not data:
+        return jsonify({'error': 'داده‌های نامعتبر'}), 400
+    
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', None)
+    
+    if not user_message:
+        return jsonify({'error': 'پیام خالی است'}), 400
+    
+    # ایجاد session_id جدید اگر وجود نداشته باشد
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    
+    current_bot = get_bot()
+    if current_bot is None:
+        return jsonify({'error': 'چت بات در دسترس نیست'}), 503
+    
+    def generate():
+        yield sse_event('start', {'session_id': session_id, 'bot_name': current_bot.name})
+        try:
+            # با قطع اتصال کاربر، GeneratorExit به get_response_stream می‌رسد و جریان OpenAI بسته می‌شود
+            for token in current_bot.get_response_stream(user_message, session_id):
+                yield sse_event('token', {'token': token})
+        except RateLimitExceeded as e:
+            # جایگاه فراخوانی OpenAI فقط در صورت نبودن پاسخ در کش (پس از شروع جریان) گرفته می‌شود
+            yield sse_event('error', rate_limit_payload(e)[0])
+            return
+        except Exception as e:
+            yield sse_event('error', {'error': f'خطا در پردازش پیام: {str(e)}'})
+            return
+        yield sse_event('done', {'session_id': session_id})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # غیرفعال کردن بافر Nginx برای ارسال فوری توکن‌ها
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/clear', methods=['POST'])
 @require_bot
 def clear_chat():
@@ -255,7 +532,32 @@ def clear_chat():
         'session_id': session_id
     })
 
+def build_customer_data(data: dict, customer_number: str) -> dict:
+    """استخراج اطلاعات مشتری از بدنه درخواست"""
+    return {
+        'customer_number': customer_number,
+        'name': data.get('name', ''),
+        'phone': data.get('phone', ''),
+        'email': data.get('email', ''),
+        'address': data.get('address', ''),
+        'product': data.get('product', ''),
+        'quantity': data.get('quantity', ''),
+        'price': data.get('price', ''),
+        'status': data.get('status', 'در انتظار'),
+        'notes': data.get('notes', ''),
+        'session_id': data.get('session_id', '')
+    }
+
+def save_customer_result(customer_number: str) -> dict:
+    """پاسخ موفق ذخیره اطلاعات مشتری"""
+    return {
+        'message': 'اطلاعات با موفقیت ذخیره شد',
+        'success': True,
+        'customer_number': customer_number
+    }
+
 @app.route('/save-customer', methods=['POST'])
+@rate_limited
 def save_customer():
     """ذخیره اطلاعات مشتری"""
     try:
@@ -267,32 +569,15 @@ def save_customer():
         session_id = data.get('session_id', '')
         
         # دریافت یا ایجاد شماره مشتری
-        customer_number = customer_manager.get_or_create_customer_number(session_id)
-        
-        # استخراج اطلاعات از درخواست
-        customer_data = {
-            'customer_number': customer_number,
-            'name': data.get('name', ''),
-            'phone': data.get('phone', ''),
-            'email': data.get('email', ''),
-            'address': data.get('address', ''),
-            'product': data.get('product', ''),
-            'quantity': data.get('quantity', ''),
-            'price': data.get('price', ''),
-            'status': data.get('status', 'در انتظار'),
-            'notes': data.get('notes', ''),
-            'session_id': session_id
-        }
+        customer_number = get_customer_manager().get_or_create_customer_number(session_id)
+        structured_logging.bind(customer_number=customer_number)
         
         # ذخیره اطلاعات
-        success = data_storage.save_customer_data(customer_data)
+        success = get_data_storage().save_customer_data(build_customer_data(data, customer_number))
         
         if success:
-            return jsonify({
-                'message': 'اطلاعات با موفقیت ذخیره شد',
-                'success': True,
-                'customer_number': customer_number
-            })
+            log.info('customer.saved')
+            return jsonify(save_customer_result(customer_number))
         else:
             return jsonify({
                 'error': 'خطا در ذخیره اطلاعات',
@@ -300,11 +585,106 @@ def save_customer():
             }), 500
             
     except Exception as e:
+        log.exception('customer.save_failed')
         return jsonify({
             'error': f'خطا: {str(e)}',
             'success': False
         }), 500
 
+# ورود دسته‌ای: سقف تعداد ردیف هر درخواست و طول هر مقدار
+BATCH_MAX_ROWS = int(os.getenv('BATCH_MAX_ROWS', '10000'))
+BATCH_FIELD_MAX_LENGTH = 2000
+CUSTOMER_FIELDS = ('name', 'phone', 'email', 'address', 'product', 'quantity', 'price', 'status', 'notes', 'session_id')
+
+def validate_batch_row(row) -> str:
+    """بررسی یک ردیف ورود دسته‌ای (پیام خطا یا رشته خالی)"""
+    if not isinstance(row, dict):
+        return 'ردیف باید یک شیء JSON باشد'
+    for field in CUSTOMER_FIELDS:
+        value = row.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            return f'مقدار {field} نامعتبر است'
+        if len(str(value)) > BATCH_FIELD_MAX_LENGTH:
+            return f'مقدار {field} بیش از حد طولانی است'
+    if not any(row.get(field) for field in ('name', 'phone', 'email')):
+        return 'حداقل یکی از name، phone یا email الزامی است'
+    return ''
+
+def read_batch_rows():
+    """
+    خواندن ردیف‌های ورود دسته‌ای از آرایه JSON یا NDJSON (یک شیء JSON در هر خط)
+    
+    Returns:
+        لیست (ردیف، خطای parse)؛ None اگر بدنه آرایه JSON معتبر نباشد
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/ndjson'):
+        rows = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append((json_lib.loads(line), ''))
+            except ValueError:
+                rows.append((None, 'خط JSON نامعتبر است'))
+        return rows
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return None
+    return [(row, '') for row in data]
+
+@app.route('/save-customers/batch', methods=['POST'])
+@require_customers_token
+@rate_limited
+def save_customers_batch():
+    """
+    ورود دسته‌ای اطلاعات مشتریان (آرایه JSON یا NDJSON)
+    
+    ردیف‌های معتبر با هم در یک تراکنش ثبت می‌شوند و نتیجه هر ردیف جداگانه برگردانده می‌شود.
+    ردیف بدون session_id یک شناسه جدید (و در نتیجه شماره مشتری جدید) می‌گیرد.
+    """
+    rows = read_batch_rows()
+    if rows is None:
+        return jsonify({'error': 'بدنه باید آرایه JSON یا NDJSON باشد', 'success': False}), 400
+    if len(rows) > BATCH_MAX_ROWS:
+        return jsonify({'error': f'حداکثر {BATCH_MAX_ROWS} ردیف در هر درخواست مجاز است', 'success': False}), 413
+    
+    results = []
+    valid = []
+    for index, (row, error) in enumerate(rows):
+        error = error or validate_batch_row(row)
+        if error:
+            results.append({'index': index, 'success': False, 'error': error})
+            continue
+        session_id = str(row.get('session_id') or f'batch-{uuid.uuid4().hex}')
+        valid.append((index, dict(row, session_id=session_id)))
+        results.append(None)
+    
+    try:
+        numbers = get_customer_manager().get_or_create_customer_numbers(row['session_id'] for _, row in valid)
+        customers = [build_customer_data(row, numbers[row['session_id']]) for _, row in valid]
+        get_data_storage().save_customers_batch(customers)
+    except Exception as e:
+        log.exception('customer.batch_failed', rows=len(valid))
+        return jsonify({'error': f'خطا در ذخیره اطلاعات: {str(e)}', 'success': False}), 500
+    
+    for (index, row), customer in zip(valid, customers):
+        results[index] = {
+            'index': index,
+            'success': True,
+            'customer_number': customer['customer_number'],
+            'session_id': row['session_id'],
+        }
+    log.info('customer.batch_saved', saved=len(valid), rejected=len(rows) - len(valid))
+    return jsonify({
+        'success': True,
+        'saved': len(valid),
+        'rejected': len(rows) - len(valid),
+        'results': results,
+    })
+
 @app.route('/get-customer-number', methods=['POST'])
 def get_customer_number():
     """دریافت شماره مشتری برای session_id"""
@@ -316,7 +696,8 @@ def get_customer_number():
             return jsonify({'error': 'session_id الزامی است'}), 400
         
         # دریافت یا ایجاد شماره مشتری
-        customer_number = customer_manager.get_or_create_customer_number(session_id)
+        customer_number = get_customer_manager().get_or_create_customer_number(session_id)
+        structured_logging.bind(customer_number=customer_number)
         
         return jsonify({
             'success': True,
@@ -330,7 +711,23 @@ def get_customer_number():
             'success': False
         }), 500
 
+def lookup_extracted_info(current_bot, data: dict):
+    """
+    دریافت اطلاعات استخراج شده تدریجی جلسه از پایگاه داده (بدون فراخوانی مدل)
+    
+    Returns:
+        فیلدهای پروفایل مشتری، یا None اگر باید از مکالمه ارسالی استخراج شود
+    """
+    session_id = data.get('session_id')
+    if not session_id or current_bot.extractor is None:
+        return None
+    profile = current_bot.extractor.get(session_id)
+    if profile is None and data.get('conversation'):
+        return None
+    return profile or dict.fromkeys(PROFILE_FIELDS)
+
 @app.route('/extract-info', methods=['POST'])
+@rate_limited
 def extract_customer_info():
     """استخراج اطلاعات مشتری از مکالمه با استفاده از ChatGPT"""
     try:
@@ -338,54 +735,37 @@ def extract_customer_info():
         if current_bot is None:
             return jsonify({'error': 'چت بات در دسترس نیست'}), 503
         
-        data = request.json
+        data = request.json or {}
+        
+        # اطلاعات مشتری پس از هر نوبت در پس‌زمینه استخراج شده و فقط خوانده می‌شود
+        extracted_data = lookup_extracted_info(current_bot, data)
+        if extracted_data is not None:
+            return jsonify({
+                'success': True,
+                'data': extracted_data
+            })
+        
         conversation_history = data.get('conversation', [])
         
         if not conversation_history:
             return jsonify({'error': 'مکالمه خالی است'}), 400
         
-        # ساخت prompt برای استخراج اطلاعات
-        extraction_prompt = """از مکالمه زیر، اطلاعات مشتری را استخراج کن و به صورت JSON برگردان.
-        اگر اطلاعاتی موجود نبود، مقدار null بگذار.
-        
-        فرمت JSON:
-        {
-            "name": "نام و نام خانوادگی",
-            "phone": "شماره تماس",
-            "email": "ایمیل",
-            "address": "آدرس کامل",
-            "product": "محصول مورد نظر",
-            "quantity": "تعداد",
-            "price": "قیمت",
-            "notes": "یادداشت‌های اضافی"
-        }
-        
-        فقط JSON را برگردان، بدون توضیح اضافی."""
+        # فراخوانی ChatGPT برای استخراج از مکالمه ارسالی (بدون session_id)
+        with llm_slot():
+            response = current_bot.client.chat.completions.create(
+                messages=build_extraction_messages(conversation_history),
+                **EXTRACTION_PARAMS
+            )
         
-        # اضافه کردن مکالمه به prompt
-        conversation_text = "\n".join([f"{msg.get('role', 'user')}: {msg.get('content', '')}" 
-                                      for msg in conversation_history[-10:]])
-        
-        full_prompt = f"{extraction_prompt}\n\nمکالمه:\n{conversation_text}"
-        
-        # فراخوانی ChatGPT برای استخراج
-        response = current_bot.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "شما یک سیستم استخراج اطلاعات هستید. فقط JSON برگردانید."},
-                {"role": "user", "content": full_prompt}
-            ],
-            temperature=0.3,
-            max_tokens=300
-        )
-        
-        extracted_data = json_lib.loads(response.choices[0].message.content.strip())
+        extracted_data = parse_extraction(response.choices[0].message.content)
         
         return jsonify({
             'success': True,
             'data': extracted_data
         })
         
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         return jsonify({
             'error': f'خطا در استخراج اطلاعات: {str(e)}',
@@ -396,18 +776,95 @@ def extract_customer_info():
 def download_excel():
     """دانلود فایل Excel اطلاعات مشتریان"""
     try:
-        excel_file = data_storage.excel_file
-        if not os.path.exists(excel_file):
-            return jsonify({'error': 'فایل یافت نشد'}), 404
-        
-        return send_file(
-            excel_file,
+        # ETag فقط با ثبت مشتری جدید تغییر می‌کند
+        etag = f"customers-v{get_data_storage().get_version()}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        # فایل Excel از روی دفتر ثبت ساخته (یا از کش خوانده) می‌شود
+        excel_file, version = get_data_storage().export_excel()
+        
+        response = send_file(
+            os.path.abspath(excel_file),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
-            download_name=f'customers_data_{datetime.now().strftime("%Y%m%d")}.xlsx'
+            download_name=f'customers_data_{datetime.now().strftime("%Y%m%d")}.xlsx',
+            etag=f"customers-v{version}",
+            max_age=0
         )
+        response.cache_control.no_cache = True
+        return response
+    except Exception as e:
+        return jsonify({'error': f'خطا: {str(e)}'}), 500
+
+CUSTOMER_QUERY_FILTERS = ('phone', 'number', 'email', 'session_id', 'status', 'date_from', 'date_to')
+
+@app.route('/customers', methods=['GET'])
+@require_customers_token
+def query_customers():
+    """
+    جستجوی مشتریان ثبت شده
+    
+    پارامترها: phone، number، email، session_id، status، date_from، date_to، limit، cursor
+    """
+    try:
+        limit = int(request.args.get('limit', QUERY_DEFAULT_LIMIT))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'limit و cursor باید عدد باشند'}), 400
+    
+    filters = {name: request.args.get(name) for name in CUSTOMER_QUERY_FILTERS if request.args.get(name)}
+    try:
+        result = get_data_storage().query_customers(cursor=cursor, limit=limit, **filters)
     except Exception as e:
+        log.exception('customers.query_failed')
         return jsonify({'error': f'خطا: {str(e)}'}), 500
+    
+    result['count'] = len(result['customers'])
+    response = jsonify(result)
+    response.cache_control.no_store = True
+    return response
+
+def check_bot():
+    if get_bot() is None:
+        return False, 'چت بات راه‌اندازی نشد'
+    return True, 'initialized'
+
+def check_storage():
+    get_data_storage().check_writable()
+    if not os.access(UPLOAD_FOLDER, os.W_OK):
+        return False, 'پوشه آپلود قابل نوشتن نیست'
+    return True, 'writable'
+
+def check_upstream():
+    if bot is None:
+        return False, 'چت بات راه‌اندازی نشد'
+    from openai_client import probe_upstream
+    return probe_upstream(bot.api_key, timeout=float(os.getenv('READINESS_TIMEOUT', '3')))
+
+readiness_checks = {'bot': check_bot, 'storage': check_storage}
+if os.getenv('READINESS_CHECK_UPSTREAM', '1') == '1':
+    readiness_checks['upstream'] = check_upstream
+
+# وضعیت آمادگی در پس‌زمینه به‌روز می‌شود (thread در اولین درخواست هر worker شروع می‌شود)
+readiness = create_readiness_checker(readiness_checks)
+
+LIVEZ_BODY = b'{"status":"alive"}'
+
+@app.route('/livez', methods=['GET'])
+def livez():
+    """زنده بودن پردازه (بدون هیچ بررسی)"""
+    return Response(LIVEZ_BODY, mimetype='application/json')
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """آخرین نتیجه بررسی آمادگی (از حافظه؛ 503 تا زمانی که همه بررسی‌ها موفق نباشند)"""
+    readiness.start()
+    ready, body = readiness.state()
+    return Response(body, status=200 if ready else 503, mimetype='application/json')
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -444,18 +901,51 @@ def debug():
         'port': os.getenv('PORT'),
     }
     
-    # تلاش برای ایجاد bot و گرفتن خطا
-    try:
-        test_bot = TashakorChatBot()
+    # آمار ذخیره‌ساز مکالمات و کش پاسخ (تعداد، نرخ hit و حذف‌ها)
+    if bot is not None:
+        debug_info['conversation_store'] = bot.conversations.stats()
+        debug_info['token_usage'] = bot.get_usage_stats()
+        if bot.response_cache is not None:
+            debug_info['response_cache'] = bot.response_cache.stats()
+        if bot.extractor is not None:
+            debug_info['customer_extractor'] = bot.extractor.stats()
+    if admission is not None:
+        debug_info['rate_limit'] = admission.stats()
+    
+    # وضعیت pool اتصال و circuit breaker کلاینت مشترک OpenAI
+    from openai_client import client_stats
+    debug_info['openai_client'] = client_stats()
+    
+    # صف لاگ (تعداد رکوردهای در انتظار و دور ریخته شده)
+    debug_info['logging'] = structured_logging.stats()
+    
+    # بررسی راه‌اندازی bot (از همان نمونه مشترک استفاده می‌شود و کلاینت جدیدی ساخته نمی‌شود)
+    current_bot = get_bot()
+    if current_bot is not None:
         debug_info['bot_creation'] = 'success'
-        debug_info['bot_name'] = test_bot.name
-    except Exception as e:
+        debug_info['bot_name'] = current_bot.name
+    else:
         debug_info['bot_creation'] = 'failed'
-        debug_info['bot_error'] = str(e)
-        debug_info['bot_error_type'] = type(e).__name__
+        debug_info['bot_error'] = 'چت بات راه‌اندازی نشد (لاگ سرور را بررسی کنید)'
     
     return jsonify(debug_info)
 
+def scrape_gauges():
+    """gaugeهای سراسری که هنگام درخواست /metrics خوانده می‌شوند"""
+    values = []
+    if bot is not None:
+        values.append(('conversation_store_sessions', {}, bot.conversations.size()))
+    if admission is not None:
+        values.append(('llm_slots_in_flight', {}, admission.stats()['in_flight']))
+    return values
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """متریک‌های همه workerها با فرمت متنی Prometheus"""
+    if not metrics.enabled():
+        abort(404)
+    return Response(metrics.generate_latest([scrape_gauges]), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_ENV') == 'development'
@@ -24,6 +24,7 @@ class Config:
     CHATBOT_TEMPERATURE = float(os.getenv('CHATBOT_TEMPERATURE', '0.7'))
     CHATBOT_MAX_TOKENS = int(os.getenv('CHATBOT_MAX_TOKENS', '500'))
     CHATBOT_MAX_HISTORY = int(os.getenv('CHATBOT_MAX_HISTORY', '10'))
+    CHATBOT_INPUT_TOKEN_BUDGET = int(os.getenv('CHATBOT_INPUT_TOKEN_BUDGET', '2000'))
     
     @staticmethod
     def validate():
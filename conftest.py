@@ -0,0 +1,55 @@
+"""
+تنظیمات مشترک تست‌ها
+
+هر تست در پوشه موقت جداگانه اجرا می‌شود تا پایگاه‌های داده SQLite (مسیرهای نسبی پیش‌فرض)
+و فایل‌های آپلود در مخزن ساخته نشوند. تست‌های چت بات به جای OpenAI به سرور جعلی
+benchmarks/mock_openai.py متصل می‌شوند.
+"""
+
+import os
+import sys
+
+import pytest
+
+# سرور جعلی OpenAI (benchmarks/mock_openai.py) در تست‌ها هم استفاده می‌شود
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+
+@pytest.fixture(autouse=True)
+def isolated_cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture(scope='session')
+def mock_openai():
+    from mock_openai import start_mock_server
+    server = start_mock_server(latency=0, token_delay=0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def bot(mock_openai, monkeypatch):
+    """چت بات متصل به سرور جعلی (بدون کش پاسخ و استخراج پس‌زمینه)"""
+    monkeypatch.setenv('OPENAI_BASE_URL', mock_openai.base_url)
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', '0')
+    monkeypatch.setenv('CUSTOMER_EXTRACTION_ENABLED', '0')
+    from chatbot import TashakorChatBot
+    from conversation_store import InMemoryConversationStore
+    return TashakorChatBot(api_key='sk-test', conversation_store=InMemoryConversationStore())
+
+
+@pytest.fixture
+def web(monkeypatch, tmp_path):
+    """ماژول chatbot_web با ذخیره‌سازهای موقت و بدون محدودیت نرخ"""
+    # import پس از تغییر پوشه جاری انجام می‌شود تا فایل‌های برنامه در پوشه موقت ساخته شوند
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '0')
+    import chatbot_web
+    from customer_manager import CustomerNumberManager
+    from data_storage import CustomerDataStorage
+    monkeypatch.setattr(chatbot_web, 'admission', None)
+    monkeypatch.setattr(chatbot_web, 'data_storage', CustomerDataStorage(
+        excel_file=str(tmp_path / 'customers_data.xlsx'), google_sheet_id='', db_file=str(tmp_path / 'customers.db')))
+    monkeypatch.setattr(chatbot_web, 'customer_manager', CustomerNumberManager(
+        storage_file=str(tmp_path / 'customer_numbers.json'), db_file=str(tmp_path / 'customer_numbers.db')))
+    return chatbot_web
@@ -0,0 +1,326 @@
+"""
+ذخیره‌سازی سابقه مکالمات با محدودیت حجم و زمان انقضا (TTL)
+
+دو پیاده‌سازی وجود دارد:
+- InMemoryConversationStore: حافظه داخلی پردازه با حذف LRU و TTL
+- SQLiteConversationStore: فایل SQLite (حالت WAL) مشترک بین workerهای gunicorn
+"""
+
+import os
+import abc
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from db import connect
+
+
+class ConversationStore(abc.ABC):
+    """رابط پایه ذخیره سابقه مکالمات"""
+
+    def __init__(self, max_sessions: int, ttl: float):
+        """
+        Args:
+            max_sessions: حداکثر تعداد جلسه‌های نگهداری شده
+            ttl: مدت انقضای جلسه بدون فعالیت (ثانیه)
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abc.abstractmethod
+    def get(self, session_id: str) -> List[Dict]:
+        """دریافت سابقه مکالمه (کپی)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def append(self, session_id: str, *messages: Dict):
+        """افزودن پیام‌ها به انتهای سابقه مکالمه"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set(self, session_id: str, messages: List[Dict]):
+        """جایگزینی کل سابقه مکالمه"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def replace_prefix(self, session_id: str, prefix: List[Dict], messages: List[Dict]) -> bool:
+        """
+        جایگزینی اتمیک ابتدای سابقه مکالمه (مثلاً پیام‌های قدیمی با خلاصه آنها)
+
+        پیام‌هایی که پس از prefix اضافه شده‌اند حفظ می‌شوند؛ اگر سابقه دیگر با prefix
+        شروع نشود (پاک یا جایگزین شده باشد) تغییری داده نمی‌شود.
+
+        Returns:
+            True اگر جایگزینی انجام شد
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self, session_id: str):
+        """پاک کردن سابقه مکالمه"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        """تعداد جلسه‌های نگهداری شده"""
+        raise NotImplementedError
+
+    def _record_lookup(self, found: bool):
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict:
+        """آمار عملکرد (شمارنده‌ها مربوط به پردازه فعلی هستند)"""
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self).__name__,
+            'sessions': self.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+class InMemoryConversationStore(ConversationStore):
+    """ذخیره سابقه مکالمات در حافظه پردازه با حذف LRU و TTL"""
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 3600):
+        super().__init__(max_sessions, ttl)
+        # session_id -> (زمان آخرین دسترسی، پیام‌ها) به ترتیب دسترسی
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, session_id: str, now: float) -> Optional[List[Dict]]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        last_access, messages = entry
+        if now - last_access > self.ttl:
+            del self._sessions[session_id]
+            self.evictions += 1
+            return None
+        return messages
+
+    def _touch(self, session_id: str, messages: List[Dict], now: float):
+        self._sessions[session_id] = (now, messages)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, session_id: str) -> List[Dict]:
+        now = time.time()
+        with self._lock:
+            messages = self._lookup(session_id, now)
+            self._record_lookup(messages is not None)
+            if messages is None:
+                return []
+            self._touch(session_id, messages, now)
+            return list(messages)
+
+    def append(self, session_id: str, *messages: Dict):
+        now = time.time()
+        with self._lock:
+            history = self._lookup(session_id, now) or []
+            history.extend(messages)
+            self._touch(session_id, history, now)
+
+    def set(self, session_id: str, messages: List[Dict]):
+        with self._lock:
+            self._touch(session_id, list(messages), time.time())
+
+    def replace_prefix(self, session_id: str, prefix: List[Dict], messages: List[Dict]) -> bool:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[1][:len(prefix)] != prefix:
+                return False
+            # خلاصه‌سازی فعالیت کاربر نیست و زمان آخرین دسترسی تغییر نمی‌کند
+            self._sessions[session_id] = (entry[0], list(messages) + entry[1][len(prefix):])
+            return True
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def size(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """ذخیره سابقه مکالمات در SQLite؛ همه workerها سابقه یکسانی می‌بینند"""
+
+    def __init__(self, db_file: str = 'conversations.db', max_sessions: int = 10000,
+                 ttl: float = 3600, purge_interval: float = 60):
+        """
+        Args:
+            db_file: مسیر فایل SQLite
+            max_sessions: حداکثر تعداد جلسه‌های نگهداری شده
+            ttl: مدت انقضای جلسه بدون فعالیت (ثانیه)
+            purge_interval: فاصله زمانی اجرای حذف جلسه‌های منقضی (ثانیه)
+        """
+        super().__init__(max_sessions, ttl)
+        self.db_file = db_file
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self.ensure_tables()
+
+    def ensure_tables(self):
+        """ایجاد جدول‌های مکالمه در صورت عدم وجود"""
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_conversation_sessions_last_access "
+                "ON conversation_sessions (last_access)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_conversation_messages_session "
+                "ON conversation_messages (session_id, id)"
+            )
+
+    def get(self, session_id: str) -> List[Dict]:
+        conn = connect(self.db_file)
+        row = conn.execute(
+            "SELECT last_access FROM conversation_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        found = row is not None and time.time() - row[0] <= self.ttl
+        self._record_lookup(found)
+        if not found:
+            return []
+        return [
+            {'role': role, 'content': content}
+            for role, content in conn.execute(
+                "SELECT role, content FROM conversation_messages WHERE session_id = ? ORDER BY id",
+                (session_id,)
+            )
+        ]
+
+    def _write(self, session_id: str, messages: List[Dict], replace: bool):
+        now = time.time()
+        conn = connect(self.db_file)
+        with conn:
+            row = conn.execute(
+                "SELECT last_access FROM conversation_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            # جلسه منقضی‌شده از نو شروع می‌شود
+            if replace or (row is not None and now - row[0] > self.ttl):
+                conn.execute("DELETE FROM conversation_messages WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "INSERT INTO conversation_sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now)
+            )
+            conn.executemany(
+                "INSERT INTO conversation_messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, m['role'], m['content']) for m in messages]
+            )
+        if now - self._last_purge > self.purge_interval:
+            self._last_purge = now
+            self.purge()
+
+    def append(self, session_id: str, *messages: Dict):
+        self._write(session_id, list(messages), replace=False)
+
+    def set(self, session_id: str, messages: List[Dict]):
+        self._write(session_id, list(messages), replace=True)
+
+    def replace_prefix(self, session_id: str, prefix: List[Dict], messages: List[Dict]) -> bool:
+        conn = connect(self.db_file)
+        with conn:
+            # قفل نوشتن پیش از خواندن گرفته می‌شود تا افزودن هم‌زمان (از هر worker) بین خواندن و نوشتن رخ ندهد
+            conn.execute('BEGIN IMMEDIATE')
+            current = [
+                {'role': role, 'content': content}
+                for role, content in conn.execute(
+                    "SELECT role, content FROM conversation_messages WHERE session_id = ? ORDER BY id",
+                    (session_id,)
+                )
+            ]
+            if not current or current[:len(prefix)] != prefix:
+                return False
+            # ترتیب پیام‌ها با id است؛ کل سابقه با ابتدای جدید دوباره نوشته می‌شود
+            conn.execute("DELETE FROM conversation_messages WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO conversation_messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, m['role'], m['content']) for m in list(messages) + current[len(prefix):]]
+            )
+        return True
+
+    def clear(self, session_id: str):
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute("DELETE FROM conversation_messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM conversation_sessions WHERE session_id = ?", (session_id,))
+
+    def purge(self) -> int:
+        """
+        حذف جلسه‌های منقضی و جلسه‌های قدیمی‌تر از سقف max_sessions
+
+        Returns:
+            تعداد جلسه‌های حذف شده
+        """
+        conn = connect(self.db_file)
+        with conn:
+            expired = [
+                row[0] for row in conn.execute(
+                    "SELECT session_id FROM conversation_sessions WHERE last_access < ? "
+                    "UNION SELECT session_id FROM (SELECT session_id FROM conversation_sessions "
+                    "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (time.time() - self.ttl, self.max_sessions)
+                )
+            ]
+            conn.executemany(
+                "DELETE FROM conversation_messages WHERE session_id = ?", [(s,) for s in expired]
+            )
+            conn.executemany(
+                "DELETE FROM conversation_sessions WHERE session_id = ?", [(s,) for s in expired]
+            )
+        self.evictions += len(expired)
+        return len(expired)
+
+    def size(self) -> int:
+        return connect(self.db_file).execute("SELECT COUNT(*) FROM conversation_sessions").fetchone()[0]
+
+
+def create_conversation_store() -> ConversationStore:
+    """
+    ساخت ذخیره‌ساز مکالمات بر اساس متغیرهای محیطی
+
+    - CONVERSATION_STORE: sqlite (پیش‌فرض، مشترک بین workerها) یا memory
+    - CONVERSATION_DB: مسیر فایل SQLite
+    - CONVERSATION_TTL: مدت انقضای جلسه بدون فعالیت به ثانیه
+    - CONVERSATION_MAX_SESSIONS: حداکثر تعداد جلسه‌ها
+    """
+    backend = os.getenv('CONVERSATION_STORE', 'sqlite').lower()
+    ttl = float(os.getenv('CONVERSATION_TTL', '3600'))
+    max_sessions = int(os.getenv('CONVERSATION_MAX_SESSIONS', '10000'))
+
+    if backend == 'memory':
+        return InMemoryConversationStore(max_sessions=max_sessions, ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteConversationStore(
+            db_file=os.getenv('CONVERSATION_DB', 'conversations.db'),
+            max_sessions=max_sessions,
+            ttl=ttl
+        )
+    raise ValueError(f"CONVERSATION_STORE نامعتبر است: {backend}")
@@ -0,0 +1,299 @@
+"""
+استخراج تدریجی اطلاعات مشتری از مکالمه
+
+پس از هر نوبت مکالمه فقط پیام‌های جدید (پیام کاربر و پاسخ بات) در یک thread
+پس‌زمینه به مدل داده می‌شوند و فیلدهای استخراج شده در پروفایل مشتری همان
+جلسه (جدول customer_profiles در SQLite) ادغام می‌شوند. دریافت اطلاعات مشتری
+در /extract-info فقط یک جستجوی ساده در پایگاه داده است.
+
+صف کارها محدود است: نوبت‌های جدید جلسه‌ای که هنوز در صف است با همان کار ادغام
+می‌شوند و اگر تعداد جلسه‌های منتظر به سقف برسد نوبت جدید کنار گذاشته و شمرده
+می‌شود. هر فراخوانی مدل یک جایگاه از سقف فراخوانی‌های هم‌زمان OpenAI می‌گیرد.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, List, Optional
+
+from db import connect
+from metrics import inc, registry
+from rate_limiter import RateLimitExceeded
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+registry.counter('customer_extraction_jobs_total',
+                 'Background customer extraction turns by result (processed, coalesced, dropped, failed, skipped)')
+
+# فیلدهای پروفایل مشتری (کلیدهای JSON خروجی مدل)
+PROFILE_FIELDS = ['name', 'phone', 'email', 'address', 'product', 'quantity', 'price', 'notes']
+
+# prompt برای استخراج اطلاعات
+EXTRACTION_PROMPT = """از مکالمه زیر، اطلاعات مشتری را استخراج کن و به صورت JSON برگردان.
+        اگر اطلاعاتی موجود نبود، مقدار null بگذار.
+        
+        فرمت JSON:
+        {
+            "name": "نام و نام خانوادگی",
+            "phone": "شماره تماس",
+            "email": "ایمیل",
+            "address": "آدرس کامل",
+            "product": "محصول مورد نظر",
+            "quantity": "تعداد",
+            "price": "قیمت",
+            "notes": "یادداشت‌های اضافی"
+        }
+        
+        فقط JSON را برگردان، بدون توضیح اضافی."""
+
+EXTRACTION_PARAMS = {
+    'model': 'gpt-4o-mini',
+    'temperature': 0.3,
+    'max_tokens': 300,
+    # حالت JSON تضمین می‌کند خروجی مدل JSON معتبر باشد
+    'response_format': {'type': 'json_object'}
+}
+
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def format_messages(messages: List[Dict]) -> str:
+    """تبدیل پیام‌ها به متن مکالمه"""
+    return "\n".join(f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in messages)
+
+
+def build_extraction_messages(conversation_history: list, profile: Optional[Dict] = None) -> list:
+    """
+    ساخت پیام‌های استخراج اطلاعات
+
+    Args:
+        conversation_history: پیام‌های مکالمه (در حالت تدریجی فقط پیام‌های جدید)
+        profile: اطلاعات استخراج شده قبلی مشتری
+
+    Returns:
+        پیام‌های درخواست استخراج
+    """
+    full_prompt = EXTRACTION_PROMPT
+    if profile:
+        full_prompt += f"\n\nاطلاعات قبلی مشتری (فقط فیلدهای تغییر کرده یا جدید را برگردان):\n{json.dumps(profile, ensure_ascii=False)}"
+    # در حالت بدون پروفایل (مکالمه ارسالی کاربر) فقط آخرین 10 پیام استفاده می‌شود
+    recent = conversation_history if profile is not None else conversation_history[-10:]
+    full_prompt += f"\n\nمکالمه:\n{format_messages(recent)}"
+
+    return [
+        {"role": "system", "content": "شما یک سیستم استخراج اطلاعات هستید. فقط JSON برگردانید."},
+        {"role": "user", "content": full_prompt}
+    ]
+
+
+def parse_extraction(content: str) -> Dict:
+    """
+    تبدیل خروجی مدل به فیلدهای پروفایل
+
+    Returns:
+        همه فیلدهای PROFILE_FIELDS (مقدار None برای فیلدهای نامشخص)
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        # اگر مدل متن اضافی برگرداند، اولین شیء JSON داخل متن خوانده می‌شود
+        match = _JSON_OBJECT.search(content)
+        if not match:
+            raise
+        data = json.loads(match.group(0))
+
+    if not isinstance(data, dict):
+        raise ValueError("خروجی استخراج اطلاعات شیء JSON نیست")
+
+    result = {}
+    for field in PROFILE_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str):
+            value = value.strip() or None
+        elif value is not None:
+            value = str(value)
+        result[field] = value
+    return result
+
+
+class CustomerExtractor:
+    """استخراج تدریجی اطلاعات مشتری در پس‌زمینه و ادغام در پروفایل جلسه"""
+
+    def __init__(self, extract: Callable[[List[Dict], Dict], Dict],
+                 db_file: str = 'customer_profiles.db', max_pending: int = 256,
+                 max_messages: int = 20, llm_slot: Optional[Callable[[], ContextManager]] = None,
+                 slot_retries: int = 3):
+        """
+        Args:
+            extract: تابع (پیام‌های جدید، پروفایل فعلی) -> فیلدهای استخراج شده
+            db_file: مسیر فایل SQLite پروفایل‌ها
+            max_pending: حداکثر جلسه‌های منتظر استخراج در این پردازه
+            max_messages: حداکثر پیام‌های ادغام شده یک جلسه (جدیدترین‌ها نگه داشته می‌شوند)
+            llm_slot: context manager جایگاه فراخوانی OpenAI (RateLimitExceeded اگر ظرفیت پر باشد)
+            slot_retries: تعداد تلاش برای گرفتن جایگاه پیش از کنار گذاشتن کار
+        """
+        self.extract = extract
+        self.db_file = db_file
+        self.max_pending = max_pending
+        self.max_messages = max_messages
+        self.llm_slot = llm_slot or nullcontext
+        self.slot_retries = slot_retries
+        self.failures = 0
+        self.processed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.skipped = 0
+
+        # session_id -> پیام‌های منتظر استخراج (هر جلسه حداکثر یک کار در صف دارد)
+        self._pending: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self.ensure_table()
+
+    def ensure_table(self):
+        """ایجاد جدول پروفایل مشتریان در صورت عدم وجود"""
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS customer_profiles (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    turns INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def submit(self, session_id: str, *messages: Dict):
+        """
+        زمان‌بندی استخراج اطلاعات از پیام‌های جدید یک نوبت (بدون مسدود کردن درخواست)
+
+        Args:
+            session_id: شناسه جلسه
+            messages: پیام‌های جدید نوبت (کاربر و بات)
+        """
+        with self._lock:
+            pid = os.getpid()
+            # یک worker تا نوبت‌های هر جلسه به ترتیب پردازش شوند
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='customer-extractor')
+                self._executor_pid = pid
+                self._pending.clear()
+
+            pending = self._pending.get(session_id)
+            if pending is not None:
+                # کار این جلسه هنوز شروع نشده؛ پیام‌های نوبت جدید به همان کار اضافه می‌شوند
+                pending.extend(messages)
+                del pending[:-self.max_messages]
+                self.coalesced += 1
+                result = 'coalesced'
+            elif len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                result = 'dropped'
+            else:
+                self._pending[session_id] = list(messages)[-self.max_messages:]
+                self._executor.submit(self._run, session_id)
+                result = None
+
+        if result is not None:
+            inc('customer_extraction_jobs_total', result=result)
+        if result == 'dropped':
+            log.warning('extractor.backlog_full', session_id=session_id, pending=self.max_pending,
+                        dropped=self.dropped)
+
+    def _run(self, session_id: str):
+        """اجرای کار صف: برداشتن همه پیام‌های منتظر جلسه و استخراج"""
+        with self._lock:
+            messages = self._pending.pop(session_id, None)
+        if messages:
+            self.process(session_id, messages)
+
+    def process(self, session_id: str, messages: List[Dict]):
+        """استخراج اطلاعات از پیام‌های جدید و ادغام در پروفایل"""
+        try:
+            profile = self.get(session_id) or {}
+            known = {k: v for k, v in profile.items() if v is not None}
+            for attempt in range(self.slot_retries):
+                try:
+                    with self.llm_slot():
+                        fields = self.extract(messages, known)
+                    break
+                except RateLimitExceeded as e:
+                    # درخواست‌های کاربران بر استخراج پس‌زمینه اولویت دارند
+                    if attempt == self.slot_retries - 1:
+                        self.skipped += 1
+                        inc('customer_extraction_jobs_total', result='skipped')
+                        log.warning('extractor.no_capacity', session_id=session_id, messages=len(messages))
+                        return
+                    time.sleep(e.retry_after * (attempt + 1))
+            self.merge(session_id, fields)
+            self.processed += 1
+            inc('customer_extraction_jobs_total', result='processed')
+        except Exception as e:
+            self.failures += 1
+            inc('customer_extraction_jobs_total', result='failed')
+            log.warning('extractor.failed', session_id=session_id, error=str(e), error_type=type(e).__name__)
+
+    def stats(self) -> Dict:
+        """آمار صف استخراج (مربوط به پردازه فعلی)"""
+        return {
+            'pending': len(self._pending),
+            'max_pending': self.max_pending,
+            'processed': self.processed,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'skipped': self.skipped,
+            'failures': self.failures,
+        }
+
+    def merge(self, session_id: str, fields: Dict):
+        """ادغام فیلدهای غیر خالی در پروفایل (به صورت اتمیک در SQLite)"""
+        patch = json.dumps({k: v for k, v in fields.items() if v is not None}, ensure_ascii=False)
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute(
+                "INSERT INTO customer_profiles (session_id, data, turns, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = json_patch(data, excluded.data), "
+                "turns = turns + 1, updated_at = excluded.updated_at",
+                (session_id, patch, time.time())
+            )
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """
+        دریافت پروفایل استخراج شده مشتری
+
+        Returns:
+            همه فیلدهای PROFILE_FIELDS یا None اگر هنوز پروفایلی ثبت نشده باشد
+        """
+        row = connect(self.db_file).execute(
+            "SELECT data FROM customer_profiles WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        return {field: data.get(field) for field in PROFILE_FIELDS}
+
+
+def create_customer_extractor(extract: Callable[[List[Dict], Dict], Dict],
+                              llm_slot: Optional[Callable[[], ContextManager]] = None) -> Optional[CustomerExtractor]:
+    """
+    ساخت استخراج‌کننده اطلاعات مشتری بر اساس متغیرهای محیطی
+
+    - CUSTOMER_EXTRACTION_ENABLED: فعال بودن استخراج تدریجی (پیش‌فرض: 1)
+    - CUSTOMER_PROFILE_DB: مسیر فایل SQLite پروفایل‌ها
+    - CUSTOMER_EXTRACTION_MAX_PENDING: حداکثر جلسه‌های منتظر استخراج در هر پردازه (پیش‌فرض: 256)
+    """
+    if os.getenv('CUSTOMER_EXTRACTION_ENABLED', '1') != '1':
+        return None
+    return CustomerExtractor(
+        extract,
+        db_file=os.getenv('CUSTOMER_PROFILE_DB', 'customer_profiles.db'),
+        max_pending=int(os.getenv('CUSTOMER_EXTRACTION_MAX_PENDING', '256')),
+        llm_slot=llm_slot,
+    )
@@ -4,39 +4,103 @@
 
 import os
 import json
-from typing import Optional, Dict
+from typing import Dict, Iterable, List, Optional
+
+from db import connect
+from metrics import span
+from structured_logging import get_logger
+
+log = get_logger(__name__)
 
 class CustomerNumberManager:
     """مدیریت شماره مشتریان اختصاصی"""
     
-    def __init__(self, storage_file: str = "customer_numbers.json"):
+    def __init__(self, storage_file: str = "customer_numbers.json", db_file: str = "customer_numbers.db"):
         """
         Initialize customer number manager
         
         Args:
-            storage_file: مسیر فایل ذخیره شماره مشتریان
+            storage_file: مسیر فایل JSON قدیمی شماره مشتریان (فقط برای انتقال یک‌باره)
+            db_file: مسیر پایگاه داده SQLite شماره مشتریان
         """
         self.storage_file = storage_file
-        self.customer_numbers: Dict[str, str] = {}  # session_id -> customer_number
-        self.load_numbers()
+        self.db_file = db_file
+        self.ensure_table()
+    
+    @staticmethod
+    def format_number(number: int) -> str:
+        """تبدیل شماره ترتیبی به شماره مشتری (مثلاً: CUST-0001)"""
+        return f"CUST-{str(number).zfill(4)}"
     
-    def load_numbers(self):
-        """بارگذاری شماره مشتریان از فایل"""
-        if os.path.exists(self.storage_file):
-            try:
-                with open(self.storage_file, 'r', encoding='utf-8') as f:
-                    self.customer_numbers = json.load(f)
-            except Exception as e:
-                print(f"خطا در بارگذاری شماره مشتریان: {e}")
-                self.customer_numbers = {}
+    def ensure_table(self):
+        """ایجاد جدول شماره مشتریان در صورت عدم وجود"""
+        conn = connect(self.db_file)
+        with conn:
+            # AUTOINCREMENT شمارنده اتمیک و ماندگار است و شماره‌ها هرگز تکرار نمی‌شوند
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS customer_numbers (
+                    number INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL UNIQUE
+                )
+            """)
+        
+        # انتقال یک‌باره شماره‌های فایل JSON قدیمی
+        empty = conn.execute('SELECT 1 FROM customer_numbers LIMIT 1').fetchone() is None
+        if empty and os.path.exists(self.storage_file):
+            self.load_numbers()
     
-    def save_numbers(self):
-        """ذخیره شماره مشتریان در فایل"""
+    def load_numbers(self) -> int:
+        """
+        انتقال شماره مشتریان از فایل JSON قدیمی به پایگاه داده
+        
+        ردیف‌هایی که شماره آنها قبلاً به session دیگری داده شده منتقل نمی‌شوند و هر کدام
+        با رویداد customer_number.legacy_conflict ثبت می‌شوند تا قابل بررسی باشند. ردیف‌هایی که
+        همان (شماره، session) از قبل در پایگاه داده هستند (اجرای دوباره انتقال) تداخل نیستند.
+        
+        Returns:
+            تعداد ردیف‌های منتقل‌نشده (تداخل یا مقدار نامعتبر)
+        """
+        skipped = 0
         try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(self.customer_numbers, f, ensure_ascii=False, indent=2)
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                legacy_numbers = json.load(f)
+            
+            rows = []
+            for session_id, customer_number in legacy_numbers.items():
+                try:
+                    rows.append((int(customer_number.rsplit('-', 1)[-1]), session_id))
+                except (AttributeError, ValueError):
+                    skipped += 1
+                    log.warning('customer_number.invalid_legacy_entry', session_id=session_id, value=customer_number)
+            
+            conn = connect(self.db_file)
+            conflicts = []
+            existing = 0
+            with conn:
+                for number, session_id in rows:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO customer_numbers (number, session_id) VALUES (?, ?)",
+                        (number, session_id)
+                    )
+                    if cursor.rowcount:
+                        continue
+                    owner = conn.execute(
+                        "SELECT session_id FROM customer_numbers WHERE number = ?", (number,)
+                    ).fetchone()
+                    if owner and owner[0] == session_id:
+                        existing += 1
+                    else:
+                        conflicts.append((number, session_id, owner[0] if owner else None))
+            
+            for number, session_id, assigned_to in conflicts:
+                log.warning('customer_number.legacy_conflict', session_id=session_id,
+                            customer_number=self.format_number(number), assigned_to=assigned_to)
+            skipped += len(conflicts)
+            log.info('customer_number.legacy_migrated', storage_file=self.storage_file,
+                     migrated=len(rows) - len(conflicts) - existing, existing=existing, skipped=skipped)
         except Exception as e:
-            print(f"خطا در ذخیره شماره مشتریان: {e}")
+            log.exception('customer_number.legacy_migration_failed', storage_file=self.storage_file)
+        return skipped
     
     def get_or_create_customer_number(self, session_id: str) -> str:
         """
@@ -44,28 +108,77 @@ class CustomerNumberManager:
         
         Args:
             session_id: شناسه جلسه
-            
+        
         Returns:
             شماره مشتری (مثلاً: CUST-0001)
         """
-        if session_id in self.customer_numbers:
-            return self.customer_numbers[session_id]
+        customer_number = self.get_customer_number(session_id)
+        if customer_number:
+            return customer_number
         
         # ایجاد شماره مشتری جدید
-        # شماره بر اساس تعداد مشتریان موجود + 1
-        existing_count = len(self.customer_numbers)
-        customer_number = f"CUST-{str(existing_count + 1).zfill(4)}"
+        # قید UNIQUE تضمین می‌کند که حتی با چند worker هم‌زمان، هر session فقط یک شماره بگیرد
+        with span('customer_number.allocate'):
+            conn = connect(self.db_file)
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO customer_numbers (session_id) VALUES (?)", (session_id,))
         
-        self.customer_numbers[session_id] = customer_number
-        self.save_numbers()
+        return self.get_customer_number(session_id)
+    
+    def get_or_create_customer_numbers(self, session_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        دریافت یا ایجاد شماره مشتری برای چند session_id در یک تراکنش (ورود دسته‌ای)
         
-        return customer_number
+        Args:
+            session_ids: شناسه‌های جلسه (تکراری‌ها یک شماره می‌گیرند)
+        
+        Returns:
+            {session_id: شماره مشتری}
+        """
+        unique_ids = list(dict.fromkeys(session_ids))
+        with span('customer_number.allocate_batch'):
+            conn = connect(self.db_file)
+            numbers = self._lookup_numbers(conn, unique_ids)
+            # INSERT OR IGNORE برای session موجود هم یک شماره AUTOINCREMENT مصرف می‌کند؛
+            # فقط sessionهای جدید درج می‌شوند تا شماره‌ها پشت سر هم بمانند
+            missing = [session_id for session_id in unique_ids if session_id not in numbers]
+            if missing:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO customer_numbers (session_id) VALUES (?)",
+                        ((session_id,) for session_id in missing)
+                    )
+                numbers.update(self._lookup_numbers(conn, missing))
+        return numbers
+    
+    def _lookup_numbers(self, conn, session_ids: List[str]) -> Dict[str, str]:
+        numbers: Dict[str, str] = {}
+        # تعداد پارامترهای هر query در SQLite محدود است
+        for start in range(0, len(session_ids), 500):
+            chunk = session_ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT number, session_id FROM customer_numbers "
+                f"WHERE session_id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+            numbers.update((session_id, self.format_number(number)) for number, session_id in rows)
+        return numbers
     
     def get_customer_number(self, session_id: str) -> Optional[str]:
         """دریافت شماره مشتری برای session_id"""
-        return self.customer_numbers.get(session_id)
+        row = connect(self.db_file).execute(
+            "SELECT number FROM customer_numbers WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self.format_number(row[0])
     
     def get_all_customers(self) -> Dict[str, str]:
         """دریافت تمام شماره مشتریان"""
-        return self.customer_numbers.copy()
-
+        conn = connect(self.db_file)
+        return {
+            session_id: self.format_number(number)
+            for number, session_id in conn.execute(
+                "SELECT number, session_id FROM customer_numbers ORDER BY number"
+            )
+        }
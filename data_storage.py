@@ -1,126 +1,333 @@
 """
-ماژول ذخیره اطلاعات مشتریان در Excel و Google Sheets
+ماژول ذخیره اطلاعات مشتریان در دفتر ثبت SQLite، خروجی Excel و Google Sheets
 """
 
 import os
+import glob
 import json
+import threading
 from datetime import datetime
-from typing import Dict, Optional
-
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
-    print("⚠️  pandas نصب نشده است. از روش جایگزین استفاده می‌شود.")
-
-try:
-    from openpyxl import Workbook, load_workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
-    print("⚠️  openpyxl نصب نشده است.")
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Tuple
+
+from customer_manager import CustomerNumberManager
+from db import connect
+from metrics import span
+from sheets_sync import GoogleSheetsSync
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+# openpyxl فقط هنگام ساخت خروجی Excel import می‌شود. pandas وابستگی اختیاری است و فقط برای
+# درخواست صریح DataFrame (تحلیل داده) استفاده می‌شود؛ ذخیره و خواندن ردیف‌ها به آن نیازی ندارند
+PANDAS_AVAILABLE = find_spec('pandas') is not None
+
+OPENPYXL_AVAILABLE = find_spec('openpyxl') is not None
+if not OPENPYXL_AVAILABLE:
+    log.warning('storage.openpyxl_missing')
+
+# ستون‌های اطلاعات مشتری: (نام فیلد در دفتر ثبت، عنوان ستون در Excel)
+COLUMNS = [
+    ('customer_number', 'شماره مشتری'),
+    ('created_at', 'تاریخ و زمان'),
+    ('name', 'نام و نام خانوادگی'),
+    ('phone', 'شماره تماس'),
+    ('email', 'ایمیل'),
+    ('address', 'آدرس'),
+    ('product', 'محصول مورد نظر'),
+    ('quantity', 'تعداد'),
+    ('price', 'قیمت'),
+    ('status', 'وضعیت'),
+    ('notes', 'یادداشت'),
+    ('session_id', 'Session ID'),
+]
+
+FIELDS = [field for field, _ in COLUMNS]
+HEADERS = [title for _, title in COLUMNS]
+PHONE_INDEX = FIELDS.index('phone')
+
+# ستون‌های دارای index برای جستجو (phone_key شکل نرمال‌شده شماره تماس است)
+INDEXED_COLUMNS = {
+    'phone_key': 'phone_key',
+    'email': 'email COLLATE NOCASE',
+    'customer_number': 'customer_number',
+    'session_id': 'session_id',
+    'created_at': 'created_at',
+    'status': 'status',
+}
+QUERY_DEFAULT_LIMIT = 50
+QUERY_MAX_LIMIT = 500
+
+# ارقام فارسی و عربی به ارقام لاتین
+_DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+
+
+def phone_key(phone) -> str:
+    """
+    شکل نرمال‌شده شماره تماس برای جستجو
+
+    فقط ارقام نگه داشته می‌شوند و پیش‌شماره ایران (+98 / 0098) به 0 تبدیل می‌شود:
+    "+98 912 345 6789"، "۰۹۱۲-۳۴۵-۶۷۸۹" و "09123456789" یک کلید دارند.
+    """
+    digits = ''.join(ch for ch in str(phone or '').translate(_DIGITS) if ch.isdigit())
+    if digits.startswith('0098'):
+        digits = '0' + digits[4:]
+    elif digits.startswith('98') and len(digits) == 12:
+        digits = '0' + digits[2:]
+    return digits
+
+
+def _normalize_date(value: str, end: bool = False) -> str:
+    """تبدیل 2025-01-31 یا 2025/01/31 به قالب ستون created_at (انتهای روز برای end)"""
+    value = value.strip().translate(_DIGITS).replace('-', '/')
+    if len(value) == 10 and end:
+        value += ' 23:59:59'
+    return value
+
+# عرض ستون‌ها در فایل Excel
+COLUMN_WIDTHS = {
+    'A': 15,  # شماره مشتری
+    'B': 20,  # تاریخ و زمان
+    'C': 25,  # نام
+    'D': 15,  # شماره تماس
+    'E': 30,  # ایمیل
+    'F': 40,  # آدرس
+    'G': 30,  # محصول
+    'H': 10,  # تعداد
+    'I': 15,  # قیمت
+    'J': 15,  # وضعیت
+    'K': 40,  # یادداشت
+    'L': 30,  # Session ID
+}
 
 class CustomerDataStorage:
     """کلاس برای ذخیره اطلاعات مشتریان"""
     
-    def __init__(self, excel_file: str = "customers_data.xlsx", google_sheet_id: Optional[str] = None):
+    def __init__(self, excel_file: str = "customers_data.xlsx", google_sheet_id: Optional[str] = None,
+                 db_file: str = "customers.db", start_sync: bool = True):
         """
         Initialize data storage
         
         Args:
-            excel_file: مسیر فایل Excel
+            excel_file: مسیر فایل Excel (خروجی ساخته‌شده از دفتر ثبت)
             google_sheet_id: ID گوگل شیت (اختیاری)
+            db_file: مسیر دفتر ثبت SQLite (منبع اصلی داده‌ها)
+            start_sync: شروع thread همگام‌سازی گوگل شیت (False در پردازه اصلی gunicorn پیش از fork)
         """
         self.excel_file = excel_file
+        self.db_file = db_file
         self.google_sheet_id = google_sheet_id or os.getenv('GOOGLE_SHEET_ID')
-        self.ensure_excel_file()
-    
-    def ensure_excel_file(self):
-        """ایجاد فایل Excel در صورت عدم وجود"""
-        if not os.path.exists(self.excel_file):
-            if PANDAS_AVAILABLE:
-                df = pd.DataFrame(columns=[
-                    'شماره مشتری',
-                    'تاریخ و زمان',
-                    'نام و نام خانوادگی',
-                    'شماره تماس',
-                    'ایمیل',
-                    'آدرس',
-                    'محصول مورد نظر',
-                    'تعداد',
-                    'قیمت',
-                    'وضعیت',
-                    'یادداشت',
-                    'Session ID'
-                ])
-                df.to_excel(self.excel_file, index=False, engine='openpyxl')
-            else:
-                # روش جایگزین بدون pandas
-                wb = Workbook()
-                ws = wb.active
-                ws.append([
-                    'شماره مشتری',
-                    'تاریخ و زمان',
-                    'نام و نام خانوادگی',
-                    'شماره تماس',
-                    'ایمیل',
-                    'آدرس',
-                    'محصول مورد نظر',
-                    'تعداد',
-                    'قیمت',
-                    'وضعیت',
-                    'یادداشت',
-                    'Session ID'
-                ])
-                wb.save(self.excel_file)
-            self.format_excel_file()
-    
-    def format_excel_file(self):
-        """فرمت‌دهی فایل Excel"""
+        self._export_lock = threading.Lock()
+        self.ensure_ledger()
+        
+        # همگام‌سازی Google Sheets در پس‌زمینه (اگر تنظیم شده باشد)
+        self.sheets_sync = None
+        if self.google_sheet_id:
+            self.sheets_sync = GoogleSheetsSync(self.db_file, self.google_sheet_id, FIELDS)
+            if start_sync:
+                self.sheets_sync.start()
+    
+    def check_writable(self):
+        """
+        بررسی قابل نوشتن بودن دفتر ثبت (قفل نوشتن گرفته و بدون تغییر آزاد می‌شود)
+
+        Raises:
+            sqlite3.Error: اگر فایل فقط‌خواندنی یا قفل نوشتن در دسترس نباشد
+        """
+        conn = connect(self.db_file)
+        conn.execute('BEGIN IMMEDIATE')
+        conn.rollback()
+    
+    def ensure_ledger(self):
+        """ایجاد جدول دفتر ثبت مشتریان در صورت عدم وجود"""
+        conn = connect(self.db_file)
+        columns_sql = ', '.join(f'{field} TEXT' for field in FIELDS)
+        with conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS customers "
+                f"(id INTEGER PRIMARY KEY AUTOINCREMENT, {columns_sql}, phone_key TEXT)"
+            )
+        self.ensure_indexes()
+        
+        # انتقال یک‌باره داده‌های فایل Excel قدیمی به دفتر ثبت
+        empty = conn.execute('SELECT 1 FROM customers LIMIT 1').fetchone() is None
+        if empty and os.path.exists(self.excel_file):
+            self.import_legacy_excel()
+    
+    def ensure_indexes(self):
+        """ایجاد indexهای جستجو (و ستون phone_key در دفترهای ثبت قدیمی)"""
+        conn = connect(self.db_file)
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(customers)')}
+        with conn:
+            if 'phone_key' not in columns:
+                conn.execute('ALTER TABLE customers ADD COLUMN phone_key TEXT')
+                conn.create_function('phone_key', 1, phone_key, deterministic=True)
+                conn.execute('UPDATE customers SET phone_key = phone_key(phone)')
+            for name, definition in INDEXED_COLUMNS.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_customers_{name} ON customers ({definition})")
+    
+    def import_legacy_excel(self):
+        """انتقال ردیف‌های فایل Excel قدیمی به دفتر ثبت"""
         if not OPENPYXL_AVAILABLE:
             return
-            
+        
         try:
-            wb = load_workbook(self.excel_file)
-            ws = wb.active
-            
-            # فرمت هدر
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF")
-            
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            # تنظیم عرض ستون‌ها
-            column_widths = {
-                'A': 15,  # شماره مشتری
-                'B': 20,  # تاریخ و زمان
-                'C': 25,  # نام
-                'D': 15,  # شماره تماس
-                'E': 30,  # ایمیل
-                'F': 40,  # آدرس
-                'G': 30,  # محصول
-                'H': 10,  # تعداد
-                'I': 15,  # قیمت
-                'J': 15,  # وضعیت
-                'K': 40,  # یادداشت
-                'L': 30,  # Session ID
-            }
-            
-            for col, width in column_widths.items():
-                ws.column_dimensions[col].width = width
-            
-            wb.save(self.excel_file)
+            from openpyxl import load_workbook
+            wb = load_workbook(self.excel_file, read_only=True)
+            try:
+                # ردیف‌ها به صورت جریانی از فایل خوانده و درج می‌شوند (بدون نگهداری کل فایل در حافظه)
+                self._insert_rows(
+                    tuple('' if value is None else str(value) for value in row[:len(FIELDS)])
+                    for row in wb.active.iter_rows(min_row=2, values_only=True)
+                    if any(value is not None for value in row)
+                )
+            finally:
+                wb.close()
         except Exception as e:
-            print(f"خطا در فرمت‌دهی فایل Excel: {e}")
+            log.exception('storage.legacy_excel_migration_failed', excel_file=self.excel_file)
+    
+    def _insert_rows(self, rows):
+        """درج ردیف‌ها در دفتر ثبت در یک تراکنش"""
+        placeholders = ', '.join('?' for _ in range(len(FIELDS) + 1))
+        conn = connect(self.db_file)
+        with conn:
+            conn.executemany(
+                f"INSERT INTO customers ({', '.join(FIELDS)}, phone_key) VALUES ({placeholders})",
+                (tuple(row) + (phone_key(row[PHONE_INDEX]),) for row in rows)
+            )
+    
+    def iter_rows(self, max_id: Optional[int] = None):
+        """
+        پیمایش ردیف‌های دفتر ثبت به ترتیب ثبت
+        
+        Args:
+            max_id: فقط ردیف‌های با شناسه کوچکتر یا مساوی این مقدار (اختیاری)
+        """
+        conn = connect(self.db_file)
+        query = f"SELECT {', '.join(FIELDS)} FROM customers"
+        params = ()
+        if max_id is not None:
+            query += " WHERE id <= ?"
+            params = (max_id,)
+        for row in conn.execute(query + " ORDER BY id", params):
+            yield tuple(row)
+    
+    def get_version(self) -> int:
+        """
+        نسخه فعلی داده‌ها
+        
+        دفتر ثبت فقط افزودنی است، پس شناسه آخرین ردیف فقط با ذخیره مشتری جدید تغییر می‌کند.
+        """
+        row = connect(self.db_file).execute('SELECT COALESCE(MAX(id), 0) FROM customers').fetchone()
+        return row[0]
+    
+    def export_path(self, version: int) -> str:
+        """مسیر فایل Excel خروجی برای یک نسخه"""
+        base, ext = os.path.splitext(self.excel_file)
+        return f"{base}.v{version}{ext}"
+    
+    def export_excel(self) -> Tuple[str, int]:
+        """
+        دریافت فایل Excel ساخته‌شده از دفتر ثبت
+        
+        فایل هر نسخه فقط یک بار ساخته می‌شود و درخواست‌های بعدی از همان فایل سرو می‌شوند.
+        
+        Returns:
+            (مسیر فایل Excel، نسخه داده‌ها)
+        """
+        version = self.get_version()
+        path = self.export_path(version)
+        if os.path.exists(path):
+            return path, version
+        
+        with self._export_lock:
+            if not os.path.exists(path):
+                with span('excel.export'):
+                    self._build_excel(path, version)
+                self._remove_old_exports(version)
+        return path, version
+    
+    def _build_excel(self, path: str, version: int):
+        """ساخت فایل Excel با حالت write-only (مصرف حافظه مستقل از تعداد ردیف‌ها)"""
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font, PatternFill
+        
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        
+        for col, width in COLUMN_WIDTHS.items():
+            ws.column_dimensions[col].width = width
+        
+        # فرمت هدر
+        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        header_font = Font(bold=True, color="FFFFFF")
+        header_alignment = Alignment(horizontal="center", vertical="center")
+        header = []
+        for title in HEADERS:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = header_alignment
+            header.append(cell)
+        ws.append(header)
+        
+        for row in self.iter_rows(max_id=version):
+            ws.append(row)
+        
+        # نوشتن در فایل موقت و جایگزینی اتمیک
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    
+    def _remove_old_exports(self, version: int):
+        """حذف فایل‌های خروجی نسخه‌های قدیمی (نسخه قبلی برای دانلودهای در جریان نگه داشته می‌شود)"""
+        base, ext = os.path.splitext(self.excel_file)
+        exports = []
+        for path in glob.glob(f"{glob.escape(base)}.v*{ext}"):
+            try:
+                exports.append((int(path[len(base) + 2:-len(ext)]), path))
+            except ValueError:
+                continue
+        exports.sort(reverse=True)
+        for old_version, path in exports[2:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def ledger_row(customer_data: Dict, created_at: str) -> Tuple:
+        """ردیف دفتر ثبت (به ترتیب FIELDS) از اطلاعات مشتری"""
+        values = dict(customer_data, created_at=created_at)
+        values.setdefault('status', 'در انتظار')
+        return tuple(values.get(field, '') for field in FIELDS)
+    
+    def save_customers_batch(self, customers: List[Dict]) -> int:
+        """
+        ذخیره چند مشتری در یک تراکنش (ورود دسته‌ای)
+        
+        همه ردیف‌ها با هم ثبت می‌شوند یا هیچ‌کدام؛ Google Sheets همه را در ارسال‌های
+        دسته‌ای بعدی دریافت می‌کند.
+        
+        Args:
+            customers: لیست اطلاعات مشتریان (شامل customer_number)
+        
+        Returns:
+            تعداد ردیف‌های ثبت شده
+        """
+        if not customers:
+            return 0
+        created_at = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+        with span('storage.save_customers_batch'):
+            self._insert_rows([self.ledger_row(customer, created_at) for customer in customers])
+        if self.sheets_sync:
+            self.sheets_sync.notify(len(customers))
+        return len(customers)
     
     def save_customer_data(self, customer_data: Dict) -> bool:
         """
-        ذخیره اطلاعات مشتری در Excel
+        ذخیره اطلاعات مشتری در دفتر ثبت
         
         Args:
             customer_data: دیکشنری شامل اطلاعات مشتری
@@ -129,117 +336,110 @@ class CustomerDataStorage:
             True در صورت موفقیت
         """
         try:
-            new_row = {
-                'شماره مشتری': customer_data.get('customer_number', ''),
-                'تاریخ و زمان': datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
-                'نام و نام خانوادگی': customer_data.get('name', ''),
-                'شماره تماس': customer_data.get('phone', ''),
-                'ایمیل': customer_data.get('email', ''),
-                'آدرس': customer_data.get('address', ''),
-                'محصول مورد نظر': customer_data.get('product', ''),
-                'تعداد': customer_data.get('quantity', ''),
-                'قیمت': customer_data.get('price', ''),
-                'وضعیت': customer_data.get('status', 'در انتظار'),
-                'یادداشت': customer_data.get('notes', ''),
-                'Session ID': customer_data.get('session_id', '')
-            }
-            
-            if PANDAS_AVAILABLE:
-                # استفاده از pandas
-                df = pd.read_excel(self.excel_file, engine='openpyxl')
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_excel(self.excel_file, index=False, engine='openpyxl')
-            else:
-                # روش جایگزین بدون pandas
-                wb = load_workbook(self.excel_file)
-                ws = wb.active
-                ws.append([
-                    new_row['شماره مشتری'],
-                    new_row['تاریخ و زمان'],
-                    new_row['نام و نام خانوادگی'],
-                    new_row['شماره تماس'],
-                    new_row['ایمیل'],
-                    new_row['آدرس'],
-                    new_row['محصول مورد نظر'],
-                    new_row['تعداد'],
-                    new_row['قیمت'],
-                    new_row['وضعیت'],
-                    new_row['یادداشت'],
-                    new_row['Session ID']
-                ])
-                wb.save(self.excel_file)
+            # افزودن یک ردیف به دفتر ثبت (بدون بازنویسی کل فایل)
+            with span('storage.save_customer'):
+                self._insert_rows([self.ledger_row(customer_data, datetime.now().strftime('%Y/%m/%d %H:%M:%S'))])
             
-            self.format_excel_file()
-            
-            # ذخیره در Google Sheets (اگر تنظیم شده باشد)
-            if self.google_sheet_id:
-                self.save_to_google_sheets(new_row)
+            # ارسال به Google Sheets در پس‌زمینه (اگر تنظیم شده باشد)
+            if self.sheets_sync:
+                self.sheets_sync.notify()
             
             return True
             
         except Exception as e:
-            print(f"خطا در ذخیره اطلاعات: {e}")
+            log.exception('storage.save_failed')
             return False
     
-    def save_to_google_sheets(self, data: Dict):
-        """ذخیره در Google Sheets"""
-        try:
-            import gspread
-            from google.oauth2.service_account import Credentials
-            
-            # بررسی وجود credentials
-            creds_file = os.getenv('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
-            if not os.path.exists(creds_file):
-                print("⚠️  فایل credentials.json برای Google Sheets یافت نشد")
-                return
-            
-            # اتصال به Google Sheets
-            scope = ['https://spreadsheets.google.com/feeds',
-                    'https://www.googleapis.com/auth/drive']
-            creds = Credentials.from_service_account_file(creds_file, scopes=scope)
-            client = gspread.authorize(creds)
-            
-            # باز کردن شیت
-            sheet = client.open_by_key(self.google_sheet_id).sheet1
-            
-            # اضافه کردن ردیف
-            row = [
-                data.get('شماره مشتری', ''),
-                data.get('تاریخ و زمان', ''),
-                data.get('نام و نام خانوادگی', ''),
-                data.get('شماره تماس', ''),
-                data.get('ایمیل', ''),
-                data.get('آدرس', ''),
-                data.get('محصول مورد نظر', ''),
-                data.get('تعداد', ''),
-                data.get('قیمت', ''),
-                data.get('وضعیت', ''),
-                data.get('یادداشت', ''),
-                data.get('Session ID', '')
-            ]
-            sheet.append_row(row)
-            
-            print("✅ اطلاعات در Google Sheets ذخیره شد")
-            
-        except Exception as e:
-            print(f"⚠️  خطا در ذخیره در Google Sheets: {e}")
+    def query_customers(self, phone: Optional[str] = None, number: Optional[str] = None,
+                        email: Optional[str] = None, session_id: Optional[str] = None,
+                        status: Optional[str] = None, date_from: Optional[str] = None,
+                        date_to: Optional[str] = None, cursor: Optional[int] = None,
+                        limit: int = QUERY_DEFAULT_LIMIT) -> Dict:
+        """
+        جستجوی مشتریان با index (جدیدترین ردیف‌ها اول)
+        
+        صفحه‌بندی با cursor (شناسه آخرین ردیف صفحه قبل) انجام می‌شود؛ هزینه و حافظه هر
+        صفحه مستقل از تعداد کل ردیف‌ها است.
+        
+        Args:
+            phone: شماره تماس (با هر قالبی؛ نرمال می‌شود)
+            number: شماره مشتری (CUST-0001 یا 1)
+            email: ایمیل (بدون حساسیت به حروف بزرگ و کوچک)
+            session_id: شناسه جلسه
+            status: وضعیت
+            date_from / date_to: بازه تاریخ ثبت (YYYY-MM-DD یا YYYY/MM/DD HH:MM:SS)
+            cursor: مقدار next_cursor صفحه قبل
+            limit: تعداد ردیف‌های صفحه (حداکثر QUERY_MAX_LIMIT)
+        
+        Returns:
+            {'customers': [{'id', فیلدها...}], 'next_cursor': شناسه یا None}
+        """
+        conditions: List[str] = []
+        params: List = []
+        if phone:
+            conditions.append('phone_key = ?')
+            params.append(phone_key(phone))
+        if number:
+            number = number.strip().translate(_DIGITS).upper()
+            conditions.append('customer_number = ?')
+            params.append(CustomerNumberManager.format_number(int(number)) if number.isdigit() else number)
+        if email:
+            conditions.append('email = ? COLLATE NOCASE')
+            params.append(email.strip())
+        if session_id:
+            conditions.append('session_id = ?')
+            params.append(session_id)
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        if date_from:
+            conditions.append('created_at >= ?')
+            params.append(_normalize_date(date_from))
+        if date_to:
+            conditions.append('created_at <= ?')
+            params.append(_normalize_date(date_to, end=True))
+        if cursor is not None:
+            conditions.append('id < ?')
+            params.append(cursor)
+        
+        limit = max(1, min(limit, QUERY_MAX_LIMIT))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = connect(self.db_file).execute(
+            f"SELECT id, {', '.join(FIELDS)} FROM customers {where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        
+        customers = [dict(row) for row in rows[:limit]]
+        return {
+            'customers': customers,
+            'next_cursor': customers[-1]['id'] if len(rows) > limit else None,
+        }
     
-    def get_all_customers(self):
-        """دریافت تمام اطلاعات مشتریان"""
+    def get_all_customers(self, as_dataframe: bool = False):
+        """
+        دریافت تمام اطلاعات مشتریان
+        
+        برای پیمایش ردیف‌ها بدون نگهداری همه آنها در حافظه از iter_rows استفاده کنید.
+        
+        Args:
+            as_dataframe: ساخت pandas.DataFrame (فقط برای تحلیل داده؛ نیازمند pandas)
+        
+        Returns:
+            لیست ردیف‌ها با ردیف عنوان ستون‌ها در ابتدا، یا DataFrame
+        
+        Raises:
+            ImportError: اگر as_dataframe درخواست شده و pandas نصب نباشد
+        """
+        if as_dataframe:
+            if not PANDAS_AVAILABLE:
+                raise ImportError('pandas is required for as_dataframe=True')
+            import pandas as pd
+            return pd.DataFrame.from_records(self.iter_rows(), columns=HEADERS)
+        
         try:
-            if PANDAS_AVAILABLE:
-                return pd.read_excel(self.excel_file, engine='openpyxl')
-            else:
-                # روش جایگزین
-                wb = load_workbook(self.excel_file)
-                ws = wb.active
-                data = []
-                for row in ws.iter_rows(values_only=True):
-                    data.append(row)
-                return data
+            data = [tuple(HEADERS)]
+            data.extend(self.iter_rows())
+            return data
         except Exception as e:
-            print(f"خطا در خواندن فایل: {e}")
-            if PANDAS_AVAILABLE:
-                return pd.DataFrame()
+            log.exception('storage.read_failed')
             return []
-
@@ -0,0 +1,51 @@
+"""
+ابزار مشترک اتصال به پایگاه داده SQLite
+"""
+
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connect(db_file: str) -> sqlite3.Connection:
+    """
+    دریافت اتصال SQLite برای thread و پردازه فعلی
+
+    اتصال‌ها برای هر thread نگه داشته می‌شوند و پس از fork (مثلاً در gunicorn)
+    دوباره ساخته می‌شوند. حالت WAL اجازه می‌دهد خواندن‌ها نوشتن را مسدود نکنند.
+
+    Args:
+        db_file: مسیر فایل پایگاه داده
+
+    Returns:
+        اتصال SQLite
+    """
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.connections = {}
+
+    conn = _local.connections.get(db_file)
+    if conn is None:
+        conn = sqlite3.connect(db_file, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.connections[db_file] = conn
+    return conn
+
+
+def close_all():
+    """
+    بستن همه اتصال‌های ذخیره شده thread فعلی
+
+    پیش از fork (مثلاً در warm_up پردازه اصلی gunicorn) فراخوانی می‌شود: اتصال SQLite باز نباید
+    به پردازه فرزند برسد، چون بسته شدن آن در فرزند می‌تواند قفل‌های پردازه والد را آزاد کند.
+    """
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    _local.connections = {}
+    _local.pid = os.getpid()
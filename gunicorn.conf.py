@@ -0,0 +1,28 @@
+"""
+تنظیمات gunicorn (به صورت خودکار از پوشه جاری خوانده می‌شود)
+
+با --preload (یا GUNICORN_PRELOAD=1) برنامه یک بار در پردازه اصلی import و با warm_up آماده
+می‌شود؛ workerها ماژول‌ها، قالب‌ها و ذخیره‌سازهای ساخته شده را به صورت copy-on-write به
+اشتراک می‌گذارند و شروع هر worker فقط به اندازه fork زمان می‌برد.
+
+تنظیمات خط فرمان بر این فایل اولویت دارند.
+"""
+
+import os
+import sys
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+
+def when_ready(server):
+    """پس از بارگذاری برنامه و پیش از ساخت workerها (در پردازه اصلی)"""
+    if server.cfg.preload_app:
+        import chatbot_web
+        chatbot_web.warm_up()
+
+
+def post_fork(server, worker):
+    """شروع کارهای پس‌زمینه‌ای که در پردازه اصلی متوقف شده‌اند"""
+    chatbot_web = sys.modules.get('chatbot_web')
+    if chatbot_web is not None:
+        chatbot_web.after_fork()
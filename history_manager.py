@@ -0,0 +1,186 @@
+"""
+مدیریت سابقه مکالمه بر اساس بودجه توکن
+
+- شمارش توکن هر پیام فقط یک بار انجام و کش می‌شود
+- پنجره سابقه ارسالی به API از جدیدترین پیام‌ها تا سقف بودجه توکن ساخته می‌شود
+- وقتی سابقه ذخیره شده از سقف بیشتر شود، پیام‌های قدیمی در یک thread پس‌زمینه
+  در یک خلاصه (پیام system ابتدای سابقه) ادغام می‌شوند
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+SUMMARY_PREFIX = "خلاصه گفتگوی قبلی با این مشتری:\n"
+
+# هزینه ثابت هر پیام در قالب chat (نقش و جداکننده‌ها)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """شمارش توکن با کش LRU (هر متن فقط یک بار توکن‌شماری می‌شود)"""
+
+    def __init__(self, model: str = 'gpt-4o-mini', cache_size: int = 10000):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._encoding = None
+        if TIKTOKEN_AVAILABLE:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                # مثلاً دانلود فایل encoding در سرور بدون اینترنت
+                log.warning('history.tokenizer_unavailable', model=model, error=str(e),
+                            error_type=type(e).__name__)
+        else:
+            log.warning('history.tokenizer_unavailable', model=model, error='tiktoken is not installed')
+
+    def _count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        # تخمین تقریبی بدون tiktoken (حدود ۳ کاراکتر فارسی برای هر توکن)
+        return len(text) // 3 + 1
+
+    def count(self, text: str) -> int:
+        """تعداد توکن‌های متن"""
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+
+        tokens = self._count(text)
+        with self._lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: Dict) -> int:
+        """تعداد توکن‌های یک پیام chat"""
+        return self.count(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+
+class HistoryManager:
+    """پنجره‌بندی سابقه مکالمه با بودجه توکن و خلاصه‌سازی پس‌زمینه"""
+
+    def __init__(self, store, token_budget: int, max_stored_messages: int,
+                 summarize: Optional[Callable[[str, List[Dict]], str]] = None,
+                 counter: Optional[TokenCounter] = None):
+        """
+        Args:
+            store: ذخیره‌ساز مکالمات (ConversationStore)
+            token_budget: حداکثر توکن سابقه ارسالی به API در هر درخواست
+            max_stored_messages: حداکثر پیام‌های ذخیره شده هر جلسه پیش از خلاصه‌سازی
+            summarize: تابع (خلاصه قبلی، پیام‌های قدیمی) -> خلاصه جدید؛ اگر None باشد پیام‌های قدیمی حذف می‌شوند
+            counter: شمارنده توکن
+        """
+        self.store = store
+        self.token_budget = token_budget
+        self.max_stored_messages = max_stored_messages
+        self.summarize = summarize
+        self.counter = counter or TokenCounter()
+
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    @staticmethod
+    def split_summary(history: List[Dict]):
+        """جدا کردن پیام خلاصه (در صورت وجود) از بقیه سابقه"""
+        if history and history[0]['role'] == 'system':
+            return history[0], history[1:]
+        return None, history
+
+    def window(self, history: List[Dict]) -> List[Dict]:
+        """
+        انتخاب جدیدترین پیام‌ها تا سقف بودجه توکن
+
+        Args:
+            history: سابقه کامل مکالمه (شامل پیام فعلی کاربر)
+
+        Returns:
+            پیام‌های قابل ارسال به API
+        """
+        summary, turns = self.split_summary(history)
+        budget = self.token_budget
+        selected = []
+        for message in reversed(turns):
+            tokens = self.counter.count_message(message)
+            # پیام فعلی کاربر همیشه ارسال می‌شود
+            if selected and tokens > budget:
+                break
+            selected.append(message)
+            budget -= tokens
+
+        # خلاصه فقط وقتی بخشی از سابقه کنار گذاشته شده و جا باشد اضافه می‌شود
+        if summary is not None and self.counter.count_message(summary) <= budget:
+            selected.append(summary)
+        selected.reverse()
+        return selected
+
+    def maybe_compact(self, session_id: str, history_length: int):
+        """
+        زمان‌بندی خلاصه‌سازی پس‌زمینه اگر سابقه از سقف بیشتر شده باشد
+
+        Args:
+            session_id: شناسه جلسه
+            history_length: تعداد پیام‌های ذخیره شده جلسه
+        """
+        if history_length <= self.max_stored_messages:
+            return
+
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+            pid = os.getpid()
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history-summary')
+                self._executor_pid = pid
+            self._executor.submit(self._compact, session_id)
+
+    def _compact(self, session_id: str):
+        """ادغام پیام‌های قدیمی در خلاصه و کوتاه کردن سابقه ذخیره شده"""
+        try:
+            history = self.store.get(session_id)
+            summary, turns = self.split_summary(history)
+            # نیمی از سقف برای پیام‌های اخیر نگه داشته می‌شود
+            keep = max(2, self.max_stored_messages // 2)
+            if len(turns) <= keep:
+                return
+            old_turns = turns[:-keep]
+
+            new_summary = None
+            if self.summarize is not None:
+                previous = summary['content'][len(SUMMARY_PREFIX):] if summary else ''
+                try:
+                    new_summary = self.summarize(previous, old_turns)
+                except Exception as e:
+                    log.warning('history.summarize_failed', session_id=session_id, error=str(e),
+                                error_type=type(e).__name__)
+                    new_summary = previous or None
+
+            compacted = []
+            if new_summary:
+                compacted.append({"role": "system", "content": SUMMARY_PREFIX + new_summary})
+            compacted.extend(turns[-keep:])
+            # جایگزینی اتمیک: پیام‌هایی که در حین خلاصه‌سازی اضافه شده‌اند حفظ می‌شوند و اگر
+            # سابقه در این مدت پاک یا جایگزین شده باشد تغییری داده نمی‌شود
+            if not self.store.replace_prefix(session_id, history, compacted):
+                log.info('history.compaction_skipped', session_id=session_id)
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
@@ -0,0 +1,230 @@
+"""
+پردازش تصاویر آپلود شده (لوگو و آیکون)
+
+هر تصویر فقط یک بار هنگام آپلود پردازش می‌شود:
+- نسخه‌های کوچک شده برای اندازه نمایش در هدر (1x، 2x، 3x) و اندازه‌های favicon
+- کدگذاری مجدد به WebP (و AVIF در صورت پشتیبانی Pillow)؛ favicon و apple-touch-icon به PNG؛
+  متادیتا (EXIF، ICC و ...) حذف می‌شود
+- فایل SVG پس از حذف اسکریپت‌ها، event handlerها و ارجاع‌های خارجی بدون تغییر اندازه ذخیره می‌شود
+- نام هر نسخه شامل hash محتوای آن است (آدرس immutable)
+
+بدون Pillow (و برای تصاویر متحرک) فایل اصلی مانند قبل ذخیره می‌شود.
+"""
+
+import io
+import os
+import re
+from datetime import datetime
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from static_assets import hashed_filename
+
+# Pillow فقط هنگام پردازش اولین آپلود import می‌شود (زمان راه‌اندازی worker کمتر)
+PILLOW_AVAILABLE = find_spec('PIL') is not None
+
+# اندازه نمایش هر نوع در هدر صفحه چت (پیکسل CSS)
+DISPLAY_SIZES = {'logo': 40, 'icon': 30}
+SCALES = (1, 2, 3)
+# favicon و apple-touch-icon از روی آیکون ساخته می‌شوند
+FAVICON_SIZES = {'icon': (32, 180)}
+# سقف ابعاد تصویر ورودی (جلوگیری از decompression bomb)
+MAX_PIXELS = 40_000_000
+
+# فرمت‌های خروجی به ترتیب اولویت: (فرمت Pillow، نوع MIME، پسوند، تنظیمات)
+OUTPUT_FORMATS = [
+    ('AVIF', 'image/avif', 'avif', {'quality': 60}),
+    ('WEBP', 'image/webp', 'webp', {'quality': 85, 'method': 6}),
+]
+# favicon و apple-touch-icon همیشه PNG هستند (iOS و مرورگرهای قدیمی‌تر آیکون WebP را نادیده می‌گیرند)
+PNG_FORMAT = ('PNG', 'image/png', 'png', {'optimize': True})
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+ElementTree.register_namespace('', SVG_NS)
+ElementTree.register_namespace('xlink', XLINK_NS)
+
+# عناصری که در SVG آپلود شده مجاز نیستند
+_SVG_FORBIDDEN_TAGS = {'script', 'foreignObject', 'iframe', 'embed', 'object', 'audio', 'video'}
+# ارجاع‌های مجاز: داخل خود سند یا تصویر data
+_SAFE_HREF = re.compile(r'^(#|data:image/(png|jpeg|gif|webp);)', re.IGNORECASE)
+_UNSAFE_CSS = re.compile(r'@import|javascript:|url\(\s*[\'"]?(?!#|data:image/)', re.IGNORECASE)
+
+
+class ImageRejected(ValueError):
+    """تصویر آپلود شده نامعتبر یا ناامن است"""
+
+
+def _local_name(name: str) -> str:
+    return name.rsplit('}', 1)[-1]
+
+
+def sanitize_svg(data: bytes) -> bytes:
+    """
+    حذف محتوای فعال از SVG
+
+    اسکریپت‌ها، foreignObject، attributeهای on*، ارجاع‌های خارجی (href) و CSS دارای
+    url خارجی یا @import حذف می‌شوند. فایل دارای DOCTYPE/ENTITY رد می‌شود.
+
+    Raises:
+        ImageRejected: اگر فایل SVG معتبر نباشد
+    """
+    head = data[:4096].lower()
+    if b'<!doctype' in head or b'<!entity' in data.lower():
+        raise ImageRejected('فایل SVG دارای DOCTYPE یا ENTITY مجاز نیست')
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise ImageRejected(f'فایل SVG نامعتبر است: {e}')
+    if _local_name(root.tag) != 'svg':
+        raise ImageRejected('فایل SVG نامعتبر است')
+
+    for parent in root.iter():
+        for child in list(parent):
+            tag = _local_name(child.tag) if isinstance(child.tag, str) else ''
+            if tag in _SVG_FORBIDDEN_TAGS or (tag == 'style' and _UNSAFE_CSS.search(child.text or '')):
+                parent.remove(child)
+        for name, value in list(parent.attrib.items()):
+            local = _local_name(name).lower()
+            if local.startswith('on'):
+                del parent.attrib[name]
+            elif local == 'href' and not _SAFE_HREF.match(value.strip()):
+                del parent.attrib[name]
+            elif local == 'style' and _UNSAFE_CSS.search(value):
+                del parent.attrib[name]
+            elif 'javascript:' in value.replace(' ', '').lower():
+                del parent.attrib[name]
+
+    return ElementTree.tostring(root, encoding='utf-8', xml_declaration=False)
+
+
+def output_formats() -> List[Tuple[str, str, str, Dict]]:
+    """فرمت‌های خروجی که Pillow نصب شده پشتیبانی می‌کند (PNG اگر WebP در دسترس نباشد)"""
+    from PIL import features
+    formats = [fmt for fmt in OUTPUT_FORMATS if features.check(fmt[0].lower())]
+    return formats or [PNG_FORMAT]
+
+
+def _open_image(data: bytes) -> "Image.Image":
+    from PIL import Image
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_PIXELS:
+            raise ImageRejected('ابعاد تصویر بیش از حد مجاز است')
+        image.load()
+    except ImageRejected:
+        raise
+    except Exception:
+        raise ImageRejected('فایل تصویر نامعتبر است')
+    return image
+
+
+def _encode(image: "Image.Image", fmt: str, options: Dict) -> bytes:
+    buffer = io.BytesIO()
+    # exif و icc_profile ارسال نمی‌شوند، پس متادیتا در خروجی وجود ندارد
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def _resize(image: "Image.Image", size: int) -> "Image.Image":
+    from PIL import Image
+    resized = image.copy()
+    resized.thumbnail((size, size), Image.LANCZOS)
+    return resized
+
+
+def process_upload(kind: str, filename: str, data: bytes, now: Optional[datetime] = None) -> Dict:
+    """
+    پردازش یک فایل آپلود شده
+
+    Args:
+        kind: نوع فایل (logo / icon)
+        filename: نام امن فایل (secure_filename)
+        data: محتوای فایل
+        now: زمان آپلود (برای نام فایل‌ها)
+
+    Returns:
+        {
+            'primary': نام نسخه اصلی (اندازه 1x)،
+            'files': {نام فایل: محتوا} برای همه نسخه‌ها،
+            'srcset': {نوع MIME: [(نام فایل، توصیف‌گر 1x/2x/...)]}،
+            'favicon': {اندازه: نام فایل}
+        }
+
+    Raises:
+        ImageRejected: اگر فایل تصویر معتبر یا امن نباشد
+    """
+    now = now or datetime.now()
+    stem, ext = os.path.splitext(filename)
+    ext = ext.lower().lstrip('.')
+
+    if ext == 'svg':
+        # SVG برداری است و در هر اندازه‌ای واضح نمایش داده می‌شود؛ فقط پاک‌سازی می‌شود
+        sanitized = sanitize_svg(data)
+        name = hashed_filename(filename, sanitized, now)
+        return {'primary': name, 'files': {name: sanitized}, 'srcset': {}, 'favicon': {}}
+
+    if not PILLOW_AVAILABLE:
+        name = hashed_filename(filename, data, now)
+        return {'primary': name, 'files': {name: data}, 'srcset': {}, 'favicon': {}}
+
+    image = _open_image(data)
+    if getattr(image, 'is_animated', False):
+        # تصاویر متحرک بدون تغییر ذخیره می‌شوند
+        name = hashed_filename(filename, data, now)
+        return {'primary': name, 'files': {name: data}, 'srcset': {}, 'favicon': {}}
+
+    from PIL import ImageOps
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P', 'PA') else 'RGB')
+    longest = max(image.size)
+    display = DISPLAY_SIZES.get(kind, DISPLAY_SIZES['logo'])
+
+    files: Dict[str, bytes] = {}
+    srcset: Dict[str, List[Tuple[str, str]]] = {}
+    favicon: Dict[int, str] = {}
+    resized_cache: Dict[int, "Image.Image"] = {}
+
+    def variant(size: int, fmt: Tuple[str, str, str, Dict], max_bytes: Optional[int] = None) -> Optional[str]:
+        pil_format, _, extension, options = fmt
+        if size not in resized_cache:
+            resized_cache[size] = _resize(image, size)
+        content = _encode(resized_cache[size], pil_format, options)
+        if max_bytes is not None and len(content) >= max_bytes:
+            return None
+        name = hashed_filename(f"{stem}-{size}.{extension}", content, now)
+        files[name] = content
+        return name
+
+    formats = output_formats()
+    # فرمت پایه (آخرین فرمت لیست، با پشتیبانی گسترده‌تر) برای src استفاده می‌شود
+    base = formats[-1]
+    # (اندازه، نام فایل، توصیف‌گر)
+    base_variants = []
+    for scale in SCALES:
+        size = display * scale
+        # بزرگ‌نمایی کیفیت را بهتر نمی‌کند؛ فقط 1x همیشه ساخته می‌شود
+        if scale > 1 and size > longest:
+            break
+        base_variants.append((size, variant(size, base), f'{scale}x'))
+    srcset[base[1]] = [(name, descriptor) for _, name, descriptor in base_variants]
+    primary = base_variants[0][1]
+
+    for fmt in formats[:-1]:
+        # در اندازه‌های خیلی کوچک سربار فایل AVIF از صرفه‌جویی آن بیشتر است؛ فقط نسخه‌های کوچک‌تر نگه داشته می‌شوند
+        entries = []
+        for size, name, descriptor in base_variants:
+            smaller = variant(size, fmt, max_bytes=len(files[name]))
+            if smaller is None:
+                break
+            entries.append((smaller, descriptor))
+        if entries:
+            srcset[fmt[1]] = entries
+
+    for size in FAVICON_SIZES.get(kind, ()):
+        if size > longest and favicon:
+            continue
+        favicon[size] = variant(size, PNG_FORMAT)
+
+    return {'primary': primary, 'files': files, 'srcset': srcset, 'favicon': favicon}
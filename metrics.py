@@ -0,0 +1,402 @@
+"""
+متریک‌ها با فرمت Prometheus و زمان‌سنجی مراحل (span)
+
+- شمارنده (counter)، هیستوگرام (histogram) و gauge در حافظه هر پردازه با هزینه چند میکروثانیه
+- span(name): زمان‌سنجی یک مرحله (مثلاً فراخوانی OpenAI یا ذخیره در دفتر ثبت) در هیستوگرام
+  span_duration_seconds
+- چند پردازه (workerهای gunicorn): هر پردازه هر METRICS_FLUSH_INTERVAL ثانیه یک snapshot از
+  متریک‌های خود را در SQLite می‌نویسد و /metrics همه snapshotها را جمع می‌کند. شمارنده‌ها و
+  هیستوگرام‌های workerهای متوقف شده حفظ می‌شوند و gauge آنها حذف می‌شود.
+
+تنظیمات (متغیرهای محیطی):
+- METRICS_ENABLED: فعال بودن متریک‌ها (پیش‌فرض: 1)
+- METRICS_DB: مسیر فایل SQLite snapshotها (پیش‌فرض: metrics.db)
+- METRICS_FLUSH_INTERVAL: فاصله نوشتن snapshot هر پردازه (ثانیه، پیش‌فرض: 5)
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from db import connect
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# snapshot پردازه‌هایی که این مدت به‌روز نشده‌اند در یک ردیف بایگانی ادغام می‌شوند (ثانیه)
+ARCHIVE_AFTER = 3600
+ARCHIVE_ROW = 'archive'
+
+# (نام متریک، برچسب‌ها به صورت tuple مرتب)
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict) -> MetricKey:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class MetricsRegistry:
+    """متریک‌های یک پردازه"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # نام -> (نوع، توضیح، bucketها)
+        self.meta: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+        self._values: Dict[MetricKey, object] = {}
+        # نام -> تابعی که هنگام snapshot مقدار متریک‌های پردازه را برمی‌گرداند: [(نام، برچسب‌ها، مقدار)]
+        self._collectors: Dict[str, Callable[[], Iterable[Tuple[str, Dict, float]]]] = {}
+        self._pid = os.getpid()
+
+    def _define(self, kind: str, name: str, help_text: str, buckets: Tuple[float, ...] = ()):
+        self.meta[name] = (kind, help_text, tuple(buckets))
+
+    def counter(self, name: str, help_text: str):
+        self._define('counter', name, help_text)
+
+    def gauge(self, name: str, help_text: str):
+        self._define('gauge', name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._define('histogram', name, help_text, buckets)
+
+    def _check_fork(self):
+        # پردازه فرزند (worker) نباید مقادیر پردازه والد را دوباره گزارش کند
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._values = {}
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        """افزایش شمارنده"""
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        """تنظیم مقدار gauge"""
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            self._values[key] = float(value)
+
+    def observe(self, name: str, value: float, **labels):
+        """ثبت یک مقدار در هیستوگرام"""
+        buckets = self.meta[name][2]
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            # [شمار هر bucket (غیر تجمعی)، شمار بیش از آخرین bucket، مجموع]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(buckets) + 1) + [0.0]
+            index = 0
+            while index < len(buckets) and value > buckets[index]:
+                index += 1
+            state[index] += 1
+            state[-1] += value
+
+    def register_collector(self, name: str, collector: Callable[[], Iterable[Tuple[str, Dict, float]]]):
+        """
+        ثبت تابعی که مقدار متریک‌های شمارشی موجود در پردازه (مثلاً hit کش) را برمی‌گرداند
+
+        مقادیر برگردانده شده جایگزین مقدار فعلی متریک می‌شوند (نه افزوده). ثبت دوباره با همان
+        نام، تابع قبلی را جایگزین می‌کند.
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[MetricKey, object]:
+        """کپی مقادیر فعلی پردازه"""
+        with self._lock:
+            collectors = list(self._collectors.values())
+        for collector in collectors:
+            try:
+                for name, labels, value in collector():
+                    self.set(name, value, **labels)
+            except Exception as e:
+                log.warning('metrics.collector_failed', error=str(e))
+        with self._lock:
+            self._check_fork()
+            return {key: list(value) if isinstance(value, list) else value for key, value in self._values.items()}
+
+
+def merge(target: Dict[MetricKey, object], source: Dict[MetricKey, object], meta: Dict, include_gauges: bool = True):
+    """جمع متریک‌های دو snapshot (در target)"""
+    for key, value in source.items():
+        kind = meta.get(key[0], ('counter',))[0]
+        if kind == 'gauge' and not include_gauges:
+            continue
+        current = target.get(key)
+        if current is None:
+            target[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            if len(current) == len(value):
+                target[key] = [a + b for a, b in zip(current, value)]
+        else:
+            target[key] = current + value
+
+
+def _encode(values: Dict[MetricKey, object]) -> str:
+    return json.dumps([[name, list(map(list, labels)), value] for (name, labels), value in values.items()])
+
+
+def _decode(data: str) -> Dict[MetricKey, object]:
+    return {(name, tuple(map(tuple, labels))): value for name, labels, value in json.loads(data)}
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(values: Dict[MetricKey, object], meta: Dict) -> str:
+    """تبدیل متریک‌ها به فرمت متنی Prometheus"""
+    by_name: Dict[str, List] = {}
+    for (name, labels), value in values.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text, buckets = meta.get(name, ('untyped', '', ()))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind == 'histogram' and isinstance(value, list):
+                cumulative = 0
+                for bound, count in zip(list(buckets) + [float('inf')], value[:-1]):
+                    cumulative += count
+                    le = (('le', _format_value(bound) if bound != float('inf') else '+Inf'),)
+                    lines.append(f'{name}_bucket{_format_labels(labels, le)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value[-1])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MultiProcessCollector:
+    """جمع متریک‌های همه پردازه‌ها از طریق snapshotهای SQLite"""
+
+    def __init__(self, registry: MetricsRegistry, db_file: str = 'metrics.db', flush_interval: float = 5.0):
+        self.registry = registry
+        # مسیر مطلق: نوشتن snapshot هنگام خروج پردازه به پوشه جاری آن لحظه وابسته نیست
+        self.db_file = os.path.abspath(db_file)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._process_id: Optional[str] = None
+        self.ensure_table()
+
+    def ensure_table(self):
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metrics_snapshots (
+                    process TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def start(self):
+        """شروع thread نوشتن دوره‌ای snapshot در پردازه فعلی (پس از fork دوباره ساخته می‌شود)"""
+        pid = os.getpid()
+        if self._thread_pid == pid:
+            return
+        with self._lock:
+            if self._thread_pid == pid:
+                return
+            # شناسه پردازه شامل زمان شروع است تا pid تکراری snapshot پردازه قبلی را بازنویسی نکند
+            self._process_id = f'{pid}-{time.time():.6f}'
+            self._thread_pid = pid
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log.warning('metrics.flush_failed', error=str(e))
+
+    def flush(self):
+        """نوشتن snapshot پردازه فعلی"""
+        if self._thread_pid != os.getpid():
+            return
+        values = self.registry.snapshot()
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute(
+                "INSERT INTO metrics_snapshots (process, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(process) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (self._process_id, _encode(values), time.time())
+            )
+
+    def archive(self):
+        """ادغام snapshot پردازه‌های قدیمی در ردیف بایگانی (gaugeها حذف می‌شوند)"""
+        cutoff = time.time() - ARCHIVE_AFTER
+        conn = connect(self.db_file)
+        with conn:
+            rows = conn.execute(
+                "SELECT process, data FROM metrics_snapshots WHERE updated_at < ? AND process != ?",
+                (cutoff, ARCHIVE_ROW)
+            ).fetchall()
+            if not rows:
+                return
+            archived = conn.execute(
+                "SELECT data FROM metrics_snapshots WHERE process = ?", (ARCHIVE_ROW,)
+            ).fetchone()
+            values = _decode(archived[0]) if archived else {}
+            for row in rows:
+                merge(values, _decode(row['data']), self.registry.meta, include_gauges=False)
+            conn.executemany("DELETE FROM metrics_snapshots WHERE process = ?", [(row['process'],) for row in rows])
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics_snapshots (process, data, updated_at) VALUES (?, ?, ?)",
+                (ARCHIVE_ROW, _encode(values), time.time())
+            )
+
+    def collect(self) -> Dict[MetricKey, object]:
+        """متریک‌های جمع شده همه پردازه‌ها"""
+        self.start()
+        self.flush()
+        self.archive()
+        # gauge پردازه‌هایی که snapshot تازه ندارند (متوقف شده‌اند) حذف می‌شود
+        live_after = time.time() - 3 * self.flush_interval
+        values: Dict[MetricKey, object] = {}
+        for row in connect(self.db_file).execute("SELECT data, updated_at FROM metrics_snapshots"):
+            merge(values, _decode(row['data']), self.registry.meta, include_gauges=row['updated_at'] >= live_after)
+        return values
+
+
+registry = MetricsRegistry()
+_enabled = os.getenv('METRICS_ENABLED', '1') == '1'
+_collector: Optional[MultiProcessCollector] = None
+_collector_pid: Optional[int] = None
+_collector_lock = threading.Lock()
+# پردازه‌ای که thread نوشتن snapshot در آن شروع نمی‌شود (پردازه اصلی gunicorn پیش از fork)
+_deferred_pid: Optional[int] = None
+
+registry.counter('http_requests_total', 'Total HTTP requests by route, method and status')
+registry.histogram('http_request_duration_seconds', 'HTTP request latency by route and method')
+registry.histogram('openai_request_duration_seconds', 'OpenAI HTTP call latency (until response headers) by endpoint and status')
+registry.counter('openai_tokens_total', 'OpenAI tokens by type (prompt, cached, completion)')
+registry.histogram('span_duration_seconds', 'Duration of instrumented stages by span and outcome')
+registry.counter('cache_requests_total', 'Cache lookups by cache and result')
+registry.gauge('conversation_store_sessions', 'Sessions held in the conversation store')
+registry.gauge('llm_slots_in_flight', 'OpenAI calls in flight across all workers')
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def defer_background():
+    """
+    عدم شروع thread نوشتن snapshot (و باز کردن پایگاه داده متریک‌ها) در پردازه فعلی
+
+    مقادیر همچنان در حافظه ثبت می‌شوند. فقط همین پردازه را شامل می‌شود؛ workerهای fork شده
+    در اولین ثبت متریک thread خود را شروع می‌کنند.
+    """
+    global _deferred_pid
+    _deferred_pid = os.getpid()
+
+
+def _ensure_started():
+    # هر پردازه (از جمله workerهای fork شده) در اولین ثبت متریک، نوشتن snapshot را شروع می‌کند
+    pid = os.getpid()
+    if _collector_pid != pid and _deferred_pid != pid:
+        get_collector()
+
+
+def inc(name: str, amount: float = 1.0, **labels):
+    if _enabled:
+        _ensure_started()
+        registry.inc(name, amount, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    if _enabled:
+        _ensure_started()
+        registry.observe(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels):
+    if _enabled:
+        _ensure_started()
+        registry.set(name, value, **labels)
+
+
+@contextmanager
+def span(name: str):
+    """
+    زمان‌سنجی یک مرحله
+
+    Example:
+        with span('storage.save_customer'):
+            ...
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        observe('span_duration_seconds', time.perf_counter() - start, span=name, outcome=outcome)
+
+
+def get_collector() -> MultiProcessCollector:
+    """collector چند پردازه‌ای (ساخت در اولین استفاده و شروع نوشتن دوره‌ای snapshot)"""
+    global _collector, _collector_pid
+    with _collector_lock:
+        if _collector is None:
+            _collector = MultiProcessCollector(
+                registry,
+                db_file=os.getenv('METRICS_DB', 'metrics.db'),
+                flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '5')),
+            )
+            # آخرین مقادیر هنگام خروج worker نوشته می‌شوند
+            atexit.register(lambda: _collector.flush())
+        _collector.start()
+        _collector_pid = os.getpid()
+    return _collector
+
+
+def generate_latest(scrape_collectors: Iterable[Callable[[], Iterable[Tuple[str, Dict, float]]]] = ()) -> str:
+    """
+    متن /metrics: متریک‌های همه پردازه‌ها به همراه gaugeهای سراسری
+
+    Args:
+        scrape_collectors: توابعی که مقدار gaugeهای سراسری (مثلاً تعداد جلسه‌ها در SQLite
+            مشترک) را هنگام درخواست برمی‌گردانند
+    """
+    values = get_collector().collect()
+    for collector in scrape_collectors:
+        try:
+            for name, labels, value in collector():
+                values[_key(name, labels)] = float(value)
+        except Exception as e:
+            log.warning('metrics.collector_failed', error=str(e))
+    return render(values, registry.meta)
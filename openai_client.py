@@ -0,0 +1,322 @@
+"""
+کلاینت مشترک OpenAI برای کل پردازه
+
+- یک pool اتصال httpx با keep-alive و سقف تعداد اتصال (HTTP/2 در صورت نصب بودن h2)
+- مهلت جداگانه اتصال و خواندن برای هر فراخوانی
+- تلاش مجدد SDK با backoff تصادفی و رعایت هدر Retry-After
+- circuit breaker: وقتی OpenAI پشت سر هم خطا می‌دهد، درخواست‌ها بدون انتظار رد می‌شوند
+  تا workerها پشت یک سرویس کند مسدود نشوند
+
+تنظیمات (متغیرهای محیطی):
+- OPENAI_MAX_CONNECTIONS / OPENAI_MAX_KEEPALIVE: سقف اتصال‌های pool
+- OPENAI_CONNECT_TIMEOUT / OPENAI_READ_TIMEOUT: مهلت اتصال و خواندن (ثانیه)
+- OPENAI_MAX_RETRIES: تعداد تلاش مجدد SDK
+- OPENAI_HTTP2: استفاده از HTTP/2 در صورت نصب بودن h2 (پیش‌فرض: 1)
+- OPENAI_BREAKER_THRESHOLD: تعداد خطاهای پیاپی برای باز شدن circuit breaker
+- OPENAI_BREAKER_RESET: مدت باز ماندن circuit breaker پیش از درخواست آزمایشی (ثانیه)
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+
+from openai import APIError, APIStatusError, AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+import metrics
+
+# نسخه‌های جدید SDK به جای httpx روی httpx2 ساخته شده‌اند؛ transport و تنظیمات pool باید
+# از همان کتابخانه‌ای باشند که کلاینت پیش‌فرض SDK از آن ارث می‌برد
+httpx = sys.modules[DefaultHttpxClient.__bases__[0].__module__.partition('.')[0]]
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# کدهای وضعیتی که نشانه مشکل سمت OpenAI هستند
+DEGRADED_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """circuit breaker سه حالته (closed / open / half_open) برای فراخوانی‌های OpenAI"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: تعداد خطاهای پیاپی برای باز شدن
+            reset_timeout: مدت باز ماندن پیش از اجازه یک درخواست آزمایشی (ثانیه)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def retry_after(self) -> float:
+        """زمان باقی‌مانده تا درخواست آزمایشی بعدی (ثانیه)"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        """آیا درخواست می‌تواند ارسال شود؟ (در حالت half_open فقط یک درخواست آزمایشی)"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool):
+        """ثبت نتیجه یک درخواست"""
+        with self._lock:
+            self._trial_in_flight = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                # خطای درخواست آزمایشی، circuit را دوباره باز می‌کند
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        """وضعیت circuit breaker"""
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'rejected': self.rejected,
+            'retry_after': round(self.retry_after(), 1),
+        }
+
+
+def _circuit_open_response(request: httpx.Request, breaker: CircuitBreaker) -> httpx.Response:
+    """
+    پاسخ 503 محلی وقتی circuit باز است
+
+    هدر x-should-retry: false باعث می‌شود SDK بدون تلاش مجدد خطا برگرداند.
+    """
+    return httpx.Response(
+        503,
+        headers={'x-should-retry': 'false', 'retry-after': str(int(breaker.retry_after()) + 1)},
+        json={'error': {
+            'message': 'سرویس OpenAI موقتاً در دسترس نیست (circuit breaker باز است)',
+            'type': 'circuit_open',
+        }},
+        request=request,
+    )
+
+
+def _observe(request: httpx.Request, status, started: float):
+    """ثبت مدت هر تلاش (برای پاسخ stream تا رسیدن هدرها) به تفکیک endpoint و وضعیت"""
+    path = request.url.path
+    endpoint = path[3:] if path.startswith('/v1/') else path
+    metrics.observe('openai_request_duration_seconds', time.perf_counter() - started,
+                    endpoint=endpoint, status=str(status))
+
+
+class CircuitBreakerTransport(httpx.HTTPTransport):
+    """transport همگام httpx که هر تلاش را در circuit breaker ثبت می‌کند"""
+
+    def __init__(self, breaker: CircuitBreaker, **kwargs):
+        super().__init__(**kwargs)
+        self.breaker = breaker
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            _observe(request, 'circuit_open', time.perf_counter())
+            return _circuit_open_response(request, self.breaker)
+        success = False
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+            status = response.status_code
+            success = status not in DEGRADED_STATUS_CODES
+            return response
+        finally:
+            self.breaker.record(success)
+            _observe(request, status, started)
+
+
+class AsyncCircuitBreakerTransport(httpx.AsyncHTTPTransport):
+    """transport async httpx که هر تلاش را در circuit breaker ثبت می‌کند"""
+
+    def __init__(self, breaker: CircuitBreaker, **kwargs):
+        super().__init__(**kwargs)
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            _observe(request, 'circuit_open', time.perf_counter())
+            return _circuit_open_response(request, self.breaker)
+        success = False
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+            status = response.status_code
+            success = status not in DEGRADED_STATUS_CODES
+            return response
+        finally:
+            self.breaker.record(success)
+            _observe(request, status, started)
+
+
+def _settings() -> Dict:
+    """تنظیمات pool، مهلت‌ها و تلاش مجدد از متغیرهای محیطی"""
+    connect_timeout = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))
+    read_timeout = float(os.getenv('OPENAI_READ_TIMEOUT', '30'))
+    return {
+        'limits': httpx.Limits(
+            max_connections=int(os.getenv('OPENAI_MAX_CONNECTIONS', '100')),
+            max_keepalive_connections=int(os.getenv('OPENAI_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=30.0,
+        ),
+        'timeout': httpx.Timeout(read_timeout, connect=connect_timeout),
+        'http2': HTTP2_AVAILABLE and os.getenv('OPENAI_HTTP2', '1') == '1',
+        'max_retries': int(os.getenv('OPENAI_MAX_RETRIES', '2')),
+    }
+
+
+_lock = threading.Lock()
+_pid: Optional[int] = None
+_breaker: Optional[CircuitBreaker] = None
+_clients: Dict[str, OpenAI] = {}
+# api_key -> (event loop، کلاینت async)؛ اتصال‌های کلاینت async به event loop وابسته‌اند
+_async_clients: Dict[str, tuple] = {}
+
+
+def _reset_after_fork():
+    """pool اتصال بین پردازه‌ها مشترک نمی‌شود؛ پس از fork همه چیز از نو ساخته می‌شود"""
+    global _pid, _breaker
+    pid = os.getpid()
+    if _pid != pid:
+        _pid = pid
+        _breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('OPENAI_BREAKER_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('OPENAI_BREAKER_RESET', '30')),
+        )
+        _clients.clear()
+        _async_clients.clear()
+
+
+def get_breaker() -> CircuitBreaker:
+    """circuit breaker مشترک پردازه"""
+    with _lock:
+        _reset_after_fork()
+        return _breaker
+
+
+def get_openai_client(api_key: str) -> OpenAI:
+    """
+    دریافت کلاینت همگام مشترک OpenAI (یک pool اتصال برای هر پردازه)
+
+    Args:
+        api_key: کلید API
+
+    Returns:
+        کلاینت OpenAI
+    """
+    with _lock:
+        _reset_after_fork()
+        client = _clients.get(api_key)
+        if client is None:
+            settings = _settings()
+            http_client = DefaultHttpxClient(
+                transport=CircuitBreakerTransport(_breaker, limits=settings['limits'], http2=settings['http2']),
+                timeout=settings['timeout'],
+            )
+            client = OpenAI(
+                api_key=api_key,
+                http_client=http_client,
+                timeout=settings['timeout'],
+                max_retries=settings['max_retries'],
+            )
+            _clients[api_key] = client
+        return client
+
+
+def get_async_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    دریافت کلاینت AsyncOpenAI مشترک برای event loop جاری
+
+    Args:
+        api_key: کلید API
+
+    Returns:
+        کلاینت AsyncOpenAI
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _reset_after_fork()
+        entry = _async_clients.get(api_key)
+        if entry is None or entry[0] is not loop:
+            settings = _settings()
+            http_client = DefaultAsyncHttpxClient(
+                transport=AsyncCircuitBreakerTransport(_breaker, limits=settings['limits'], http2=settings['http2']),
+                timeout=settings['timeout'],
+            )
+            entry = (loop, AsyncOpenAI(
+                api_key=api_key,
+                http_client=http_client,
+                timeout=settings['timeout'],
+                max_retries=settings['max_retries'],
+            ))
+            _async_clients[api_key] = entry
+        return entry[1]
+
+
+def probe_upstream(api_key: str, timeout: float = 3.0) -> Tuple[bool, str]:
+    """
+    بررسی دسترسی به OpenAI با یک درخواست سبک (لیست مدل‌ها، بدون تلاش مجدد)
+
+    هر پاسخ HTTP به جز کدهای نشانه مشکل سمت OpenAI (مثلاً 401) یعنی سرویس در دسترس است.
+
+    Returns:
+        (در دسترس بودن، توضیح)
+    """
+    breaker = get_breaker()
+    if breaker.state == 'open':
+        return False, 'circuit breaker باز است'
+    client = get_openai_client(api_key).with_options(max_retries=0, timeout=timeout)
+    try:
+        client.models.list()
+    except APIStatusError as e:
+        if e.status_code in DEGRADED_STATUS_CODES:
+            return False, f'HTTP {e.status_code}'
+        return True, f'HTTP {e.status_code}'
+    except APIError as e:
+        return False, type(e).__name__
+    return True, 'HTTP 200'
+
+
+def client_stats() -> Dict:
+    """وضعیت کلاینت مشترک (برای /debug)"""
+    settings = _settings()
+    return {
+        'http2': settings['http2'],
+        'max_connections': settings['limits'].max_connections,
+        'max_keepalive_connections': settings['limits'].max_keepalive_connections,
+        'connect_timeout': settings['timeout'].connect,
+        'read_timeout': settings['timeout'].read,
+        'max_retries': settings['max_retries'],
+        'circuit_breaker': get_breaker().stats(),
+    }
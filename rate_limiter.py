@@ -0,0 +1,319 @@
+"""
+محدودیت نرخ درخواست و کنترل پذیرش (admission control)
+
+- token bucket جداگانه برای هر session_id و هر IP
+- سقف سراسری فراخوانی‌های هم‌زمان OpenAI با یک صف انتظار کوتاه برای جذب جهش‌ها
+- وضعیت در یک فایل SQLite محلی نگه داشته می‌شود تا بین workerهای gunicorn مشترک باشد
+
+درخواست‌های اضافه با RateLimitExceeded رد می‌شوند که در لایه وب به پاسخ 429
+همراه با هدر Retry-After تبدیل می‌شود.
+"""
+
+import os
+import time
+import uuid
+import random
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from db import connect
+
+
+class RateLimitExceeded(Exception):
+    """درخواست به دلیل محدودیت نرخ یا ظرفیت رد شد"""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """token bucket مشترک بین پردازه‌ها (هر کلید یک ردیف در جدول rate_buckets)"""
+
+    def __init__(self, db_file: str, prefix: str, rate: float, burst: float,
+                 purge_interval: float = 300):
+        """
+        Args:
+            db_file: مسیر فایل SQLite
+            prefix: پیشوند کلیدها (مثلاً session یا ip)
+            rate: تعداد توکن‌های اضافه شده در هر ثانیه
+            burst: ظرفیت bucket (حداکثر درخواست پشت سر هم)
+            purge_interval: فاصله زمانی حذف bucketهای پر شده (ثانیه)
+        """
+        self.db_file = db_file
+        self.prefix = prefix
+        self.rate = rate
+        self.burst = burst
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def consume(self, key: str, cost: float = 1.0) -> float:
+        """
+        برداشتن توکن از bucket
+
+        Returns:
+            0 اگر درخواست مجاز باشد، وگرنه زمان انتظار تا توکن بعدی (ثانیه)
+        """
+        now = time.time()
+        bucket_key = f"{self.prefix}:{key}"
+        conn = connect(self.db_file)
+        with conn:
+            # پر شدن تدریجی و برداشت در یک دستور اتمیک انجام می‌شود
+            allowed = conn.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "tokens = MIN(?, tokens + (excluded.updated - updated) * ?) - ?, updated = excluded.updated "
+                "WHERE MIN(?, tokens + (excluded.updated - updated) * ?) >= ? "
+                "RETURNING tokens",
+                (bucket_key, self.burst - cost, now,
+                 self.burst, self.rate, cost,
+                 self.burst, self.rate, cost)
+            ).fetchone()
+            if allowed is None:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM rate_buckets WHERE key = ?", (bucket_key,)
+                ).fetchone()
+
+        if now - self._last_purge > self.purge_interval:
+            self._last_purge = now
+            self.purge(now)
+
+        if allowed is not None:
+            return 0.0
+        available = min(self.burst, row[0] + (now - row[1]) * self.rate)
+        return max(0.0, (cost - available) / self.rate)
+
+    def purge(self, now: Optional[float] = None):
+        """حذف bucketهایی که دوباره پر شده‌اند (نبود ردیف معادل bucket پر است)"""
+        now = now or time.time()
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute(
+                "DELETE FROM rate_buckets WHERE key LIKE ? AND updated < ?",
+                (f"{self.prefix}:%", now - self.burst / self.rate)
+            )
+
+
+class ConcurrencyLimiter:
+    """سقف فراخوانی‌های هم‌زمان OpenAI بین همه workerها (جایگاه‌های اجاره‌ای در SQLite)"""
+
+    def __init__(self, db_file: str, max_in_flight: int, queue_timeout: float = 2.0,
+                 max_queue: int = 16, lease_seconds: float = 300.0):
+        """
+        Args:
+            db_file: مسیر فایل SQLite
+            max_in_flight: حداکثر فراخوانی هم‌زمان
+            queue_timeout: حداکثر انتظار در صف برای جایگاه خالی (ثانیه، 0 = بدون صف)
+            max_queue: حداکثر درخواست‌های منتظر در هر پردازه
+            lease_seconds: مدت اجاره هر جایگاه (جایگاه worker از کار افتاده پس از آن آزاد می‌شود)
+        """
+        self.db_file = db_file
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.lease_seconds = lease_seconds
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+        conn = connect(self.db_file)
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO llm_slots (slot, owner, lease_until) VALUES (?, '', 0)",
+                [(slot,) for slot in range(1, max_in_flight + 1)]
+            )
+
+    def _try_acquire(self, owner: str) -> Optional[int]:
+        now = time.time()
+        conn = connect(self.db_file)
+        with conn:
+            row = conn.execute(
+                "UPDATE llm_slots SET owner = ?, lease_until = ? WHERE slot = ("
+                "SELECT slot FROM llm_slots WHERE slot <= ? AND lease_until < ? LIMIT 1) "
+                "RETURNING slot",
+                (owner, now + self.lease_seconds, self.max_in_flight, now)
+            ).fetchone()
+        return row[0] if row else None
+
+    def acquire(self) -> Optional[str]:
+        """
+        گرفتن یک جایگاه (در صورت پر بودن، حداکثر queue_timeout ثانیه انتظار)
+
+        Returns:
+            شناسه جایگاه برای release، یا None اگر جایگاهی خالی نشد
+        """
+        owner = uuid.uuid4().hex
+        slot = self._try_acquire(owner)
+        if slot is not None:
+            return f"{slot}:{owner}"
+
+        with self._lock:
+            if self.queue_timeout <= 0 or self._waiting >= self.max_queue:
+                return None
+            self._waiting += 1
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while time.monotonic() < deadline:
+                time.sleep(random.uniform(0.02, 0.08))
+                slot = self._try_acquire(owner)
+                if slot is not None:
+                    return f"{slot}:{owner}"
+            return None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self, token: str):
+        """آزاد کردن جایگاه"""
+        slot, owner = token.split(':', 1)
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute(
+                "UPDATE llm_slots SET owner = '', lease_until = 0 WHERE slot = ? AND owner = ?",
+                (int(slot), owner)
+            )
+
+    def in_flight(self) -> int:
+        """تعداد جایگاه‌های در حال استفاده"""
+        return connect(self.db_file).execute(
+            "SELECT COUNT(*) FROM llm_slots WHERE slot <= ? AND lease_until >= ?",
+            (self.max_in_flight, time.time())
+        ).fetchone()[0]
+
+    @property
+    def waiting(self) -> int:
+        """تعداد درخواست‌های منتظر در این پردازه"""
+        return self._waiting
+
+
+class AdmissionController:
+    """ترکیب محدودیت نرخ session/IP و سقف فراخوانی‌های هم‌زمان"""
+
+    def __init__(self, db_file: str = 'rate_limits.db',
+                 session_rate: float = 0.5, session_burst: float = 20,
+                 ip_rate: float = 2.0, ip_burst: float = 60,
+                 max_in_flight: int = 32, queue_timeout: float = 2.0, max_queue: int = 16,
+                 trust_proxy: bool = False):
+        """
+        Args:
+            db_file: مسیر فایل SQLite وضعیت محدودیت‌ها
+            session_rate / session_burst: نرخ (درخواست در ثانیه) و ظرفیت هر session
+            ip_rate / ip_burst: نرخ و ظرفیت هر IP
+            max_in_flight: سقف فراخوانی‌های هم‌زمان OpenAI بین همه workerها
+            queue_timeout: حداکثر انتظار برای جایگاه خالی (ثانیه)
+            max_queue: حداکثر درخواست‌های منتظر در هر پردازه
+            trust_proxy: استفاده از X-Forwarded-For برای تشخیص IP (پشت reverse proxy)
+        """
+        self.db_file = db_file
+        self.trust_proxy = trust_proxy
+        self.ensure_tables()
+
+        self.sessions = TokenBucket(db_file, 'session', session_rate, session_burst)
+        self.ips = TokenBucket(db_file, 'ip', ip_rate, ip_burst)
+        self.concurrency = ConcurrencyLimiter(db_file, max_in_flight, queue_timeout, max_queue)
+
+        self.rejected_rate = 0
+        self.rejected_concurrency = 0
+
+    def ensure_tables(self):
+        """ایجاد جدول‌های محدودیت نرخ در صورت عدم وجود"""
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_slots (
+                    slot INTEGER PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    lease_until REAL NOT NULL
+                )
+            """)
+
+    def client_ip(self, remote_addr: Optional[str], forwarded_for: Optional[str] = None) -> str:
+        """IP کاربر (اولین آدرس X-Forwarded-For اگر پشت proxy مورد اعتماد باشیم)"""
+        if self.trust_proxy and forwarded_for:
+            return forwarded_for.split(',')[0].strip()
+        return remote_addr or 'unknown'
+
+    def check(self, session_id: Optional[str], ip: str, cost: float = 1.0):
+        """
+        بررسی محدودیت نرخ IP و session
+
+        Raises:
+            RateLimitExceeded: اگر یکی از bucketها خالی باشد
+        """
+        retry_after = self.ips.consume(ip, cost)
+        if not retry_after and session_id:
+            retry_after = self.sessions.consume(session_id, cost)
+        if retry_after:
+            self.rejected_rate += 1
+            raise RateLimitExceeded(retry_after, 'rate')
+
+    def acquire_slot(self) -> str:
+        """
+        گرفتن جایگاه فراخوانی OpenAI
+
+        Raises:
+            RateLimitExceeded: اگر ظرفیت پر باشد و در مهلت صف آزاد نشود
+        """
+        token = self.concurrency.acquire()
+        if token is None:
+            self.rejected_concurrency += 1
+            raise RateLimitExceeded(1.0, 'capacity')
+        return token
+
+    def release_slot(self, token: str):
+        """آزاد کردن جایگاه فراخوانی OpenAI"""
+        self.concurrency.release(token)
+
+    @contextmanager
+    def llm_slot(self) -> Iterator[str]:
+        """نگه داشتن یک جایگاه فراخوانی OpenAI در طول بلوک with"""
+        token = self.acquire_slot()
+        try:
+            yield token
+        finally:
+            self.release_slot(token)
+
+    def stats(self) -> Dict:
+        """آمار محدودیت‌ها (شمارنده‌های رد مربوط به پردازه فعلی هستند)"""
+        return {
+            'in_flight': self.concurrency.in_flight(),
+            'max_in_flight': self.concurrency.max_in_flight,
+            'waiting': self.concurrency.waiting,
+            'rejected_rate': self.rejected_rate,
+            'rejected_capacity': self.rejected_concurrency,
+        }
+
+
+def create_admission_controller() -> Optional[AdmissionController]:
+    """
+    ساخت کنترل پذیرش بر اساس متغیرهای محیطی
+
+    - RATE_LIMIT_ENABLED: فعال بودن محدودیت‌ها (پیش‌فرض: 1)
+    - RATE_LIMIT_DB: مسیر فایل SQLite وضعیت محدودیت‌ها
+    - RATE_LIMIT_SESSION_PER_MINUTE / RATE_LIMIT_SESSION_BURST: نرخ و ظرفیت هر session
+    - RATE_LIMIT_IP_PER_MINUTE / RATE_LIMIT_IP_BURST: نرخ و ظرفیت هر IP
+    - RATE_LIMIT_MAX_IN_FLIGHT: سقف فراخوانی‌های هم‌زمان OpenAI
+    - RATE_LIMIT_QUEUE_TIMEOUT / RATE_LIMIT_MAX_QUEUE: مهلت و اندازه صف انتظار
+    - RATE_LIMIT_TRUST_PROXY: استفاده از X-Forwarded-For (پیش‌فرض: 1 در Render)
+    """
+    if os.getenv('RATE_LIMIT_ENABLED', '1') != '1':
+        return None
+    return AdmissionController(
+        db_file=os.getenv('RATE_LIMIT_DB', 'rate_limits.db'),
+        session_rate=float(os.getenv('RATE_LIMIT_SESSION_PER_MINUTE', '30')) / 60,
+        session_burst=float(os.getenv('RATE_LIMIT_SESSION_BURST', '20')),
+        ip_rate=float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '120')) / 60,
+        ip_burst=float(os.getenv('RATE_LIMIT_IP_BURST', '60')),
+        max_in_flight=int(os.getenv('RATE_LIMIT_MAX_IN_FLIGHT', '32')),
+        queue_timeout=float(os.getenv('RATE_LIMIT_QUEUE_TIMEOUT', '2')),
+        max_queue=int(os.getenv('RATE_LIMIT_MAX_QUEUE', '16')),
+        trust_proxy=os.getenv('RATE_LIMIT_TRUST_PROXY', '1' if os.getenv('RENDER') else '0') == '1',
+    )
@@ -0,0 +1,111 @@
+"""
+بررسی آمادگی سرویس در پس‌زمینه (برای /readyz)
+
+بررسی‌ها (راه‌اندازی چت بات، قابل نوشتن بودن ذخیره‌ساز و دسترسی به OpenAI) در یک thread
+پس‌زمینه هر READINESS_INTERVAL ثانیه اجرا می‌شوند و نتیجه به صورت بدنه JSON آماده در حافظه
+نگه داشته می‌شود. پاسخ /readyz فقط همین مقدار را برمی‌گرداند و هیچ دسترسی شبکه یا فایلی ندارد.
+
+اگر thread بررسی متوقف شود (نتیجه قدیمی‌تر از سه برابر فاصله بررسی)، سرویس آماده حساب نمی‌شود.
+
+تنظیمات (متغیرهای محیطی):
+- READINESS_INTERVAL: فاصله بررسی‌ها (ثانیه، پیش‌فرض: 15)
+- READINESS_TIMEOUT: مهلت بررسی دسترسی به OpenAI (ثانیه، پیش‌فرض: 3)
+- READINESS_CHECK_UPSTREAM: بررسی دسترسی به OpenAI (پیش‌فرض: 1)
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# هر بررسی (سالم بودن، توضیح) برمی‌گرداند
+Check = Callable[[], Tuple[bool, str]]
+
+STARTING_BODY = json.dumps({'ready': False, 'status': 'starting', 'checks': {}}).encode()
+
+
+class ReadinessChecker:
+    """اجرای دوره‌ای بررسی‌های آمادگی و نگهداری آخرین نتیجه"""
+
+    def __init__(self, checks: Dict[str, Check], interval: float = 15.0):
+        """
+        Args:
+            checks: {نام بررسی: تابع بررسی}
+            interval: فاصله اجرای بررسی‌ها (ثانیه)
+        """
+        self.checks = dict(checks)
+        self.interval = interval
+        self.stale_after = interval * 3
+        # (آماده بودن، بدنه JSON، زمان بررسی monotonic)؛ یک tuple تا خواندن آن بدون قفل سازگار باشد
+        self._state: Tuple[bool, bytes, Optional[float]] = (False, STARTING_BODY, None)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        """شروع thread بررسی (یک بار در هر پردازه؛ پس از fork دوباره شروع می‌شود)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._state = (False, STARTING_BODY, None)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='readiness-checker', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_checks()
+            self._stop.wait(self.interval)
+
+    def run_checks(self) -> Dict:
+        """اجرای همه بررسی‌ها و جایگزینی نتیجه قبلی"""
+        results = {}
+        for name, check in self.checks.items():
+            started = time.perf_counter()
+            try:
+                ok, detail = check()
+            except Exception as e:
+                ok, detail = False, f'{type(e).__name__}: {e}'
+            results[name] = {
+                'ok': bool(ok),
+                'detail': detail,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+        ready = all(result['ok'] for result in results.values())
+        report = {
+            'ready': ready,
+            'status': 'ready' if ready else 'not_ready',
+            'checks': results,
+            'checked_at': time.time(),
+        }
+        self._state = (ready, json.dumps(report, ensure_ascii=False).encode('utf-8'), time.monotonic())
+        return report
+
+    def state(self) -> Tuple[bool, bytes]:
+        """
+        آخرین نتیجه بررسی (بدون اجرای بررسی)
+
+        Returns:
+            (آماده بودن، بدنه JSON)
+        """
+        ready, body, checked_at = self._state
+        if checked_at is not None and time.monotonic() - checked_at > self.stale_after:
+            return False, json.dumps({'ready': False, 'status': 'stale', 'checks': {}}).encode()
+        return ready, body
+
+
+def create_readiness_checker(checks: Dict[str, Check]) -> ReadinessChecker:
+    """
+    ساخت بررسی‌کننده آمادگی بر اساس متغیرهای محیطی
+
+    - READINESS_INTERVAL: فاصله بررسی‌ها (ثانیه)
+    """
+    return ReadinessChecker(checks, interval=float(os.getenv('READINESS_INTERVAL', '15')))
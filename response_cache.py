@@ -0,0 +1,198 @@
+"""
+کش پاسخ برای سوالات تکراری مشتریان (قیمت، زمان ارسال، تخفیف و ...)
+
+دو لایه دارد:
+- تطابق دقیق: کلید = پیام نرمال‌شده کاربر + اثر انگشت کانتکس برند
+- تطابق معنایی (اختیاری): شباهت کسینوسی embedding پیام با پیام‌های کش شده
+
+کش فقط برای نوبت اول یا مکالمه‌های کوتاه استفاده می‌شود، چون پاسخ مکالمه‌های
+طولانی به سابقه آنها وابسته است.
+"""
+
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# یکسان‌سازی حروف عربی و فارسی
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    '\u200c': ' ', '\u200e': None, '\u200f': None, '\u0640': None,
+})
+_PUNCTUATION = re.compile(r'[؟?!.,،;؛:«»"\'()\[\]{}…]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_message(text: str) -> str:
+    """نرمال‌سازی پیام کاربر برای مقایسه (حروف، علائم نگارشی و فاصله‌ها)"""
+    text = text.translate(_CHAR_MAP).casefold()
+    text = _PUNCTUATION.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def fingerprint(*parts: str) -> str:
+    """اثر انگشت کوتاه از متن‌ها (مثلاً کانتکس برند و مدل)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """کش LRU با TTL برای پاسخ‌های چت بات"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, max_history: int = 0,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 similarity_threshold: float = 0.92, max_semantic_entries: int = 200):
+        """
+        Args:
+            max_entries: حداکثر تعداد پاسخ‌های کش شده
+            ttl: مدت اعتبار هر پاسخ (ثانیه)
+            max_history: حداکثر تعداد پیام‌های قبلی مکالمه برای استفاده از کش (0 = فقط نوبت اول)
+            embed: تابع محاسبه embedding؛ اگر None باشد لایه معنایی غیرفعال است
+            similarity_threshold: حداقل شباهت کسینوسی برای تطابق معنایی
+            max_semantic_entries: حداکثر تعداد embeddingهای نگهداری شده
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_history = max_history
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_entries = max_semantic_entries
+
+        # (fingerprint, پیام نرمال‌شده) -> (زمان ثبت، پاسخ)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        # (fingerprint, پیام نرمال‌شده) -> embedding
+        self._embeddings: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def eligible(self, history_length: int) -> bool:
+        """آیا مکالمه‌ای با این تعداد پیام قبلی می‌تواند از کش استفاده کند؟"""
+        return history_length <= self.max_history
+
+    def _fresh(self, key: Tuple[str, str], now: float) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, response = entry
+        if now - created > self.ttl:
+            del self._entries[key]
+            self._embeddings.pop(key, None)
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def get(self, message: str, context_fingerprint: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        جستجوی پاسخ کش شده
+
+        Args:
+            message: پیام کاربر
+            context_fingerprint: اثر انگشت کانتکس برند
+
+        Returns:
+            (پاسخ یا None، embedding پیام برای استفاده در put)
+        """
+        key = (context_fingerprint, normalize_message(message))
+        now = time.time()
+        with self._lock:
+            response = self._fresh(key, now)
+            if response is not None:
+                self.exact_hits += 1
+                return response, None
+
+        if self.embed is None:
+            self.misses += 1
+            return None, None
+
+        embedding = self.embed(key[1])
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for other_key, other_embedding in self._embeddings.items():
+                if other_key[0] != context_fingerprint:
+                    continue
+                score = _cosine(embedding, other_embedding)
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+            response = self._fresh(best_key, now) if best_key else None
+            if response is not None:
+                self.semantic_hits += 1
+                return response, embedding
+        self.misses += 1
+        return None, embedding
+
+    def put(self, message: str, context_fingerprint: str, response: str,
+            embedding: Optional[List[float]] = None):
+        """ثبت پاسخ در کش"""
+        key = (context_fingerprint, normalize_message(message))
+        with self._lock:
+            self._entries[key] = (time.time(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._embeddings.pop(old_key, None)
+                self.evictions += 1
+
+            if embedding is not None:
+                self._embeddings[key] = embedding
+                self._embeddings.move_to_end(key)
+                while len(self._embeddings) > self.max_semantic_entries:
+                    self._embeddings.popitem(last=False)
+
+    def invalidate(self):
+        """حذف همه پاسخ‌های کش شده (مثلاً پس از تغییر کانتکس برند)"""
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+
+    def stats(self) -> Dict:
+        """آمار عملکرد کش"""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'exact_hits': self.exact_hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+def create_response_cache(embed: Optional[Callable[[str], List[float]]] = None) -> Optional[ResponseCache]:
+    """
+    ساخت کش پاسخ بر اساس متغیرهای محیطی
+
+    - RESPONSE_CACHE_ENABLED: فعال بودن کش (پیش‌فرض: 1)
+    - RESPONSE_CACHE_SIZE / RESPONSE_CACHE_TTL: حجم و مدت اعتبار
+    - RESPONSE_CACHE_MAX_HISTORY: حداکثر پیام‌های قبلی مکالمه (پیش‌فرض: 0 = فقط نوبت اول)
+    - RESPONSE_CACHE_SEMANTIC: فعال بودن لایه معنایی (پیش‌فرض: 0)
+    - RESPONSE_CACHE_SIMILARITY: آستانه شباهت لایه معنایی
+    """
+    if os.getenv('RESPONSE_CACHE_ENABLED', '1') != '1':
+        return None
+
+    semantic = os.getenv('RESPONSE_CACHE_SEMANTIC', '0') == '1'
+    return ResponseCache(
+        max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '1000')),
+        ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+        max_history=int(os.getenv('RESPONSE_CACHE_MAX_HISTORY', '0')),
+        embed=embed if semantic else None,
+        similarity_threshold=float(os.getenv('RESPONSE_CACHE_SIMILARITY', '0.92')),
+    )
@@ -0,0 +1,207 @@
+"""
+همگام‌سازی پس‌زمینه دفتر ثبت مشتریان با Google Sheets
+
+دفتر ثبت SQLite خودش صف ماندگار است: ردیف‌هایی که شناسه آنها از مکان‌نمای
+ذخیره شده در جدول sheets_sync بزرگتر است هنوز ارسال نشده‌اند. بنابراین با
+راه‌اندازی مجدد سرور هیچ ردیفی از دست نمی‌رود.
+"""
+
+import os
+import time
+import random
+import socket
+import threading
+from typing import Callable, List, Optional
+
+from db import connect
+from metrics import span
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+SCOPES = ['https://spreadsheets.google.com/feeds',
+          'https://www.googleapis.com/auth/drive']
+
+
+def default_worksheet_factory(sheet_id: str):
+    """
+    اتصال به Google Sheets و باز کردن اولین شیت
+
+    Args:
+        sheet_id: ID گوگل شیت
+
+    Returns:
+        شیء worksheet از gspread
+    """
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds_file = os.getenv('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
+    if not os.path.exists(creds_file):
+        raise FileNotFoundError(f"فایل {creds_file} برای Google Sheets یافت نشد")
+
+    creds = Credentials.from_service_account_file(creds_file, scopes=SCOPES)
+    client = gspread.authorize(creds)
+    return client.open_by_key(sheet_id).sheet1
+
+
+class GoogleSheetsSync:
+    """ارسال دسته‌ای ردیف‌های جدید دفتر ثبت به Google Sheets در یک thread پس‌زمینه"""
+
+    def __init__(self, db_file: str, sheet_id: str, fields: List[str],
+                 worksheet_factory: Optional[Callable] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 max_backoff: float = 300.0, lease_seconds: float = 60.0):
+        """
+        Initialize Google Sheets sync worker
+
+        Args:
+            db_file: مسیر دفتر ثبت SQLite
+            sheet_id: ID گوگل شیت
+            fields: ستون‌های دفتر ثبت به ترتیب ستون‌های شیت
+            worksheet_factory: تابع ساخت worksheet (برای تست می‌توان یک شیء جعلی داد)
+            batch_size: حداکثر تعداد ردیف در هر فراخوانی append_rows
+            flush_interval: فاصله زمانی (ثانیه) جمع‌آوری ردیف‌ها پیش از ارسال
+            max_backoff: حداکثر فاصله (ثانیه) بین تلاش‌های مجدد
+            lease_seconds: مدت اجاره همگام‌سازی برای جلوگیری از ارسال تکراری توسط چند worker
+        """
+        self.db_file = db_file
+        self.sheet_id = sheet_id
+        self.fields = fields
+        self.worksheet_factory = worksheet_factory or default_worksheet_factory
+        self.batch_size = batch_size or int(os.getenv('GOOGLE_SHEETS_BATCH_SIZE', '100'))
+        self.flush_interval = flush_interval or float(os.getenv('GOOGLE_SHEETS_FLUSH_INTERVAL', '5'))
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+
+        self._worksheet = None
+        self._pending = 0
+        self._failures = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.ensure_state()
+
+    def ensure_state(self):
+        """ایجاد جدول وضعیت همگام‌سازی؛ ردیف‌های قبلی ارسال‌شده فرض می‌شوند"""
+        conn = connect(self.db_file)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sheets_sync (
+                    sheet_id TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL,
+                    owner TEXT NOT NULL DEFAULT '',
+                    lease_until REAL NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute(
+                "INSERT OR IGNORE INTO sheets_sync (sheet_id, last_id) "
+                "SELECT ?, COALESCE(MAX(id), 0) FROM customers",
+                (self.sheet_id,)
+            )
+
+    def start(self):
+        """راه‌اندازی thread همگام‌سازی (پس از fork دوباره ساخته می‌شود)"""
+        with self._lock:
+            pid = os.getpid()
+            if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+                return
+            self._owner = f"{socket.gethostname()}:{pid}"
+            self._stop.clear()
+            self._thread_pid = pid
+            self._thread = threading.Thread(target=self._run, name='google-sheets-sync', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """توقف thread همگام‌سازی"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def notify(self, count: int = 1):
+        """
+        اعلام ثبت ردیف جدید (تنها کاری که در مسیر درخواست انجام می‌شود)
+
+        Args:
+            count: تعداد ردیف‌های ثبت شده
+        """
+        self.start()
+        self._pending += count
+        if self._pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        """حلقه اصلی thread همگام‌سازی"""
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+
+            try:
+                while self._acquire_lease() and self.flush() >= self.batch_size:
+                    pass
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                # با خطا، اتصال دوباره ساخته می‌شود
+                self._worksheet = None
+                delay = min(self.max_backoff, self.flush_interval * 2 ** self._failures)
+                delay *= random.uniform(0.5, 1.0)
+                log.warning('sheets.flush_failed', error=str(e), error_type=type(e).__name__,
+                            failures=self._failures, retry_in=round(delay, 1))
+                self._stop.wait(delay)
+
+    def _acquire_lease(self) -> bool:
+        """گرفتن یا تمدید اجاره همگام‌سازی؛ فقط یک پردازه در هر لحظه ارسال می‌کند"""
+        now = time.time()
+        conn = connect(self.db_file)
+        with conn:
+            cursor = conn.execute(
+                "UPDATE sheets_sync SET owner = ?, lease_until = ? "
+                "WHERE sheet_id = ? AND (owner = ? OR lease_until < ?)",
+                (self._owner, now + self.lease_seconds, self.sheet_id, self._owner, now)
+            )
+        return cursor.rowcount == 1
+
+    def flush(self) -> int:
+        """
+        ارسال یک دسته از ردیف‌های ارسال‌نشده با append_rows
+
+        Returns:
+            تعداد ردیف‌های ارسال شده
+        """
+        conn = connect(self.db_file)
+        last_id = conn.execute(
+            "SELECT last_id FROM sheets_sync WHERE sheet_id = ?", (self.sheet_id,)
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT id, {', '.join(self.fields)} FROM customers WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, self.batch_size)
+        ).fetchall()
+        if not rows:
+            self._pending = 0
+            return 0
+
+        with span('sheets.append_rows'):
+            if self._worksheet is None:
+                self._worksheet = self.worksheet_factory(self.sheet_id)
+            self._worksheet.append_rows(
+                [['' if value is None else value for value in tuple(row)[1:]] for row in rows],
+                # RAW: مقادیر ورودی کاربران (مثلاً شماره با صفر ابتدایی یا متن شروع شده با =) تفسیر نمی‌شوند
+                value_input_option='RAW'
+            )
+
+        with conn:
+            conn.execute(
+                "UPDATE sheets_sync SET last_id = ? WHERE sheet_id = ?",
+                (rows[-1][0], self.sheet_id)
+            )
+        self._pending = max(0, self._pending - len(rows))
+        log.info('sheets.flushed', rows=len(rows), last_id=rows[-1][0])
+        return len(rows)
@@ -0,0 +1,149 @@
+"""
+سرو فایل‌های ثابت با کش مرورگر
+
+- فایل‌های آپلود شده با hash محتوا در نام ذخیره می‌شوند؛ چون محتوای چنین آدرسی هرگز
+  تغییر نمی‌کند با Cache-Control طولانی (immutable) سرو می‌شوند
+- ETag و If-None-Match (پاسخ 304) برای همه فایل‌های آپلود شده
+- صفحه چت یک بار render و با gzip (و brotli در صورت نصب بودن) فشرده شده و در حافظه
+  نگه داشته می‌شود؛ با تغییر فایل قالب دوباره ساخته می‌شود
+- حالت اختیاری X-Sendfile / X-Accel-Redirect تا سرور جلویی (Apache/Nginx) خود فایل را
+  بدون عبور از پایتون ارسال کند
+
+تنظیمات (متغیرهای محیطی):
+- STATIC_OFFLOAD: x-sendfile یا x-accel (پیش‌فرض: خاموش)
+- STATIC_ACCEL_PREFIX: مسیر location داخلی Nginx برای uploads (پیش‌فرض: /_uploads)
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# یک سال؛ آدرس‌های hash دار هرگز محتوای دیگری نمی‌گیرند
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_LENGTH = 12
+
+# نام فایل آپلود: {timestamp}_{hash}_{نام اصلی}
+_HASHED_NAME = re.compile(rf'^\d{{8}}_\d{{6}}_(?P<digest>[0-9a-f]{{{HASH_LENGTH}}})_')
+
+
+def content_hash(data: bytes) -> str:
+    """hash کوتاه محتوای فایل (برای نام فایل و ETag)"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_filename(filename: str, data: bytes, now: Optional[datetime] = None) -> str:
+    """
+    ساخت نام فایل آپلود شامل زمان و hash محتوا
+
+    زمان در ابتدای نام باقی می‌ماند تا مرتب‌سازی نام‌ها همچنان جدیدترین فایل را بدهد.
+    """
+    timestamp = (now or datetime.now()).strftime('%Y%m%d_%H%M%S')
+    return f"{timestamp}_{content_hash(data)}_{filename}"
+
+
+def filename_digest(filename: str) -> Optional[str]:
+    """hash محتوای موجود در نام فایل (None برای فایل‌های قدیمی بدون hash)"""
+    match = _HASHED_NAME.match(os.path.basename(filename))
+    return match.group('digest') if match else None
+
+
+def offload_mode() -> Optional[str]:
+    """حالت ارسال فایل توسط سرور جلویی: 'x-sendfile'، 'x-accel' یا None"""
+    mode = os.getenv('STATIC_OFFLOAD', '').strip().lower()
+    return mode if mode in ('x-sendfile', 'x-accel') else None
+
+
+def accel_redirect_path(filename: str) -> str:
+    """مسیر داخلی Nginx برای هدر X-Accel-Redirect"""
+    prefix = os.getenv('STATIC_ACCEL_PREFIX', '/_uploads').rstrip('/')
+    return f"{prefix}/{filename.lstrip('/')}"
+
+
+def guess_mimetype(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+class CompressedPage:
+    """
+    یک صفحه render شده در حافظه به همراه نسخه‌های فشرده آن
+
+    صفحه در اولین درخواست ساخته می‌شود و فقط وقتی زمان تغییر فایل منبع عوض شود
+    دوباره render و فشرده می‌شود.
+    """
+
+    def __init__(self, render: Callable[[], str], source_path: Optional[str] = None):
+        """
+        Args:
+            render: تابع ساخت HTML صفحه
+            source_path: فایل قالب (برای تشخیص تغییر)
+        """
+        self.render = render
+        self.source_path = source_path
+        self.builds = 0
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._variants: Dict[str, bytes] = {}
+        self._etag: Optional[str] = None
+
+    def _source_mtime(self) -> Optional[float]:
+        if not self.source_path:
+            return None
+        try:
+            return os.stat(self.source_path).st_mtime
+        except OSError:
+            return None
+
+    def _build(self):
+        body = self.render().encode('utf-8')
+        variants = {
+            'identity': body,
+            # mtime=0 تا خروجی gzip برای محتوای یکسان همیشه یکسان باشد
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+        }
+        if BROTLI_AVAILABLE:
+            variants['br'] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+        self._variants = variants
+        self._etag = content_hash(body)
+        self.builds += 1
+
+    @property
+    def encodings(self) -> Tuple[str, ...]:
+        """کدگذاری‌های موجود به ترتیب اولویت"""
+        return ('br', 'gzip', 'identity') if BROTLI_AVAILABLE else ('gzip', 'identity')
+
+    def get(self, encoding: Optional[str]) -> Tuple[bytes, str, str]:
+        """
+        دریافت نسخه صفحه برای یک کدگذاری
+
+        Args:
+            encoding: 'br'، 'gzip' یا None/'identity'
+
+        Returns:
+            (بدنه، کدگذاری، ETag) - ETag برای هر کدگذاری متفاوت است
+        """
+        mtime = self._source_mtime()
+        with self._lock:
+            if not self._variants or mtime != self._mtime:
+                self._build()
+                self._mtime = mtime
+            if encoding not in self._variants:
+                encoding = 'identity'
+            etag = self._etag if encoding == 'identity' else f"{self._etag}-{encoding}"
+            return self._variants[encoding], encoding, etag
+
+    def stats(self) -> Dict:
+        return {
+            'builds': self.builds,
+            'sizes': {encoding: len(body) for encoding, body in self._variants.items()},
+        }
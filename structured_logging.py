@@ -0,0 +1,247 @@
+"""
+لاگ ساختاریافته JSON با نوشتن غیرهمگام
+
+- هر رکورد یک خط JSON است: زمان، سطح، logger، نام رویداد، فیلدهای رویداد و فیلدهای
+  همبستگی درخواست فعلی (route، session_id، customer_number و ...)
+- رکورد در thread درخواست فقط قالب‌بندی و در صف قرار می‌گیرد؛ نوشتن در stdout در thread
+  جداگانه (QueueListener) انجام می‌شود. اگر صف پر باشد رکورد دور ریخته و شمرده می‌شود
+  تا درخواست هرگز منتظر لاگ نماند.
+- نمونه‌برداری: رویدادهای پرتکرار سطح INFO/DEBUG با نرخ تنظیم شده ثبت می‌شوند
+  (هشدارها و خطاها همیشه ثبت می‌شوند)
+
+تنظیمات (متغیرهای محیطی):
+- LOG_LEVEL: حداقل سطح لاگ (پیش‌فرض: INFO)
+- LOG_SAMPLE_RATES: نرخ نمونه‌برداری رویدادها، مثلاً "http.request=0.1,chat.cache_hit=0.5"
+- LOG_QUEUE_SIZE: ظرفیت صف لاگ (پیش‌فرض: 10000)
+
+Example:
+    log = get_logger(__name__)
+    with log_context(route='/chat', session_id=session_id):
+        log.info('chat.response', cached=True, duration_ms=12.5)
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# فیلدهای همبستگی درخواست فعلی (جدا برای هر thread و هر task asyncio)
+_context: ContextVar[Dict] = ContextVar('log_context', default={})
+
+_RESERVED = ('ts', 'level', 'logger', 'event')
+# کتابخانه‌هایی که برای هر درخواست HTTP یک رکورد INFO ثبت می‌کنند (http.request جایگزین آنهاست)
+QUIET_LOGGERS = ('httpx', 'httpx2', 'httpcore', 'openai', 'werkzeug')
+
+
+def bind(**fields) -> object:
+    """
+    افزودن فیلدهای همبستگی به درخواست فعلی (مقادیر None نادیده گرفته می‌شوند)
+
+    Returns:
+        token برای reset
+    """
+    fields = {key: value for key, value in fields.items() if value is not None}
+    return _context.set({**_context.get(), **fields})
+
+
+def reset(token):
+    """بازگرداندن فیلدهای همبستگی به حالت پیش از bind"""
+    _context.reset(token)
+
+
+def clear():
+    """حذف همه فیلدهای همبستگی (ابتدای هر درخواست)"""
+    _context.set({})
+
+
+@contextmanager
+def log_context(**fields):
+    token = bind(**fields)
+    try:
+        yield
+    finally:
+        reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """قالب‌بندی رکورد به یک خط JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(_context.get())
+        fields = getattr(record, 'fields', None)
+        if fields:
+            for key, value in fields.items():
+                entry[f'field_{key}' if key in _RESERVED else key] = value
+        if record.exc_info:
+            entry['exc_type'] = record.exc_info[0].__name__
+            entry['exc'] = self.formatException(record.exc_info)
+        # یک رکورد همیشه یک خط است (traceback و متن چندخطی escape می‌شوند)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """نمونه‌برداری رویدادهای پرتکرار (فقط سطوح پایین‌تر از WARNING)"""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = rates or {}
+
+    @staticmethod
+    def parse(spec: str) -> Dict[str, float]:
+        """خواندن "event=0.1,other=0.5" """
+        rates = {}
+        for item in spec.split(','):
+            name, _, rate = item.partition('=')
+            if name.strip() and rate.strip():
+                rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        return rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(record.msg)
+        return rate is None or random.random() < rate
+
+
+class _DrainingListener(QueueListener):
+    """QueueListener که هنگام توقف منتظر جای خالی در صف پر می‌ماند (رکوردهای صف نوشته می‌شوند)"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    قرار دادن رکوردهای قالب‌بندی شده در صف و نوشتن آنها در thread جداگانه
+
+    thread نویسنده برای هر پردازه (از جمله workerهای fork شده) جداگانه شروع می‌شود.
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int = 10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener: Optional[QueueListener] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # صف و thread پردازه والد پس از fork قابل استفاده نیستند
+            self.queue = queue.Queue(self.maxsize)
+            self._listener = _DrainingListener(self.queue, self.target, respect_handler_level=False)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record: logging.LogRecord):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """نوشتن رکوردهای باقی‌مانده صف (هنگام خروج)"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+class EventLogger:
+    """logger رویدادمحور: log.info('event.name', key=value, ...)"""
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, fields: Dict, exc_info=False):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        """ثبت خطا به همراه traceback (فقط داخل بلوک except)"""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+_handler: Optional[AsyncQueueHandler] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging() -> AsyncQueueHandler:
+    """
+    نصب handler صف روی logger ریشه (یک بار)
+
+    - LOG_LEVEL: حداقل سطح
+    - LOG_SAMPLE_RATES: نرخ نمونه‌برداری رویدادها
+    - LOG_QUEUE_SIZE: ظرفیت صف
+    """
+    global _handler
+    with _configure_lock:
+        if _handler is not None:
+            return _handler
+        target = logging.StreamHandler(sys.stdout)
+        target.setFormatter(logging.Formatter('%(message)s'))
+        handler = AsyncQueueHandler(target, maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        # قالب‌بندی در thread فراخوان انجام می‌شود تا فیلدهای همبستگی درخواست خوانده شوند
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(SamplingFilter(SamplingFilter.parse(os.getenv('LOG_SAMPLE_RATES', ''))))
+
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+        atexit.register(handler.flush)
+        _handler = handler
+        return handler
+
+
+def get_logger(name: str) -> EventLogger:
+    """logger رویدادمحور یک ماژول (خروجی پس از configure_logging به صورت JSON نوشته می‌شود)"""
+    return EventLogger(name)
+
+
+def stats() -> Dict:
+    """وضعیت صف لاگ (برای /debug)"""
+    if _handler is None:
+        return {'configured': False}
+    return {
+        'configured': True,
+        'queued': _handler.queue.qsize(),
+        'dropped': _handler.dropped,
+        'sample_rates': next(
+            (f.rates for f in _handler.filters if isinstance(f, SamplingFilter)), {}
+        ),
+    }
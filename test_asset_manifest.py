@@ -0,0 +1,92 @@
+"""
+تست‌های manifest لوگو/آیکون و حذف فایل‌های جایگزین شده
+"""
+
+import os
+import json
+
+import pytest
+
+from asset_manifest import MANIFEST_NAME, AssetManifest
+
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    for kind in ('logo', 'icon'):
+        (tmp_path / f'{kind}s').mkdir()
+    return tmp_path
+
+
+def add_file(folder, name, age=0.0):
+    path = folder / 'logos' / name
+    path.write_bytes(b'x')
+    if age:
+        mtime = os.path.getmtime(path) - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def wait_for_gc(manifest):
+    # worker حذف یکی است؛ اجرای یک کار خالی یعنی کارهای قبلی تمام شده‌اند
+    manifest._submit(lambda: None).result()
+
+
+def test_manifest_is_built_from_existing_files(upload_folder):
+    add_file(upload_folder, '20240101_a.png')
+    add_file(upload_folder, '20240301_b.png')
+    manifest = AssetManifest(str(upload_folder), gc_enabled=False)
+
+    assert manifest.url('logo') == '/uploads/logos/20240301_b.png'
+    assert manifest.get('icon') is None
+    with open(upload_folder / 'logos' / MANIFEST_NAME, encoding='utf-8') as f:
+        assert json.load(f)['file'] == '20240301_b.png'
+
+
+def test_other_worker_update_is_seen(upload_folder):
+    reader = AssetManifest(str(upload_folder), gc_enabled=False, check_interval=0)
+    writer = AssetManifest(str(upload_folder), gc_enabled=False)
+    assert reader.get('logo') is None
+    writer.set_current('logo', 'new.png', files=['new.png', 'new.webp'],
+                       srcset={'image/webp': [('new.webp', '1x')]})
+
+    entry = reader.get('logo')
+    assert entry['files'] == ['new.png', 'new.webp']
+    assert entry['srcset'] == {'image/webp': '/uploads/logos/new.webp 1x'}
+
+
+def test_gc_keeps_current_previous_and_recent_files(upload_folder):
+    manifest = AssetManifest(str(upload_folder), gc_grace=60)
+    for name in ('old.png', 'previous.png'):
+        add_file(upload_folder, name, age=600)
+    manifest.set_current('logo', 'previous.png')
+    wait_for_gc(manifest)
+    assert manifest.removed == 1
+
+    for name in ('older.png', 'current.png', 'current.webp'):
+        add_file(upload_folder, name, age=600)
+    add_file(upload_folder, 'concurrent.png')
+    manifest.set_current('logo', 'current.png', files=['current.png', 'current.webp'])
+    wait_for_gc(manifest)
+
+    remaining = sorted(name for name in os.listdir(upload_folder / 'logos') if not name.startswith('.'))
+    assert remaining == ['concurrent.png', 'current.png', 'current.webp', 'previous.png']
+    assert manifest.removed == 2
+
+
+def test_collect_removes_replaced_uploads(upload_folder):
+    manifest = AssetManifest(str(upload_folder), gc_enabled=False, gc_grace=0)
+    for name in ('a.png', 'b.png', 'c.png'):
+        add_file(upload_folder, name, age=10)
+    manifest.set_current('logo', 'c.png')
+
+    assert manifest.collect('logo') == 2
+    assert manifest.collect('logo') == 0
+    assert manifest.url('logo') == '/uploads/logos/c.png'
+
+
+def test_gc_disabled_keeps_files(upload_folder):
+    manifest = AssetManifest(str(upload_folder), gc_enabled=False, gc_grace=0)
+    add_file(upload_folder, 'old.png', age=10)
+    manifest.set_current('logo', 'new.png')
+    assert manifest._executor is None
+    assert (upload_folder / 'logos' / 'old.png').exists()
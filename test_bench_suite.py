@@ -0,0 +1,41 @@
+"""
+تست‌های آمار و مقایسه نتایج بنچمارک
+"""
+
+from bench_suite import MIN_COMPARE_SAMPLES, compare, percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 100) == 100
+    assert percentile([7], 99) == 7
+    assert percentile([], 95) == 0.0
+
+
+def test_summarize_reports_milliseconds():
+    stats = summarize([0.3, 0.1, 0.2, 0.4], errors=1, elapsed=2.0)
+    assert stats['requests'] == 4 and stats['error_rate'] == 0.25
+    assert stats['throughput_rps'] == 2.0
+    assert (stats['p50_ms'], stats['max_ms'], stats['mean_ms']) == (200.0, 400.0, 250.0)
+    assert summarize([], 0, 0)['p95_ms'] == 0.0
+
+
+def run(p95_ms, rps, requests=MIN_COMPARE_SAMPLES, endpoints=None):
+    stats = {'requests': requests, 'p95_ms': p95_ms, 'throughput_rps': rps}
+    return {'levels': {'8': dict(stats, endpoints=endpoints or {})}}
+
+
+def test_compare_flags_regressions():
+    baseline = run(100, 50, endpoints={'chat': {'requests': 40, 'p95_ms': 100, 'throughput_rps': 20},
+                                      'index': {'requests': 5, 'p95_ms': 1, 'throughput_rps': 5}})
+    current = run(110, 30, endpoints={'chat': {'requests': 40, 'p95_ms': 150, 'throughput_rps': 20},
+                                     'index': {'requests': 5, 'p95_ms': 10, 'throughput_rps': 5}})
+
+    regressions = compare(current, baseline, max_regression=20)
+    # توان عملیاتی کل و p95 مسیر chat پسرفت کرده‌اند؛ index نمونه کافی ندارد
+    assert [(r['endpoint'], r['p95_change_pct'], r['rps_change_pct']) for r in regressions] == [
+        ('all', 10.0, -40.0), ('chat', 50.0, 0.0)]
+    assert compare(current, baseline, max_regression=60) == []
+    assert compare(current, {'levels': {}}, max_regression=0) == []
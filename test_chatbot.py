@@ -0,0 +1,151 @@
+"""
+تست‌های چت بات در برابر سرور جعلی OpenAI
+"""
+
+import re
+import asyncio
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from mock_openai import DEFAULT_REPLY
+from rate_limiter import RateLimitExceeded
+
+
+def test_stream_yields_tokens_and_stores_reply(bot):
+    tokens = list(bot.get_response_stream('سلام', 's1'))
+    assert len(tokens) > 1
+    assert ''.join(tokens) == DEFAULT_REPLY
+    assert bot.get_conversation_history('s1') == [
+        {'role': 'user', 'content': 'سلام'},
+        {'role': 'assistant', 'content': DEFAULT_REPLY},
+    ]
+    assert bot.usage_stats['requests'] == 1
+
+
+def test_closed_stream_does_not_store_the_turn(bot):
+    stream = bot.get_response_stream('سلام', 's1')
+    next(stream)
+    stream.close()
+    # پیام کاربر بی‌پاسخ در سابقه نمی‌ماند (درخواست بعدی دو پیام کاربر پشت سر هم نمی‌فرستد)
+    assert bot.get_conversation_history('s1') == []
+    list(bot.get_response_stream('سلام', 's1'))
+    assert [m['role'] for m in bot.get_conversation_history('s1')] == ['user', 'assistant']
+
+
+def test_failed_stream_does_not_store_the_turn(bot, monkeypatch):
+    def broken_stream(**kwargs):
+        yield from ()
+        raise ConnectionError('upstream closed')
+
+    monkeypatch.setattr(bot.client.chat.completions, 'create', broken_stream)
+    with pytest.raises(ConnectionError):
+        list(bot.get_response_stream('سلام', 's1'))
+    assert bot.get_conversation_history('s1') == []
+
+
+def test_failed_reply_does_not_store_the_turn(bot, monkeypatch):
+    def failing_create(**kwargs):
+        raise ConnectionError('upstream closed')
+
+    monkeypatch.setattr(bot.client.chat.completions, 'create', failing_create)
+    assert 'upstream closed' in bot.get_response('سلام', 's1')
+    assert bot.get_conversation_history('s1') == []
+
+
+def test_stream_matches_blocking_reply(bot):
+    assert bot.get_response('سلام', 's1') == ''.join(bot.get_response_stream('سلام', 's2'))
+
+
+def test_system_prompt_prefix_is_stable(bot):
+    first = bot._prepare_messages('سلام', 's1')
+    bot.conversations.append('s1', {'role': 'user', 'content': 'سلام'}, {'role': 'assistant', 'content': 'درود'})
+    second = bot._prepare_messages('قیمت؟', 's1')
+    other = bot._prepare_messages('سلام', 's2')
+
+    system = {'role': 'system', 'content': bot.get_system_message()}
+    assert first[0] == second[0] == other[0] == system
+    assert not re.search(r'\d{4}/\d{2}/\d{2}', system['content'])
+    # بخش متغیر (تاریخ) پس از سابقه مکالمه می‌آید
+    assert second[-1] == bot.get_date_message()
+    assert [m['content'] for m in second[1:-1]] == ['سلام', 'درود', 'قیمت؟']
+
+
+def test_brand_context_update_rebuilds_system_message(bot):
+    before = bot.get_system_message()
+    bot.update_brand_context('کانتکس جدید')
+    assert bot.get_system_message() != before
+    assert bot.get_system_message().startswith('کانتکس جدید')
+
+
+def test_usage_stats_report_cached_ratio(bot):
+    assert bot.get_usage_stats()['cached_ratio'] == 0.0
+    bot._record_usage(SimpleNamespace(prompt_tokens=1000, completion_tokens=50,
+                                      prompt_tokens_details=SimpleNamespace(cached_tokens=768)))
+    bot._record_usage(SimpleNamespace(prompt_tokens=1000, completion_tokens=50, prompt_tokens_details=None))
+    bot._record_usage(None)
+    stats = bot.get_usage_stats()
+    assert (stats['requests'], stats['prompt_tokens'], stats['cached_tokens']) == (2, 2000, 768)
+    assert stats['cached_ratio'] == 0.384
+
+
+def test_cache_metrics_are_registered_once(bot):
+    from chatbot import TashakorChatBot
+    from conversation_store import InMemoryConversationStore
+    from metrics import registry
+
+    count = len(registry._collectors)
+    other = TashakorChatBot(api_key='sk-test', conversation_store=InMemoryConversationStore())
+    assert len(registry._collectors) == count
+    assert registry._collectors['chatbot.cache'] == other.cache_metrics
+
+
+class CountingSlot:
+    """جایگاه فراخوانی OpenAI که تعداد گرفتن‌ها را می‌شمارد (یا در حالت پر، رد می‌کند)"""
+
+    def __init__(self):
+        self.acquired = 0
+        self.full = False
+
+    @contextmanager
+    def __call__(self):
+        if self.full:
+            raise RateLimitExceeded(1.0, 'concurrency')
+        self.acquired += 1
+        yield
+
+
+@pytest.fixture
+def cached_bot(bot, monkeypatch):
+    from chatbot import TashakorChatBot
+    from conversation_store import InMemoryConversationStore
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', '1')
+    slot = CountingSlot()
+    return TashakorChatBot(api_key='sk-test', conversation_store=InMemoryConversationStore(), llm_slot=slot), slot
+
+
+def test_cache_hits_do_not_take_llm_slot(cached_bot):
+    bot, slot = cached_bot
+    assert bot.get_response('قیمت؟', 's1') == DEFAULT_REPLY
+    assert slot.acquired == 1
+
+    slot.full = True
+    assert bot.get_response('قیمت؟', 's2') == DEFAULT_REPLY
+    assert list(bot.get_response_stream('قیمت؟', 's3')) == [DEFAULT_REPLY]
+    assert asyncio.run(bot.get_response_async('قیمت؟', 's4')) == DEFAULT_REPLY
+    # فقط فراخوانی واقعی مدل در صورت پر بودن ظرفیت رد می‌شود
+    with pytest.raises(RateLimitExceeded):
+        bot.get_response('سوال جدید', 's5')
+    with pytest.raises(RateLimitExceeded):
+        list(bot.get_response_stream('سوال جدید', 's6'))
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(bot.get_response_async('سوال جدید', 's7'))
+
+
+def test_cache_misses_take_llm_slot(cached_bot):
+    bot, slot = cached_bot
+    bot.get_response('سوال اول', 's1')
+    assert ''.join(bot.get_response_stream('سوال دوم', 's2')) == DEFAULT_REPLY
+    assert asyncio.run(bot.get_response_async('سوال سوم', 's3')) == DEFAULT_REPLY
+    assert slot.acquired == 3
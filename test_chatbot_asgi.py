@@ -0,0 +1,55 @@
+"""
+تست‌های نقطه ورود ASGI
+"""
+
+import pytest
+from starlette.testclient import TestClient
+
+from mock_openai import DEFAULT_REPLY
+from rate_limiter import AdmissionController
+
+
+@pytest.fixture
+def asgi(web, bot, monkeypatch):
+    monkeypatch.setattr(web, 'bot', bot)
+    import chatbot_asgi
+    with TestClient(chatbot_asgi.app) as client:
+        yield client
+
+
+def test_chat_replies_async(asgi, bot):
+    response = asgi.post('/chat', json={'message': 'سلام', 'session_id': 's1'})
+    assert response.status_code == 200
+    assert response.json() == {'response': DEFAULT_REPLY, 'bot_name': bot.name, 'session_id': 's1'}
+    assert bot.get_conversation_history('s1')[-1]['content'] == DEFAULT_REPLY
+
+    # session_id جدید ساخته می‌شود
+    assert asgi.post('/chat', json={'message': 'سلام'}).json()['session_id']
+
+
+@pytest.mark.parametrize('body', [{'message': '  '}, {}])
+def test_chat_rejects_empty_message(asgi, body):
+    assert asgi.post('/chat', json=body).status_code == 400
+
+
+def test_chat_rate_limit_returns_429(asgi, web, monkeypatch, tmp_path):
+    monkeypatch.setattr(web, 'admission', AdmissionController(
+        db_file=str(tmp_path / 'limits.db'), session_rate=0.001, session_burst=1))
+    assert asgi.post('/chat', json={'message': 'سلام', 'session_id': 's1'}).status_code == 200
+    response = asgi.post('/chat', json={'message': 'سلام', 'session_id': 's1'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.json()['success'] is False
+
+
+def test_save_customer_async(asgi, web):
+    response = asgi.post('/save-customer', json={'session_id': 's1', 'name': 'علی', 'phone': '09120000001'})
+    assert response.status_code == 200
+    assert response.json()['customer_number'] == 'CUST-0001'
+    assert len(list(web.data_storage.iter_rows())) == 1
+
+
+def test_other_routes_are_served_by_flask(asgi):
+    assert asgi.get('/livez').status_code == 200
+    response = asgi.get('/')
+    assert response.status_code == 200 and '<html' in response.text.lower()
@@ -0,0 +1,120 @@
+"""
+تست‌های مسیرهای مدیریت مشتریان در برنامه وب
+"""
+
+import json
+
+import pytest
+
+from mock_openai import DEFAULT_REPLY
+from rate_limiter import RateLimitExceeded
+
+TOKEN = 'secret-token'
+
+
+@pytest.fixture
+def client(web, monkeypatch):
+    monkeypatch.setenv('CUSTOMERS_API_TOKEN', TOKEN)
+    return web.app.test_client()
+
+
+def auth(token=TOKEN):
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.mark.parametrize('method, path', [('get', '/customers'), ('post', '/save-customers/batch')])
+def test_customers_api_is_disabled_without_token(web, monkeypatch, method, path):
+    monkeypatch.delenv('CUSTOMERS_API_TOKEN', raising=False)
+    response = getattr(web.app.test_client(), method)(path, headers=auth(''), json=[])
+    assert response.status_code == 503
+
+
+@pytest.mark.parametrize('headers', [{}, auth('wrong'), {'Authorization': TOKEN}, auth(TOKEN + 'x')])
+def test_customers_api_rejects_wrong_token(client, headers):
+    assert client.get('/customers', headers=headers).status_code == 401
+    assert client.post('/save-customers/batch', headers=headers, json=[]).status_code == 401
+
+
+def test_customers_query_with_token(client, web):
+    for i in range(1, 4):
+        web.data_storage.save_customer_data({'customer_number': f'CUST-{i:04d}', 'name': f'مشتری {i}',
+                                             'phone': f'0912{i:07d}', 'session_id': f's{i}'})
+
+    response = client.get('/customers?limit=2', headers=auth())
+    assert response.status_code == 200
+    assert 'no-store' in response.headers['Cache-Control']
+    page = response.get_json()
+    assert [c['customer_number'] for c in page['customers']] == ['CUST-0003', 'CUST-0002']
+    assert page['count'] == 2
+
+    page = client.get(f"/customers?limit=2&cursor={page['next_cursor']}", headers=auth()).get_json()
+    assert [c['customer_number'] for c in page['customers']] == ['CUST-0001']
+    assert page['next_cursor'] is None
+    assert client.get('/customers?limit=x', headers=auth()).status_code == 400
+
+
+def test_batch_import_saves_valid_rows(client, web):
+    web.customer_manager.get_or_create_customer_number('existing')
+    rows = [
+        {'session_id': 'existing', 'name': 'علی'},
+        {'phone': '09120000001'},
+        {'session_id': 'x'},
+        {'session_id': 'new', 'email': 'a@example.com', 'name': ['نامعتبر']},
+        {'session_id': 'new', 'email': 'a@example.com'},
+    ]
+    body = client.post('/save-customers/batch', headers=auth(), json=rows).get_json()
+
+    assert (body['saved'], body['rejected']) == (3, 2)
+    assert [result['success'] for result in body['results']] == [True, True, False, False, True]
+    assert [result.get('customer_number') for result in body['results'] if result['success']] == \
+        ['CUST-0001', 'CUST-0002', 'CUST-0003']
+    assert body['results'][1]['session_id'].startswith('batch-')
+    assert len(list(web.data_storage.iter_rows())) == 3
+
+
+def test_batch_import_accepts_ndjson(client, web):
+    lines = '{"session_id": "s1", "name": "علی"}\n\nnot json\n{"session_id": "s2", "phone": "0912"}\n'
+    response = client.post('/save-customers/batch', headers=auth(), data=lines.encode('utf-8'),
+                           content_type='application/x-ndjson')
+    body = response.get_json()
+    assert (body['saved'], body['rejected']) == (2, 1)
+    assert body['results'][1] == {'index': 1, 'success': False, 'error': 'خط JSON نامعتبر است'}
+    assert client.post('/save-customers/batch', headers=auth(), json={'rows': []}).status_code == 400
+
+
+def sse_events(body):
+    events = []
+    for block in body.decode('utf-8').strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_chat_stream_sends_server_sent_events(web, bot, monkeypatch):
+    monkeypatch.setattr(web, 'bot', bot)
+    response = web.app.test_client().post('/chat/stream', json={'message': 'سلام', 'session_id': 's1'})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+
+    events = sse_events(response.data)
+    assert events[0] == ('start', {'session_id': 's1', 'bot_name': bot.name})
+    assert events[-1] == ('done', {'session_id': 's1'})
+    tokens = [data['token'] for event, data in events if event == 'token']
+    assert len(tokens) > 1 and ''.join(tokens) == DEFAULT_REPLY
+    assert bot.get_conversation_history('s1')[-1]['content'] == DEFAULT_REPLY
+
+
+def test_chat_stream_rejects_empty_message(web, bot, monkeypatch):
+    monkeypatch.setattr(web, 'bot', bot)
+    assert web.app.test_client().post('/chat/stream', json={'message': '  '}).status_code == 400
+
+
+def test_chat_stream_reports_full_capacity(web, bot, monkeypatch):
+    def full_slot():
+        raise RateLimitExceeded(2.5, 'concurrency')
+
+    monkeypatch.setattr(bot, 'llm_slot', full_slot)
+    monkeypatch.setattr(web, 'bot', bot)
+    response = web.app.test_client().post('/chat/stream', json={'message': 'سلام', 'session_id': 's1'})
+    event, data = sse_events(response.data)[-1]
+    assert event == 'error' and data['retry_after'] == 3
@@ -0,0 +1,115 @@
+"""
+تست‌های ذخیره‌ساز سابقه مکالمات
+"""
+
+import pytest
+
+import conversation_store
+from conversation_store import ConversationStore, InMemoryConversationStore, SQLiteConversationStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conversation_store.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(max_sessions=100, ttl=60):
+        if request.param == 'memory':
+            return InMemoryConversationStore(max_sessions=max_sessions, ttl=ttl)
+        return SQLiteConversationStore(db_file=str(tmp_path / 'conversations.db'), max_sessions=max_sessions,
+                                       ttl=ttl, purge_interval=0)
+    return make
+
+
+def message(role, content):
+    return {'role': role, 'content': content}
+
+
+def test_incomplete_store_fails_at_construction():
+    class PartialStore(ConversationStore):
+        def get(self, session_id):
+            return []
+
+    with pytest.raises(TypeError):
+        PartialStore(max_sessions=1, ttl=1)
+
+
+def test_append_get_set_clear(make_store, clock):
+    store = make_store()
+    assert store.get('s1') == []
+    store.append('s1', message('user', 'سلام'), message('assistant', 'درود'))
+    store.append('s1', message('user', 'قیمت؟'))
+    assert [m['content'] for m in store.get('s1')] == ['سلام', 'درود', 'قیمت؟']
+
+    store.set('s1', [message('system', 'خلاصه')])
+    assert store.get('s1') == [message('system', 'خلاصه')]
+
+    store.clear('s1')
+    assert store.get('s1') == []
+    assert store.stats()['hits'] == 2
+
+
+def test_get_returns_a_copy(make_store, clock):
+    store = make_store()
+    store.append('s1', message('user', 'سلام'))
+    store.get('s1').append(message('user', 'تغییر'))
+    assert len(store.get('s1')) == 1
+
+
+def test_ttl_expires_idle_sessions(make_store, clock):
+    store = make_store(ttl=60)
+    store.append('s1', message('user', 'سلام'))
+    clock.now += 30
+    assert store.get('s1')
+    # هر نوبت مکالمه زمان انقضا را تمدید می‌کند
+    store.append('s1', message('assistant', 'درود'))
+    clock.now += 50
+    assert len(store.get('s1')) == 2
+    clock.now += 61
+    assert store.get('s1') == []
+    # جلسه منقضی از نو شروع می‌شود
+    store.append('s1', message('user', 'دوباره'))
+    assert [m['content'] for m in store.get('s1')] == ['دوباره']
+
+
+def test_least_recently_used_sessions_are_evicted(make_store, clock):
+    store = make_store(max_sessions=2)
+    for session_id in ('a', 'b'):
+        clock.now += 1
+        store.append(session_id, message('user', session_id))
+    clock.now += 1
+    store.append('a', message('assistant', 'a'))
+    clock.now += 1
+    store.append('c', message('user', 'c'))
+
+    assert store.get('b') == []
+    assert store.get('a') and store.get('c')
+    assert store.size() == 2
+    assert store.stats()['evictions'] >= 1
+
+
+def test_replace_prefix_keeps_newer_messages(make_store, clock):
+    store = make_store()
+    old = [message('user', 'سلام'), message('assistant', 'درود')]
+    store.append('s1', *old)
+    store.append('s1', message('user', 'قیمت؟'))
+
+    assert store.replace_prefix('s1', old, [message('system', 'خلاصه')])
+    assert store.get('s1') == [message('system', 'خلاصه'), message('user', 'قیمت؟')]
+    # سابقه دیگر با prefix قبلی شروع نمی‌شود
+    assert not store.replace_prefix('s1', old, [])
+    store.clear('s1')
+    assert not store.replace_prefix('s1', [], [message('system', 'خلاصه')])
+    assert store.get('s1') == []
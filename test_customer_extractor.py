@@ -0,0 +1,146 @@
+"""
+تست‌های استخراج تدریجی اطلاعات مشتری
+"""
+
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+import customer_extractor
+from customer_extractor import CustomerExtractor, parse_extraction
+from rate_limiter import RateLimitExceeded
+
+
+def message(content, role='user'):
+    return {'role': role, 'content': content}
+
+
+class BlockingExtract:
+    """تابع استخراج جعلی که تا آزاد شدن gate منتظر می‌ماند (worker مشغول نگه داشته می‌شود)"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+
+    def __call__(self, messages, profile):
+        self.calls.append([m['content'] for m in messages])
+        self.started.set()
+        self.gate.wait(5)
+        return {'notes': messages[-1]['content']}
+
+
+def drain(extractor):
+    extractor._executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def make_extractor(tmp_path):
+    def make(extract, **kwargs):
+        return CustomerExtractor(extract, db_file=str(tmp_path / 'profiles.db'), **kwargs)
+    return make
+
+
+def test_parse_extraction_normalizes_fields():
+    fields = parse_extraction('نتیجه: {"name": " علی ", "phone": 912, "email": ""}')
+    assert fields['name'] == 'علی'
+    assert fields['phone'] == '912'
+    assert fields['email'] is None
+    assert fields['address'] is None
+
+
+def test_profile_fields_are_merged(make_extractor):
+    extractor = make_extractor(lambda messages, profile: {})
+    extractor.merge('s1', {'name': 'علی', 'phone': None})
+    extractor.merge('s1', {'phone': '0912', 'name': None})
+    assert extractor.get('s1')['name'] == 'علی'
+    assert extractor.get('s1')['phone'] == '0912'
+
+
+def test_pending_turns_of_a_session_are_coalesced(make_extractor):
+    extract = BlockingExtract()
+    extractor = make_extractor(extract)
+    extractor.submit('busy', message('اول'))
+    assert extract.started.wait(5)
+
+    # worker مشغول است؛ نوبت‌های بعدی هر جلسه در یک کار ادغام می‌شوند
+    extractor.submit('s1', message('1'), message('پاسخ', 'assistant'))
+    extractor.submit('s1', message('2'))
+    extractor.submit('s2', message('3'))
+    assert extractor.stats()['pending'] == 2
+
+    extract.gate.set()
+    drain(extractor)
+    assert extract.calls == [['اول'], ['1', 'پاسخ', '2'], ['3']]
+    assert extractor.stats()['coalesced'] == 1
+    assert extractor.stats()['processed'] == 3
+    assert extractor.get('s1')['notes'] == '2'
+
+
+def test_full_backlog_drops_new_sessions(make_extractor):
+    extract = BlockingExtract()
+    extractor = make_extractor(extract, max_pending=2)
+    extractor.submit('busy', message('0'))
+    assert extract.started.wait(5)
+
+    extractor.submit('s1', message('1'))
+    extractor.submit('s2', message('2'))
+    extractor.submit('s3', message('3'))
+    # جلسه‌ای که در صف است هنوز پیام می‌پذیرد
+    extractor.submit('s1', message('4'))
+
+    extract.gate.set()
+    drain(extractor)
+    assert extractor.stats()['dropped'] == 1
+    assert extract.calls == [['0'], ['1', '4'], ['2']]
+    assert extractor.get('s3') is None
+
+
+def test_merged_messages_are_capped(make_extractor):
+    extract = BlockingExtract()
+    extractor = make_extractor(extract, max_messages=3)
+    extractor.submit('busy', message('0'))
+    assert extract.started.wait(5)
+    for i in range(1, 6):
+        extractor.submit('s1', message(str(i)))
+    extract.gate.set()
+    drain(extractor)
+    assert extract.calls[-1] == ['3', '4', '5']
+
+
+def test_extract_runs_inside_llm_slot(make_extractor):
+    events = []
+
+    @contextmanager
+    def llm_slot():
+        events.append('acquire')
+        yield
+        events.append('release')
+
+    def extract(messages, profile):
+        events.append('extract')
+        return {'name': 'علی'}
+
+    extractor = make_extractor(extract, llm_slot=llm_slot)
+    extractor.submit('s1', message('سلام'))
+    drain(extractor)
+    assert events == ['acquire', 'extract', 'release']
+
+
+def test_no_capacity_skips_after_retries(make_extractor, monkeypatch):
+    monkeypatch.setattr(customer_extractor.time, 'sleep', lambda seconds: None)
+    attempts = []
+
+    @contextmanager
+    def llm_slot():
+        attempts.append(1)
+        raise RateLimitExceeded(0.01, 'capacity')
+        yield
+
+    extractor = make_extractor(lambda messages, profile: {'name': 'x'}, llm_slot=llm_slot, slot_retries=3)
+    extractor.submit('s1', message('سلام'))
+    drain(extractor)
+    assert len(attempts) == 3
+    assert extractor.stats()['skipped'] == 1
+    assert extractor.get('s1') is None
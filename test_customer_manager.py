@@ -0,0 +1,64 @@
+"""
+تست‌های تخصیص شماره مشتری
+"""
+
+import json
+import logging
+
+import pytest
+
+from customer_manager import CustomerNumberManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return CustomerNumberManager(storage_file=str(tmp_path / 'customer_numbers.json'),
+                                 db_file=str(tmp_path / 'customer_numbers.db'))
+
+
+def test_numbers_are_sequential_and_stable(manager):
+    assert manager.get_customer_number('a') is None
+    assert manager.get_or_create_customer_number('a') == 'CUST-0001'
+    assert manager.get_or_create_customer_number('b') == 'CUST-0002'
+    assert manager.get_or_create_customer_number('a') == 'CUST-0001'
+    assert manager.get_all_customers() == {'a': 'CUST-0001', 'b': 'CUST-0002'}
+
+
+
+def test_batch_allocation_keeps_numbers_contiguous(manager):
+    manager.get_or_create_customer_number('a')
+    numbers = manager.get_or_create_customer_numbers(['b', 'a', 'c', 'b'])
+    assert numbers == {'a': 'CUST-0001', 'b': 'CUST-0002', 'c': 'CUST-0003'}
+    # دسته‌ای که فقط sessionهای موجود دارد شماره‌ای مصرف نمی‌کند
+    assert manager.get_or_create_customer_numbers(['a', 'c']) == {'a': 'CUST-0001', 'c': 'CUST-0003'}
+    assert manager.get_or_create_customer_number('d') == 'CUST-0004'
+
+
+def test_legacy_json_migration_reports_conflicts(tmp_path, caplog):
+    storage_file = tmp_path / 'customer_numbers.json'
+    storage_file.write_text(json.dumps({
+        'a': 'CUST-0001',
+        'b': 'CUST-0001',
+        'c': 'invalid',
+        'd': 'CUST-0005',
+    }), encoding='utf-8')
+
+    with caplog.at_level(logging.INFO, logger='customer_manager'):
+        manager = CustomerNumberManager(storage_file=str(storage_file), db_file=str(tmp_path / 'numbers.db'))
+
+    assert manager.get_all_customers() == {'a': 'CUST-0001', 'd': 'CUST-0005'}
+    conflicts = [r.fields for r in caplog.records if r.msg == 'customer_number.legacy_conflict']
+    assert conflicts == [{'session_id': 'b', 'customer_number': 'CUST-0001', 'assigned_to': 'a'}]
+    summary = next(r.fields for r in caplog.records if r.msg == 'customer_number.legacy_migrated')
+    assert (summary['migrated'], summary['skipped']) == (2, 2)
+    # شماره‌های جدید پس از بزرگترین شماره منتقل‌شده تخصیص داده می‌شوند
+    assert manager.get_or_create_customer_number('e') == 'CUST-0006'
+
+    # اجرای دوباره: ردیف‌های منتقل‌شده تداخل شمرده نمی‌شوند
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger='customer_manager'):
+        assert manager.load_numbers() == 2
+    conflicts = [r.fields for r in caplog.records if r.msg == 'customer_number.legacy_conflict']
+    assert conflicts == [{'session_id': 'b', 'customer_number': 'CUST-0001', 'assigned_to': 'a'}]
+    summary = next(r.fields for r in caplog.records if r.msg == 'customer_number.legacy_migrated')
+    assert (summary['migrated'], summary['existing'], summary['skipped']) == (0, 2, 2)
@@ -0,0 +1,150 @@
+"""
+تست‌های دفتر ثبت مشتریان (data_storage)
+"""
+
+import os
+
+import pytest
+
+import data_storage
+from data_storage import CustomerDataStorage, FIELDS, HEADERS, OPENPYXL_AVAILABLE
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return CustomerDataStorage(
+        excel_file=str(tmp_path / 'customers_data.xlsx'),
+        google_sheet_id='',
+        db_file=str(tmp_path / 'customers.db'),
+    )
+
+
+def customer(i, **fields):
+    return dict({'customer_number': f'CUST-{i:04d}', 'name': f'مشتری {i}', 'phone': f'0912{i:07d}',
+                 'session_id': f's{i}'}, **fields)
+
+
+def test_save_appends_rows_in_order(storage):
+    assert storage.get_version() == 0
+    assert storage.save_customer_data(customer(1))
+    assert storage.save_customer_data(customer(2, status='تحویل شده'))
+
+    rows = list(storage.iter_rows())
+    assert [row[FIELDS.index('customer_number')] for row in rows] == ['CUST-0001', 'CUST-0002']
+    # وضعیت پیش‌فرض و فیلدهای خالی
+    assert rows[0][FIELDS.index('status')] == 'در انتظار'
+    assert rows[0][FIELDS.index('email')] == ''
+    assert rows[1][FIELDS.index('status')] == 'تحویل شده'
+    assert storage.get_version() == 2
+
+
+def test_iter_rows_max_id(storage):
+    for i in range(1, 4):
+        storage.save_customer_data(customer(i))
+    assert len(list(storage.iter_rows(max_id=2))) == 2
+
+
+@pytest.mark.skipif(not OPENPYXL_AVAILABLE, reason='openpyxl نصب نیست')
+def test_legacy_excel_is_imported_once(tmp_path):
+    from openpyxl import Workbook
+
+    excel_file = tmp_path / 'customers_data.xlsx'
+    wb = Workbook()
+    wb.active.append(HEADERS)
+    wb.active.append(['CUST-0001', '2024/01/01 10:00:00', 'علی', '09121234567'])
+    wb.active.append([None, None])
+    wb.active.append(['CUST-0002', '2024/01/02 10:00:00', 'رضا', '09127654321'])
+    wb.save(excel_file)
+
+    def open_storage():
+        return CustomerDataStorage(excel_file=str(excel_file), google_sheet_id='',
+                                   db_file=str(tmp_path / 'customers.db'))
+
+    rows = list(open_storage().iter_rows())
+    assert [row[:3] for row in rows] == [
+        ('CUST-0001', '2024/01/01 10:00:00', 'علی'),
+        ('CUST-0002', '2024/01/02 10:00:00', 'رضا'),
+    ]
+    # دفتر ثبت دیگر خالی نیست و فایل قدیمی دوباره منتقل نمی‌شود
+    assert len(list(open_storage().iter_rows())) == 2
+
+
+@pytest.mark.skipif(not OPENPYXL_AVAILABLE, reason='openpyxl نصب نیست')
+def test_export_is_versioned_and_reused(storage):
+    from openpyxl import load_workbook
+
+    storage.save_customer_data(customer(1))
+    path, version = storage.export_excel()
+    assert version == 1 and path.endswith('.v1.xlsx')
+    mtime = os.path.getmtime(path)
+    # بدون ذخیره جدید همان فایل سرو می‌شود
+    assert storage.export_excel() == (path, 1)
+    assert os.path.getmtime(path) == mtime
+
+    storage.save_customer_data(customer(2))
+    new_path, new_version = storage.export_excel()
+    assert new_version == 2 and new_path != path
+    rows = list(load_workbook(new_path, read_only=True).active.iter_rows(values_only=True))
+    assert list(rows[0]) == HEADERS
+    assert [row[0] for row in rows[1:]] == ['CUST-0001', 'CUST-0002']
+
+
+@pytest.mark.skipif(not OPENPYXL_AVAILABLE, reason='openpyxl نصب نیست')
+def test_old_exports_are_removed(storage):
+    paths = []
+    for i in range(1, 5):
+        storage.save_customer_data(customer(i))
+        paths.append(storage.export_excel()[0])
+    # فقط نسخه فعلی و نسخه قبلی (برای دانلودهای در جریان) نگه داشته می‌شوند
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True]
+
+
+def test_query_customers_pages_with_cursor(storage):
+    for i in range(1, 8):
+        storage.save_customer_data(customer(i, status='تحویل شده' if i % 2 else 'در انتظار'))
+
+    page = storage.query_customers(limit=3)
+    assert [c['customer_number'] for c in page['customers']] == ['CUST-0007', 'CUST-0006', 'CUST-0005']
+    seen = [c['customer_number'] for c in page['customers']]
+    while page['next_cursor'] is not None:
+        page = storage.query_customers(cursor=page['next_cursor'], limit=3)
+        seen.extend(c['customer_number'] for c in page['customers'])
+    assert seen == [f'CUST-{i:04d}' for i in range(7, 0, -1)]
+
+    delivered = storage.query_customers(status='تحویل شده', limit=2)
+    assert [c['customer_number'] for c in delivered['customers']] == ['CUST-0007', 'CUST-0005']
+    rest = storage.query_customers(status='تحویل شده', cursor=delivered['next_cursor'], limit=2)
+    assert [c['customer_number'] for c in rest['customers']] == ['CUST-0003', 'CUST-0001']
+    assert rest['next_cursor'] is None
+
+
+def test_query_customers_normalizes_lookups(storage):
+    storage.save_customer_data(customer(1, phone='+98 912 345 6789', email='Ali@Example.com'))
+    storage.save_customer_data(customer(2))
+
+    for query in ({'phone': '۰۹۱۲-۳۴۵-۶۷۸۹'}, {'email': 'ali@example.com'}, {'number': '1'},
+                  {'number': 'cust-0001'}, {'session_id': 's1'}):
+        assert [c['customer_number'] for c in storage.query_customers(**query)['customers']] == ['CUST-0001']
+    assert storage.query_customers(phone='09000000000')['customers'] == []
+
+
+def test_get_all_customers_returns_rows_with_header(storage):
+    storage.save_customer_data(customer(1))
+    storage.save_customer_data(customer(2))
+    data = storage.get_all_customers()
+    assert data[0] == tuple(HEADERS)
+    assert [row[FIELDS.index('customer_number')] for row in data[1:]] == ['CUST-0001', 'CUST-0002']
+
+
+def test_dataframe_requires_pandas(storage, monkeypatch):
+    monkeypatch.setattr(data_storage, 'PANDAS_AVAILABLE', False)
+    with pytest.raises(ImportError):
+        storage.get_all_customers(as_dataframe=True)
+
+
+def test_dataframe_has_all_rows(storage):
+    pytest.importorskip('pandas')
+    storage.save_customer_data(customer(1))
+    frame = storage.get_all_customers(as_dataframe=True)
+    assert list(frame.columns) == HEADERS
+    assert len(frame) == 1
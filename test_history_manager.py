@@ -0,0 +1,113 @@
+"""
+تست‌های پنجره‌بندی سابقه مکالمه با بودجه توکن
+"""
+
+from conversation_store import InMemoryConversationStore
+from history_manager import SUMMARY_PREFIX, HistoryManager, MESSAGE_OVERHEAD_TOKENS, TokenCounter
+
+
+class CharCounter(TokenCounter):
+    """هر کاراکتر یک توکن (مستقل از نصب بودن tiktoken)"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def _count(self, text):
+        self.calls += 1
+        return len(text)
+
+
+def message(role, content):
+    return {'role': role, 'content': content}
+
+
+def manager(token_budget=100, max_stored_messages=6, summarize=None):
+    return HistoryManager(InMemoryConversationStore(), token_budget=token_budget,
+                          max_stored_messages=max_stored_messages, summarize=summarize, counter=CharCounter())
+
+
+def test_token_counts_are_cached():
+    counter = CharCounter()
+    assert counter.count('سلام') == 4
+    assert counter.count('سلام') == 4
+    assert counter.calls == 1
+    assert counter.count_message(message('user', 'سلام')) == 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_window_keeps_newest_messages_within_budget():
+    history = [message('user', 'a' * 40), message('assistant', 'b' * 40), message('user', 'c' * 40)]
+    # هر پیام 44 توکن است؛ فقط دو پیام آخر در بودجه 100 جا می‌شوند
+    assert manager(token_budget=100).window(history) == history[1:]
+
+
+def test_current_message_is_always_sent():
+    history = [message('user', 'x' * 500)]
+    assert manager(token_budget=10).window(history) == history
+
+
+def test_summary_is_included_when_it_fits():
+    summary = message('system', SUMMARY_PREFIX + 'خلاصه')
+    turns = [message('user', 'a' * 20), message('assistant', 'b' * 20)]
+    assert manager(token_budget=200).window([summary] + turns) == [summary] + turns
+    assert manager(token_budget=50).window([summary] + turns) == turns
+
+
+def test_compaction_summarizes_old_turns():
+    summarized = []
+
+    def summarize(previous, old_turns):
+        summarized.append((previous, [m['content'] for m in old_turns]))
+        return 'خلاصه جدید'
+
+    history_manager = manager(max_stored_messages=4, summarize=summarize)
+    store = history_manager.store
+    store.set('s1', [message('user', str(i)) for i in range(6)])
+
+    history_manager.maybe_compact('s1', 6)
+    history_manager._executor.shutdown(wait=True)
+
+    assert summarized == [('', ['0', '1', '2', '3'])]
+    assert store.get('s1') == [message('system', SUMMARY_PREFIX + 'خلاصه جدید'),
+                               message('user', '4'), message('user', '5')]
+
+
+def test_short_history_is_not_compacted():
+    history_manager = manager(max_stored_messages=4)
+    history_manager.maybe_compact('s1', 4)
+    assert history_manager._executor is None
+
+
+def test_compaction_keeps_turns_appended_while_summarizing():
+    history_manager = manager(max_stored_messages=4)
+    store = history_manager.store
+
+    def summarize(previous, old_turns):
+        # پیام جدید کاربر در حین فراخوانی کند خلاصه‌سازی
+        store.append('s1', message('user', 'جدید'))
+        return 'خلاصه'
+
+    history_manager.summarize = summarize
+    store.set('s1', [message('user', str(i)) for i in range(6)])
+    history_manager.maybe_compact('s1', 6)
+    history_manager._executor.shutdown(wait=True)
+
+    assert store.get('s1') == [message('system', SUMMARY_PREFIX + 'خلاصه'), message('user', '4'),
+                               message('user', '5'), message('user', 'جدید')]
+
+
+def test_compaction_is_dropped_when_history_is_cleared():
+    history_manager = manager(max_stored_messages=4)
+    store = history_manager.store
+
+    def summarize(previous, old_turns):
+        store.clear('s1')
+        store.append('s1', message('user', 'شروع دوباره'))
+        return 'خلاصه'
+
+    history_manager.summarize = summarize
+    store.set('s1', [message('user', str(i)) for i in range(6)])
+    history_manager.maybe_compact('s1', 6)
+    history_manager._executor.shutdown(wait=True)
+
+    assert store.get('s1') == [message('user', 'شروع دوباره')]
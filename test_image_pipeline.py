@@ -0,0 +1,98 @@
+"""
+تست‌های پاک‌سازی SVG و پردازش تصاویر آپلود شده
+"""
+
+import io
+
+import pytest
+
+from image_pipeline import ImageRejected, process_upload, sanitize_svg
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">%s</svg>'
+
+UNSAFE_SVGS = {
+    'script': SVG % b'<script>alert(1)</script><circle r="5"/>',
+    'onload': b'<svg xmlns="http://www.w3.org/2000/svg" onload="alert(1)"><circle r="5"/></svg>',
+    'external_href': SVG % b'<image xlink:href="https://evil.example/x.png"/>',
+    'javascript_href': SVG % b'<a href="javascript:alert(1)"><circle r="5"/></a>',
+    'foreign_object': SVG % (b'<foreignObject><iframe xmlns="http://www.w3.org/1999/xhtml" '
+                             b'src="https://evil.example"/></foreignObject>'),
+    'css_import': SVG % b'<style>@import url(https://evil.example/a.css);</style>',
+    'style_attribute': SVG % b'<rect style="fill: url(https://evil.example/p.svg)"/>',
+}
+FORBIDDEN = [b'script', b'onload', b'evil.example', b'javascript:', b'foreignObject', b'alert']
+
+
+@pytest.mark.parametrize('name', sorted(UNSAFE_SVGS))
+def test_active_svg_content_is_removed(name):
+    result = sanitize_svg(UNSAFE_SVGS[name])
+    assert [token for token in FORBIDDEN if token in result] == []
+    assert result.startswith(b'<svg')
+
+
+def test_safe_svg_content_is_kept():
+    data = SVG % (b'<defs><linearGradient id="g"/></defs><rect fill="url(#g)" width="10"/>'
+                  b'<image xlink:href="data:image/png;base64,AAAA"/><use href="#g"/>')
+    result = sanitize_svg(data)
+    for token in (b'linearGradient', b'url(#g)', b'data:image/png;base64,AAAA', b'href="#g"'):
+        assert token in result
+
+
+@pytest.mark.parametrize('data', [
+    b'<?xml version="1.0"?><!DOCTYPE svg [<!ENTITY a "aaaa">]><svg>&a;</svg>',
+    b'<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd"><svg/>',
+    b'<html><body/></html>',
+    b'<svg><unclosed></svg>',
+])
+def test_invalid_or_dangerous_svg_is_rejected(data):
+    with pytest.raises(ImageRejected):
+        sanitize_svg(data)
+
+
+def test_svg_upload_is_sanitized_without_variants():
+    result = process_upload('logo', 'logo.svg', UNSAFE_SVGS['script'])
+    assert list(result['files']) == [result['primary']]
+    assert result['primary'].endswith('_logo.svg')
+    assert b'script' not in result['files'][result['primary']]
+    assert result['srcset'] == {}
+
+
+def png(size):
+    Image = pytest.importorskip('PIL.Image')
+    exif = Image.Exif()
+    exif[0x0131] = 'Editor 1.0'
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').resize((size, size)).convert('RGB').save(buffer, format='PNG', exif=exif)
+    return buffer.getvalue()
+
+
+def test_image_is_resized_to_display_sizes_without_metadata():
+    Image = pytest.importorskip('PIL.Image')
+    result = process_upload('icon', 'icon.png', png(400))
+    sizes = {name: Image.open(io.BytesIO(content)) for name, content in result['files'].items()}
+    assert sizes[result['primary']].size == (30, 30)
+
+    base_srcset = list(result['srcset'].values())[-1]
+    assert [descriptor for _, descriptor in base_srcset] == ['1x', '2x', '3x']
+    assert sorted(result['favicon']) == [32, 180]
+    for size, name in result['favicon'].items():
+        assert sizes[name].format == 'PNG' and name.endswith('.png')
+        assert sizes[name].size == (size, size)
+    for image in sizes.values():
+        assert not image.getexif()
+        assert max(image.size) <= 180
+
+
+def test_small_image_is_not_upscaled():
+    Image = pytest.importorskip('PIL.Image')
+    result = process_upload('logo', 'logo.png', png(50))
+    base_srcset = list(result['srcset'].values())[-1]
+    # 2x (80 پیکسل) از تصویر اصلی بزرگ‌تر است و ساخته نمی‌شود
+    assert [descriptor for _, descriptor in base_srcset] == ['1x']
+    assert Image.open(io.BytesIO(result['files'][result['primary']])).size == (40, 40)
+
+
+def test_corrupt_image_is_rejected():
+    pytest.importorskip('PIL')
+    with pytest.raises(ImageRejected):
+        process_upload('logo', 'logo.png', b'\x89PNG\r\n\x1a\nnot an image')
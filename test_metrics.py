@@ -0,0 +1,123 @@
+"""
+تست‌های متریک‌ها، قالب Prometheus و جمع snapshot پردازه‌ها
+"""
+
+import threading
+
+import pytest
+
+import metrics
+from db import connect
+from metrics import ARCHIVE_ROW, MetricsRegistry, MultiProcessCollector, render
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests')
+    registry.gauge('sessions', 'Sessions')
+    registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    return registry
+
+
+def test_counter_and_histogram_render(registry):
+    registry.inc('requests_total', route='/chat', status=200)
+    registry.inc('requests_total', 2, route='/chat', status=200)
+    for value in (0.05, 0.5, 0.7, 3.0):
+        registry.observe('latency_seconds', value, route='/chat')
+    registry.set('sessions', 4)
+
+    text = render(registry.snapshot(), registry.meta)
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{route="/chat",status="200"} 3' in text
+    assert 'latency_seconds_bucket{route="/chat",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/chat",le="1"} 3' in text
+    assert 'latency_seconds_bucket{route="/chat",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/chat"} 4' in text
+    assert 'latency_seconds_sum{route="/chat"} 4.25' in text
+    assert 'sessions 4' in text
+
+
+def test_label_values_are_escaped(registry):
+    registry.inc('requests_total', route='a"b\\c\nd')
+    assert 'requests_total{route="a\\"b\\\\c\\nd"} 1' in render(registry.snapshot(), registry.meta)
+
+
+def test_collectors_replace_values(registry):
+    registry.register_collector('sessions', lambda: [('sessions', {}, 7)])
+    registry.set('sessions', 1)
+    assert registry.snapshot()[('sessions', ())] == 7
+    # ثبت دوباره با همان نام جایگزین می‌شود
+    registry.register_collector('sessions', lambda: [('sessions', {}, 9)])
+    assert registry.snapshot()[('sessions', ())] == 9
+    assert len(registry._collectors) == 1
+
+
+def test_span_records_outcome(monkeypatch):
+    observed = []
+    monkeypatch.setattr(metrics, '_enabled', True)
+    monkeypatch.setattr(metrics, 'observe', lambda name, value, **labels: observed.append((name, labels)))
+
+    with metrics.span('storage.save'):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.span('storage.save'):
+            raise ValueError()
+
+    assert observed == [('span_duration_seconds', {'span': 'storage.save', 'outcome': 'ok'}),
+                        ('span_duration_seconds', {'span': 'storage.save', 'outcome': 'error'})]
+
+
+def worker(registry, db_file):
+    # flush_interval بزرگ: snapshotها فقط با flush صریح نوشته می‌شوند
+    collector = MultiProcessCollector(registry, db_file=db_file, flush_interval=3600)
+    collector.start()
+    return collector
+
+
+def test_snapshots_of_workers_are_summed(registry, tmp_path):
+    db_file = str(tmp_path / 'metrics.db')
+    other = MetricsRegistry()
+    other.meta = registry.meta
+    collector = worker(registry, db_file)
+    other_collector = worker(other, db_file)
+    # هر دو collector در یک پردازه‌اند؛ شناسه جداگانه نقش دو worker را بازی می‌کند
+    other_collector._process_id = 'other-worker'
+
+    registry.inc('requests_total', route='/chat')
+    registry.observe('latency_seconds', 0.5)
+    registry.set('sessions', 2)
+    other.inc('requests_total', 2, route='/chat')
+    other.observe('latency_seconds', 2.0)
+    other.set('sessions', 3)
+    other_collector.flush()
+
+    values = collector.collect()
+    assert values[('requests_total', (('route', '/chat'),))] == 3
+    assert values[('latency_seconds', ())] == [0, 1, 1, 2.5]
+    assert values[('sessions', ())] == 5
+
+    # gauge پردازه‌ای که snapshot تازه ندارد حذف می‌شود و شمارنده‌های آن می‌مانند
+    conn = connect(db_file)
+    with conn:
+        conn.execute("UPDATE metrics_snapshots SET updated_at = 0 WHERE process = 'other-worker'")
+    values = collector.collect()
+    assert values[('sessions', ())] == 2
+    assert values[('requests_total', (('route', '/chat'),))] == 3
+
+    processes = [row[0] for row in conn.execute("SELECT process FROM metrics_snapshots")]
+    assert ARCHIVE_ROW in processes and 'other-worker' not in processes
+
+
+def test_relative_db_path_survives_chdir(registry, tmp_path, monkeypatch):
+    collector = worker(registry, 'metrics.db')
+    registry.inc('requests_total', route='/chat')
+    # atexit ممکن است پس از تغییر پوشه جاری و در thread دیگری (بدون اتصال باز) اجرا شود
+    other = tmp_path / 'other'
+    other.mkdir()
+    monkeypatch.chdir(other)
+    flusher = threading.Thread(target=collector.flush)
+    flusher.start()
+    flusher.join()
+    assert collector.collect()[('requests_total', (('route', '/chat'),))] == 1
+    assert not (other / 'metrics.db').exists()
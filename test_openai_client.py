@@ -0,0 +1,103 @@
+"""
+تست‌های کلاینت مشترک OpenAI و circuit breaker
+"""
+
+import openai
+import pytest
+
+import openai_client
+from mock_openai import DEFAULT_REPLY
+from openai_client import CircuitBreaker, CircuitBreakerTransport, httpx
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(openai_client.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_breaker_opens_and_allows_single_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record(False)
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open' and not breaker.allow()
+    assert breaker.stats() == {'state': 'open', 'consecutive_failures': 2, 'rejected': 1, 'retry_after': 10.0}
+
+    clock[0] += 10
+    assert breaker.state == 'half_open'
+    assert breaker.allow() and not breaker.allow()
+    # خطای درخواست آزمایشی circuit را دوباره باز می‌کند
+    breaker.record(False)
+    assert breaker.state == 'open' and breaker.retry_after() == 10
+
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """پاسخ‌های جعلی transport پایه httpx (عدد: کد وضعیت، استثنا: خطای شبکه)"""
+    results = []
+
+    def handle_request(self, request):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return httpx.Response(result, request=request)
+
+    monkeypatch.setattr(httpx.HTTPTransport, 'handle_request', handle_request)
+    return results
+
+
+def test_transport_counts_degraded_responses(upstream):
+    breaker = CircuitBreaker(failure_threshold=2)
+    transport = CircuitBreakerTransport(breaker)
+    request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+
+    upstream.extend([400, 503, httpx.ConnectError('refused')])
+    assert transport.handle_request(request).status_code == 400
+    assert breaker.failures == 0
+    assert transport.handle_request(request).status_code == 503
+    with pytest.raises(httpx.ConnectError):
+        transport.handle_request(request)
+    assert breaker.state == 'open'
+
+    # circuit باز: پاسخ محلی بدون ارسال درخواست
+    response = transport.handle_request(request)
+    assert response.status_code == 503
+    assert response.headers['x-should-retry'] == 'false'
+    assert int(response.headers['retry-after']) >= 1
+    assert response.json()['error']['type'] == 'circuit_open'
+    assert breaker.rejected == 1
+
+
+@pytest.fixture
+def shared_client(mock_openai, monkeypatch):
+    """وضعیت مشترک تازه پردازه (کلاینت‌ها و circuit breaker) متصل به سرور جعلی"""
+    monkeypatch.setenv('OPENAI_BASE_URL', mock_openai.base_url)
+    monkeypatch.setenv('OPENAI_BREAKER_THRESHOLD', '1')
+    monkeypatch.setattr(openai_client, '_pid', None)
+    monkeypatch.setattr(openai_client, '_breaker', None)
+    monkeypatch.setattr(openai_client, '_clients', {})
+    monkeypatch.setattr(openai_client, '_async_clients', {})
+    return openai_client.get_openai_client('sk-test')
+
+
+def test_open_circuit_fails_fast_without_retries(shared_client, mock_openai):
+    assert openai_client.get_openai_client('sk-test') is shared_client
+    response = shared_client.chat.completions.create(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'سلام'}])
+    assert response.choices[0].message.content == DEFAULT_REPLY
+
+    breaker = openai_client.get_breaker()
+    breaker.record(False)
+    sent = mock_openai.stats()['total_requests']
+    with pytest.raises(openai.APIStatusError) as error:
+        shared_client.chat.completions.create(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'سلام'}])
+    assert error.value.status_code == 503
+    assert breaker.rejected == 1
+    assert mock_openai.stats()['total_requests'] == sent
+    assert not openai_client.probe_upstream('sk-test')[0]
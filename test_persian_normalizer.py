@@ -0,0 +1,49 @@
+"""
+تست‌های نرمال‌ساز متن فارسی (نمونه‌های طلایی benchmarks/persian_golden.json)
+"""
+
+import os
+import json
+import random
+
+import pytest
+
+from persian_normalizer import PersianStreamNormalizer, normalize_persian
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'persian_golden.json')
+
+with open(GOLDEN_FILE, encoding='utf-8') as f:
+    GOLDEN = json.load(f)
+
+
+def stream_normalize(text, sizes):
+    normalizer = PersianStreamNormalizer()
+    parts, position = [], 0
+    for size in sizes:
+        parts.append(normalizer.feed(text[position:position + size]))
+        position += size
+    parts.append(normalizer.feed(text[position:]))
+    parts.append(normalizer.flush())
+    return ''.join(parts)
+
+
+@pytest.mark.parametrize('case', GOLDEN, ids=[case['name'] for case in GOLDEN])
+def test_golden_cases(case):
+    assert normalize_persian(case['input']) == case['expected']
+    assert normalize_persian(case['expected']) == case['expected']
+
+
+@pytest.mark.parametrize('case', GOLDEN, ids=[case['name'] for case in GOLDEN])
+def test_stream_matches_full_normalization(case):
+    text, rng = case['input'], random.Random(case['name'])
+    for size in (1, 2, 3, 7):
+        assert stream_normalize(text, [size] * len(text)) == case['expected']
+    for _ in range(10):
+        assert stream_normalize(text, [rng.randint(1, 6) for _ in text]) == case['expected']
+
+
+def test_code_block_is_streamed_before_it_closes():
+    normalizer = PersianStreamNormalizer()
+    assert normalizer.feed('کد:\n```\nx  =  1\n') == 'کد:\n```\nx  =  1\n'
+    assert normalizer.feed('``') == ''
+    assert normalizer.feed('`\nپايان') + normalizer.flush() == '```\nپایان'
@@ -0,0 +1,106 @@
+"""
+تست‌های محدودیت نرخ و جایگاه‌های فراخوانی هم‌زمان
+"""
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdmissionController, RateLimitExceeded
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def make_controller(tmp_path):
+    def make(**kwargs):
+        return AdmissionController(db_file=str(tmp_path / 'rate_limits.db'), **kwargs)
+    return make
+
+
+def test_token_bucket_allows_burst_then_reports_retry_after(make_controller, clock):
+    bucket = make_controller().sessions
+    bucket.rate, bucket.burst = 0.5, 3
+    assert [bucket.consume('s1') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.consume('s1') == pytest.approx(2.0)
+    # bucketهای جداگانه برای هر کلید
+    assert bucket.consume('s2') == 0.0
+
+
+def test_token_bucket_refills_over_time(make_controller, clock):
+    bucket = make_controller().sessions
+    bucket.rate, bucket.burst = 1.0, 2
+    bucket.consume('s1')
+    bucket.consume('s1')
+    assert bucket.consume('s1') == pytest.approx(1.0)
+    clock[0] += 1.5
+    assert bucket.consume('s1') == 0.0
+    assert bucket.consume('s1') == pytest.approx(0.5)
+    # ظرفیت از burst بیشتر نمی‌شود
+    clock[0] += 100
+    assert [bucket.consume('s1') for _ in range(3)][-1] > 0
+
+
+def test_check_raises_for_exhausted_ip(make_controller, clock):
+    controller = make_controller(ip_rate=1.0, ip_burst=1)
+    controller.check('s1', '10.0.0.1')
+    with pytest.raises(RateLimitExceeded) as error:
+        controller.check('s2', '10.0.0.1')
+    assert error.value.reason == 'rate'
+    assert error.value.retry_after == pytest.approx(1.0)
+    assert controller.stats()['rejected_rate'] == 1
+
+
+def test_client_ip_trusts_forwarded_for_only_behind_proxy(make_controller):
+    assert make_controller().client_ip('1.1.1.1', '2.2.2.2, 3.3.3.3') == '1.1.1.1'
+    assert make_controller(trust_proxy=True).client_ip('1.1.1.1', '2.2.2.2, 3.3.3.3') == '2.2.2.2'
+
+
+def test_slots_are_capped_and_released(make_controller):
+    controller = make_controller(max_in_flight=2, queue_timeout=0)
+    first = controller.acquire_slot()
+    second = controller.acquire_slot()
+    assert controller.stats()['in_flight'] == 2
+    with pytest.raises(RateLimitExceeded) as error:
+        controller.acquire_slot()
+    assert error.value.reason == 'capacity'
+
+    controller.release_slot(first)
+    with controller.llm_slot():
+        assert controller.stats()['in_flight'] == 2
+    controller.release_slot(second)
+    assert controller.stats()['in_flight'] == 0
+    assert controller.stats()['rejected_capacity'] == 1
+
+
+def test_release_with_stale_token_keeps_new_owner(make_controller):
+    controller = make_controller(max_in_flight=1, queue_timeout=0)
+    token = controller.acquire_slot()
+    controller.release_slot(token)
+    current = controller.acquire_slot()
+    # آزادسازی دوباره با شناسه قدیمی جایگاه مالک جدید را آزاد نمی‌کند
+    controller.release_slot(token)
+    assert controller.stats()['in_flight'] == 1
+    controller.release_slot(current)
+
+
+def test_expired_lease_is_reclaimed(make_controller, clock):
+    controller = make_controller(max_in_flight=1, queue_timeout=0)
+    controller.concurrency.lease_seconds = 10
+    controller.acquire_slot()
+    assert controller.concurrency.acquire() is None
+    # جایگاه worker از کار افتاده پس از پایان اجاره دوباره قابل استفاده است
+    clock[0] += 11
+    assert controller.concurrency.acquire() is not None
+
+
+def test_waiting_request_gets_slot_released_meanwhile(make_controller, monkeypatch):
+    controller = make_controller(max_in_flight=1, queue_timeout=5)
+    token = controller.acquire_slot()
+    monkeypatch.setattr(rate_limiter.time, 'sleep', lambda seconds: controller.release_slot(token))
+    assert controller.acquire_slot() is not None
+    assert controller.stats()['waiting'] == 0
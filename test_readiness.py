@@ -0,0 +1,60 @@
+"""
+تست‌های بررسی آمادگی (/readyz)
+"""
+
+import json
+import threading
+
+import readiness
+from readiness import ReadinessChecker
+
+
+def failing_check():
+    raise OSError('disk full')
+
+
+def test_state_is_starting_until_first_run():
+    checker = ReadinessChecker({'bot': lambda: (True, 'initialized')})
+    ready, body = checker.state()
+    assert not ready
+    assert json.loads(body)['status'] == 'starting'
+
+
+def test_all_checks_must_pass():
+    checker = ReadinessChecker({'bot': lambda: (True, 'initialized'), 'storage': failing_check})
+    report = checker.run_checks()
+    assert not report['ready']
+    assert report['checks']['storage'] == {'ok': False, 'detail': 'OSError: disk full',
+                                           'duration_ms': report['checks']['storage']['duration_ms']}
+
+    checker.checks['storage'] = lambda: (True, 'writable')
+    checker.run_checks()
+    ready, body = checker.state()
+    assert ready and json.loads(body)['status'] == 'ready'
+
+
+def test_stale_result_is_not_ready(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(readiness.time, 'monotonic', lambda: now[0])
+    checker = ReadinessChecker({'bot': lambda: (True, 'initialized')}, interval=10)
+    checker.run_checks()
+    now[0] += 29
+    assert checker.state()[0]
+    # thread بررسی متوقف شده است
+    now[0] += 2
+    ready, body = checker.state()
+    assert not ready and json.loads(body)['status'] == 'stale'
+
+
+def test_background_thread_runs_checks():
+    checked = threading.Event()
+    checker = ReadinessChecker({'bot': lambda: (checked.set() or True, 'initialized')}, interval=60)
+    checker.start()
+    thread = checker._thread
+    # شروع دوباره در همان پردازه thread جدیدی نمی‌سازد
+    checker.start()
+    assert checker._thread is thread
+    assert checked.wait(5)
+    checker.stop()
+    thread.join(5)
+    assert checker.state()[0]
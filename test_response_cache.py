@@ -0,0 +1,79 @@
+"""
+تست‌های کش پاسخ سوالات تکراری
+"""
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, fingerprint, normalize_message
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_normalize_message():
+    assert normalize_message('  قيمت محصولات چقدر است؟؟ ') == 'قیمت محصولات چقدر است'
+    assert normalize_message('ارسال‌به «شهرستان»!') == 'ارسال به شهرستان'
+
+
+def test_exact_hit_ignores_spelling_variants(clock):
+    cache = ResponseCache()
+    context = fingerprint('brand', 'model')
+    cache.put('قیمت محصولات چقدر است؟', context, 'پاسخ')
+    assert cache.get('قيمت محصولات  چقدر است', context) == ('پاسخ', None)
+    assert cache.stats()['exact_hits'] == 1
+
+
+def test_context_fingerprint_separates_entries(clock):
+    cache = ResponseCache()
+    cache.put('سلام', fingerprint('brand-a', 'model'), 'پاسخ الف')
+    assert cache.get('سلام', fingerprint('brand-b', 'model')) == (None, None)
+    assert cache.get('سلام', fingerprint('brand-a', 'other-model')) == (None, None)
+
+
+def test_entries_expire(clock):
+    cache = ResponseCache(ttl=60)
+    cache.put('سلام', 'ctx', 'پاسخ')
+    clock[0] += 61
+    assert cache.get('سلام', 'ctx') == (None, None)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.put('یک', 'ctx', '1')
+    cache.put('دو', 'ctx', '2')
+    cache.get('یک', 'ctx')
+    cache.put('سه', 'ctx', '3')
+    assert cache.get('دو', 'ctx')[0] is None
+    assert cache.get('یک', 'ctx')[0] == '1'
+
+
+def test_invalidate_clears_all_entries(clock):
+    cache = ResponseCache(embed=lambda text: [1.0, 0.0])
+    cache.put('سلام', 'ctx', 'پاسخ', embedding=[1.0, 0.0])
+    cache.invalidate()
+    assert cache.get('سلام', 'ctx')[0] is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_semantic_hit_above_threshold(clock):
+    vectors = {'هزینه ارسال چقدر است': [1.0, 0.1], 'قیمت ارسال چند است': [1.0, 0.12], 'ساعت کاری': [0.0, 1.0]}
+    cache = ResponseCache(embed=vectors.get, similarity_threshold=0.95)
+    response, embedding = cache.get('هزینه ارسال چقدر است؟', 'ctx')
+    assert response is None
+    cache.put('هزینه ارسال چقدر است؟', 'ctx', 'رایگان', embedding)
+
+    assert cache.get('قیمت ارسال چند است', 'ctx')[0] == 'رایگان'
+    assert cache.get('ساعت کاری', 'ctx')[0] is None
+    assert cache.stats()['semantic_hits'] == 1
+
+
+def test_eligible_only_for_short_history():
+    cache = ResponseCache(max_history=0)
+    assert cache.eligible(0)
+    assert not cache.eligible(2)
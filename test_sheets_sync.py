@@ -0,0 +1,149 @@
+"""
+تست‌های همگام‌سازی Google Sheets با worksheet جعلی
+"""
+
+import time
+import threading
+
+import pytest
+
+import sheets_sync
+from data_storage import CustomerDataStorage, FIELDS
+from db import connect
+from sheets_sync import GoogleSheetsSync
+
+
+class FakeWorksheet:
+    """worksheet جعلی که فراخوانی‌های append_rows را ثبت می‌کند و می‌تواند چند بار خطا بدهد"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = 0
+        self.batches = []
+        self.input_options = []
+
+    def append_rows(self, rows, value_input_option=None):
+        self.attempts += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('sheets unavailable')
+        self.batches.append(rows)
+        self.input_options.append(value_input_option)
+
+
+class RecordingEvent(threading.Event):
+    """ثبت مدت انتظارهای thread همگام‌سازی (فاصله تلاش‌های مجدد)"""
+
+    def __init__(self):
+        super().__init__()
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        return super().wait(timeout)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return CustomerDataStorage(excel_file=str(tmp_path / 'customers_data.xlsx'), google_sheet_id='',
+                               db_file=str(tmp_path / 'customers.db'))
+
+
+def save(storage, count, start=1):
+    for i in range(start, start + count):
+        storage.save_customer_data({'customer_number': f'CUST-{i:04d}', 'name': f'مشتری {i}',
+                                    'session_id': f's{i}'})
+
+
+def last_id(sync):
+    return connect(sync.db_file).execute(
+        "SELECT last_id FROM sheets_sync WHERE sheet_id = ?", (sync.sheet_id,)
+    ).fetchone()[0]
+
+
+def make_sync(storage, worksheet, **kwargs):
+    return GoogleSheetsSync(storage.db_file, 'sheet', FIELDS, worksheet_factory=lambda sheet_id: worksheet,
+                            **kwargs)
+
+
+def test_existing_rows_are_not_resent(storage):
+    save(storage, 3)
+    worksheet = FakeWorksheet()
+    sync = make_sync(storage, worksheet, batch_size=10)
+    assert sync.flush() == 0
+    assert worksheet.batches == []
+    assert last_id(sync) == 3
+
+
+def test_flush_batches_rows_and_advances_cursor(storage):
+    worksheet = FakeWorksheet()
+    sync = make_sync(storage, worksheet, batch_size=2)
+    save(storage, 5)
+
+    sent = [sync.flush() for _ in range(4)]
+    assert sent == [2, 2, 1, 0]
+    assert [len(batch) for batch in worksheet.batches] == [2, 2, 1]
+    assert [row[FIELDS.index('customer_number')] for batch in worksheet.batches for row in batch] == [
+        f'CUST-{i:04d}' for i in range(1, 6)
+    ]
+    assert last_id(sync) == 5
+
+
+def test_values_are_sent_raw(storage):
+    worksheet = FakeWorksheet()
+    sync = make_sync(storage, worksheet)
+    storage.save_customer_data({'customer_number': 'CUST-0001', 'name': '=HYPERLINK("http://x")',
+                                'phone': '09121234567', 'session_id': 's1'})
+    sync.flush()
+    row = worksheet.batches[0][0]
+    assert row[FIELDS.index('phone')] == '09121234567'
+    assert row[FIELDS.index('name')] == '=HYPERLINK("http://x")'
+    # Google Sheets مقادیر را به صورت فرمول یا عدد تفسیر نمی‌کند
+    assert worksheet.input_options == ['RAW']
+
+
+def test_failed_write_keeps_cursor(storage):
+    worksheet = FakeWorksheet(failures=1)
+    sync = make_sync(storage, worksheet, batch_size=10)
+    save(storage, 2)
+
+    with pytest.raises(ConnectionError):
+        sync.flush()
+    assert last_id(sync) == 0
+    # تلاش بعدی همان ردیف‌ها را ارسال می‌کند
+    assert sync.flush() == 2
+    assert last_id(sync) == 2
+
+
+def test_worker_retries_with_backoff(storage, monkeypatch):
+    monkeypatch.setattr(sheets_sync.random, 'uniform', lambda a, b: 1.0)
+    worksheet = FakeWorksheet(failures=3)
+    sync = make_sync(storage, worksheet, batch_size=1, flush_interval=0.01, max_backoff=0.05)
+    sync._stop = RecordingEvent()
+    save(storage, 1)
+
+    sync.notify()
+    try:
+        deadline = time.monotonic() + 5
+        while not worksheet.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        sync.stop(timeout=5)
+
+    assert worksheet.attempts == 4
+    assert len(worksheet.batches) == 1
+    assert last_id(sync) == 1
+    # فاصله تلاش‌ها دو برابر می‌شود و از max_backoff بیشتر نمی‌شود
+    assert sync._stop.waits[:3] == [0.02, 0.04, 0.05]
+
+
+def test_lease_allows_one_owner(storage):
+    first = make_sync(storage, FakeWorksheet())
+    second = make_sync(storage, FakeWorksheet())
+    second._owner = 'other-host:1'
+    assert first._acquire_lease()
+    assert not second._acquire_lease()
+    # اجاره منقضی شده را پردازه دیگر می‌گیرد
+    first.lease_seconds = -1
+    assert first._acquire_lease()
+    assert second._acquire_lease()
@@ -0,0 +1,68 @@
+"""
+تست‌های import سبک برنامه وب (وابستگی‌های سنگین در اولین استفاده)
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from startup_bench import LAZY_MODULES, ROOT
+
+PROBE = '''
+import json, sys
+import chatbot_web
+before = [chatbot_web.data_storage, chatbot_web.customer_manager]
+loaded = sorted(name for name in {lazy!r} if name in sys.modules)
+storage = chatbot_web.get_data_storage()
+# لاگ‌های برنامه در stdout نوشته می‌شوند؛ نتیجه در فایل جداگانه
+with open('startup.json', 'w') as f:
+    json.dump({{
+        'loaded': loaded,
+        'created_at_import': [item is not None for item in before],
+        'same_storage': chatbot_web.get_data_storage() is storage,
+        'bot_disabled': chatbot_web.get_bot() is None,
+    }}, f)
+'''
+
+
+def test_import_does_not_load_heavy_modules(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT, METRICS_ENABLED='0')
+    env.pop('OPENAI_API_KEY', None)
+    subprocess.run([sys.executable, '-c', PROBE.format(lazy=LAZY_MODULES)], cwd=tmp_path, env=env,
+                   capture_output=True, text=True, timeout=60, check=True)
+    report = json.loads((tmp_path / 'startup.json').read_text())
+    assert report == {'loaded': [], 'created_at_import': [False, False], 'same_storage': True,
+                      'bot_disabled': True}
+
+
+WARM_UP_PROBE = '''
+import json, os, threading
+import chatbot_web, db, metrics
+chatbot_web.warm_up()
+metrics.inc('http_requests_total', route='/', method='GET', status='200')
+
+def report(name):
+    with open(name, 'w') as f:
+        json.dump({
+            'threads': sorted(t.name for t in threading.enumerate() if t.name in ('google-sheets-sync', 'metrics-flush')),
+            'connections': sorted(getattr(db._local, 'connections', {})),
+        }, f)
+
+report('master.json')
+pid = os.fork()
+if pid == 0:
+    chatbot_web.after_fork()
+    report('worker.json')
+    os._exit(0)
+os.waitpid(pid, 0)
+'''
+
+
+def test_warm_up_leaves_no_connections_or_threads_in_master(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT, GOOGLE_SHEET_ID='sheet', METRICS_ENABLED='1')
+    subprocess.run([sys.executable, '-c', WARM_UP_PROBE], cwd=tmp_path, env=env,
+                   capture_output=True, text=True, timeout=60, check=True)
+    assert json.loads((tmp_path / 'master.json').read_text()) == {'threads': [], 'connections': []}
+    worker = json.loads((tmp_path / 'worker.json').read_text())
+    assert worker['threads'] == ['google-sheets-sync', 'metrics-flush']
@@ -0,0 +1,95 @@
+"""
+تست‌های سرو فایل‌های ثابت با کش مرورگر
+"""
+
+import os
+import gzip
+from datetime import datetime
+
+import pytest
+
+from static_assets import IMMUTABLE_MAX_AGE, CompressedPage, content_hash, filename_digest, hashed_filename
+
+
+def test_hashed_filename_round_trip():
+    name = hashed_filename('logo.png', b'data', datetime(2024, 5, 1, 12, 30, 0))
+    assert name == f"20240501_123000_{content_hash(b'data')}_logo.png"
+    assert filename_digest(f'logos/{name}') == content_hash(b'data')
+    assert filename_digest('20240501_123000_logo.png') is None
+
+
+def test_compressed_page_is_rebuilt_when_template_changes(tmp_path):
+    template = tmp_path / 'index.html'
+    template.write_text('v1')
+    page = CompressedPage(lambda: template.read_text() * 100, str(template))
+
+    body, encoding, etag = page.get('gzip')
+    assert encoding == 'gzip' and gzip.decompress(body) == b'v1' * 100
+    assert etag.endswith('-gzip')
+    assert page.get(None)[:2] == (b'v1' * 100, 'identity')
+    assert page.get('unknown')[1] == 'identity'
+    assert page.builds == 1
+
+    template.write_text('v2')
+    mtime = os.path.getmtime(template) + 10
+    os.utime(template, (mtime, mtime))
+    assert page.get(None)[0] == b'v2' * 100
+    assert page.get(None)[2] != etag.rsplit('-', 1)[0]
+    assert page.builds == 2
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '0')
+    import chatbot_web
+    folder = tmp_path / 'uploads'
+    (folder / 'logos').mkdir(parents=True, exist_ok=True)
+    monkeypatch.setitem(chatbot_web.app.config, 'UPLOAD_FOLDER', str(folder))
+    monkeypatch.delenv('STATIC_OFFLOAD', raising=False)
+    return chatbot_web.app.test_client(), folder
+
+
+def test_hashed_upload_is_immutable(client):
+    client, folder = client
+    name = hashed_filename('logo.png', b'png-bytes')
+    (folder / 'logos' / name).write_bytes(b'png-bytes')
+
+    response = client.get(f'/uploads/logos/{name}')
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == IMMUTABLE_MAX_AGE
+    assert response.headers['ETag'] == f'"{content_hash(b"png-bytes")}"'
+    assert client.get(f'/uploads/logos/{name}', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_legacy_upload_is_revalidated(client):
+    client, folder = client
+    (folder / 'logos' / 'old.svg').write_bytes(b'<svg/>')
+    response = client.get('/uploads/logos/old.svg')
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+    assert "default-src 'none'" in response.headers['Content-Security-Policy']
+    assert client.get('/uploads/logos/../../secret').status_code == 404
+
+
+def test_accel_redirect_offload(client, monkeypatch):
+    client, folder = client
+    monkeypatch.setenv('STATIC_OFFLOAD', 'x-accel')
+    name = hashed_filename('logo.png', b'png-bytes')
+    (folder / 'logos' / name).write_bytes(b'png-bytes')
+
+    response = client.get(f'/uploads/logos/{name}')
+    assert response.headers['X-Accel-Redirect'] == f'/_uploads/logos/{name}'
+    assert response.data == b''
+    cached = client.get(f'/uploads/logos/{name}', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304 and 'X-Accel-Redirect' not in cached.headers
+
+
+def test_chat_page_is_served_compressed(client):
+    client, _ = client
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'<html' in gzip.decompress(response.data).lower()
+    assert 'Accept-Encoding' in response.headers['Vary']
+    cached = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
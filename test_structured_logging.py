@@ -0,0 +1,88 @@
+"""
+تست‌های لاگ ساختاریافته JSON و نوشتن غیرهمگام
+"""
+
+import json
+import logging
+import threading
+
+import pytest
+
+from structured_logging import AsyncQueueHandler, EventLogger, JsonFormatter, SamplingFilter, log_context
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, gate=None):
+        super().__init__()
+        self.lines = []
+        self.gate = gate
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.lines.append(record.getMessage())
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger('test_structured_logging')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    yield logger
+    logger.handlers.clear()
+
+
+def attach(logger, target, maxsize=100, sample_rates=None):
+    handler = AsyncQueueHandler(target, maxsize=maxsize)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SamplingFilter(sample_rates))
+    logger.addHandler(handler)
+    return handler
+
+
+def test_records_are_json_lines_with_context(logger):
+    target = ListHandler()
+    handler = attach(logger, target)
+    log = EventLogger(logger.name)
+
+    with log_context(route='/chat', session_id='s1', customer_number=None):
+        log.info('chat.response', cached=True, level='override')
+    try:
+        raise ValueError('خطا\nچندخطی')
+    except ValueError:
+        log.exception('chat.failed')
+    handler.flush()
+
+    assert len(target.lines) == 2 and all('\n' not in line for line in target.lines)
+    first, second = map(json.loads, target.lines)
+    assert first['event'] == 'chat.response' and first['level'] == 'info'
+    assert (first['route'], first['session_id'], first['cached']) == ('/chat', 's1', True)
+    assert first['field_level'] == 'override'
+    assert 'customer_number' not in first
+    assert second['exc_type'] == 'ValueError' and 'route' not in second
+
+
+def test_sampling_keeps_warnings(logger):
+    target = ListHandler()
+    handler = attach(logger, target, sample_rates=SamplingFilter.parse('http.request=0, other = 1 ,bad'))
+    log = EventLogger(logger.name)
+    for _ in range(5):
+        log.info('http.request')
+    log.warning('http.request')
+    log.info('other')
+    handler.flush()
+    assert [json.loads(line)['level'] for line in target.lines] == ['warning', 'info']
+
+
+def test_full_queue_drops_records_without_blocking(logger):
+    gate = threading.Event()
+    target = ListHandler(gate)
+    handler = attach(logger, target, maxsize=2)
+    log = EventLogger(logger.name)
+
+    for i in range(10):
+        log.info('event', i=i)
+    assert handler.dropped >= 7
+    gate.set()
+    handler.flush()
+    assert len(target.lines) == 10 - handler.dropped